@@ -1,7 +1,17 @@
 import json
 from datetime import datetime
 from pathlib import Path
-from typing import Any, AsyncGenerator, List, Literal
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+)
 
 import pytest
 from _pytest.fixtures import FixtureRequest
@@ -15,10 +25,13 @@ from sqlalchemy.ext.asyncio import (
 )
 
 from MapsPlanner_API.db.dependencies import get_db_session
+from MapsPlanner_API.db.models.Marker import MarkerORM
 from MapsPlanner_API.db.models.Session import SessionORM
+from MapsPlanner_API.db.models.Trip import TripORM
 from MapsPlanner_API.db.models.User import EGender, UserORM
 from MapsPlanner_API.db.utils import create_database, drop_database
 from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.markers.schema import EMarkerCategory
 from MapsPlanner_API.web.application import get_app
 
 
@@ -138,7 +151,7 @@ async def users(dbsession: AsyncSession, request: FixtureRequest) -> List[UserOR
             **mock_user,
             register_date=register_date,
             birth_date=birth_date,
-            gender=gender
+            gender=gender,
         )
         orm_users.append(user)
         dbsession.add(user)
@@ -177,3 +190,47 @@ async def access_token(
     await dbsession.commit()
 
     return await SessionORM.create_session(dbsession, user)
+
+
+@pytest.fixture
+def trip_factory(
+    dbsession: AsyncSession,
+    users: List[UserORM],
+) -> Callable[..., Awaitable[TripORM]]:
+    """
+    Creates trips, of the `access_token` user unless another owner is given.
+
+    Markers are given as the fields that differ from a default marker, e.g.
+    `await trip_factory(markers=[{"latitude": 0.0}, {"title": "Beach"}])`.
+    """
+
+    async def create_trip(
+        markers: Sequence[Dict[str, Any]] = (),
+        owner: Optional[UserORM] = None,
+        name: str = "Trip",
+        description: str = "",
+    ) -> TripORM:
+        trip = TripORM(
+            user_id=(owner or users[0]).id,
+            name=name,
+            description=description,
+        )
+        trip.markers = [
+            MarkerORM(
+                **{
+                    "category": EMarkerCategory.Nature,
+                    "title": f"Marker {index}",
+                    "description": "",
+                    "latitude": 32.0,
+                    "longitude": 34.0,
+                    **marker,
+                },
+            )
+            for index, marker in enumerate(markers)
+        ]
+        dbsession.add(trip)
+        await dbsession.commit()
+
+        return trip
+
+    return create_trip
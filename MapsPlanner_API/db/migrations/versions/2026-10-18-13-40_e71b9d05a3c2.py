@@ -0,0 +1,88 @@
+"""Moved trip pictures to the image store
+
+Revision ID: e71b9d05a3c2
+Revises: c4a97e13f5b8
+Create Date: 2026-10-18 13:40:27.771903
+
+"""
+import base64
+from logging import getLogger
+
+import sqlalchemy as sa
+from alembic import op
+
+from MapsPlanner_API.web.services.image_store import (
+    decode_data_uri,
+    image_store,
+    sniff_image_type,
+)
+
+# revision identifiers, used by Alembic.
+revision = "e71b9d05a3c2"
+down_revision = "c4a97e13f5b8"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 100
+
+logger = getLogger("alembic")
+
+trips = sa.table(
+    "trips",
+    sa.column("id", sa.Integer()),
+    sa.column("picture", sa.String()),
+)
+
+
+def _migrate_pictures(where_clause, convert) -> None:
+    """
+    Converts trip pictures in batches, so the whole table is never held in memory.
+
+    Pictures failing to convert are kept as they are, so no picture is lost.
+    """
+    connection = op.get_bind()
+    last_id = 0
+
+    while True:
+        rows = connection.execute(
+            sa.select(trips.c.id, trips.c.picture)
+            .where(where_clause, trips.c.id > last_id)
+            .order_by(trips.c.id)
+            .limit(BATCH_SIZE),
+        ).all()
+
+        if not rows:
+            break
+
+        for trip_id, picture in rows:
+            try:
+                converted = convert(picture)
+            except (ValueError, OSError) as e:
+                logger.warning(f"Kept the picture of trip #{trip_id} as is: {e}")
+                continue
+
+            connection.execute(
+                trips.update().where(trips.c.id == trip_id).values(picture=converted),
+            )
+
+        last_id = rows[-1].id
+
+
+def _picture_to_data_uri(image_hash: str) -> str:
+    data = image_store.read(image_hash)
+    content_type = sniff_image_type(data[:16])
+    return f"data:{content_type};base64,{base64.b64encode(data).decode('utf8')}"
+
+
+def upgrade() -> None:
+    _migrate_pictures(
+        trips.c.picture.like("data:%"),
+        lambda picture: image_store.write(decode_data_uri(picture)),
+    )
+
+
+def downgrade() -> None:
+    _migrate_pictures(
+        trips.c.picture.op("~")("^[0-9a-f]{64}$"),
+        _picture_to_data_uri,
+    )
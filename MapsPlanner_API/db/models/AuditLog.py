@@ -1,9 +1,9 @@
 from datetime import datetime
 from enum import IntEnum
 from pydoc import locate
-from typing import Optional, TypedDict
+from typing import List, Optional, Sequence, TypedDict
 
-from sqlalchemy import JSON, DateTime, ForeignKey, Integer, func
+from sqlalchemy import JSON, DateTime, ForeignKey, Index, Integer, func, insert
 from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncSession
 from sqlalchemy.orm import Mapped, column_property, mapped_column, relationship
 from sqlalchemy_utils import ChoiceType
@@ -32,6 +32,10 @@ class AuditLogORM(AsyncAttrs, BaseORM):
     """
 
     __tablename__ = "audit"
+    __table_args__ = (
+        # Keyset pagination of user audit logs.
+        Index("ix_audit_user_id_id", "user_id", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     creation_date: Mapped[datetime] = mapped_column(
@@ -97,6 +101,43 @@ class AuditLogORM(AsyncAttrs, BaseORM):
         await db.commit()
         return audit_log
 
+    @classmethod
+    async def log_many(
+        cls,
+        db: AsyncSession,
+        action: EAuditAction,
+        targets: Sequence[BaseORM],
+        *,
+        user: Optional[UserORM] = None,
+        changes: Optional[Sequence[TChanges]] = None,
+        **extra,
+    ) -> None:
+        """
+        Logs the action on every target with a single INSERT. Unlike `log`, does
+        not commit, so the logs are written in the transaction of the action.
+
+        @param: changes - of each target, in the targets order.
+        """
+
+        if not targets:
+            return
+
+        targets_changes: List[Optional[TChanges]] = (
+            list(changes) if changes is not None else [None] * len(targets)
+        )
+        await db.execute(
+            insert(cls).values(
+                [
+                    {
+                        "action": action,
+                        "user_id": user.id,
+                        "extra": {**extra, **cls._build_extra(target, target_changes)},
+                    }
+                    for target, target_changes in zip(targets, targets_changes)
+                ],
+            ),
+        )
+
     @property
     async def instance(self) -> Optional[BaseORM]:
         """
@@ -0,0 +1,46 @@
+import datetime
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from MapsPlanner_API.db.base import Base
+from MapsPlanner_API.settings import settings
+
+
+class DeletedMarkerORM(Base):
+    """
+    Tombstone of a deleted marker, for clients syncing the trip markers changes.
+    Written by the database, see MarkerORM triggers, and dropped with the trip or
+    once past the retention, see DeletedTripsReaper.
+    """
+
+    __tablename__ = "deleted_markers"
+    __table_args__ = (
+        # Trip markers changes since a version.
+        Index("ix_deleted_markers_trip_id_version", "trip_id", "version"),
+        # Tombstones past the retention.
+        Index("ix_deleted_markers_deleted_date", "deleted_date"),
+    )
+
+    marker_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    trip_id: Mapped[int] = mapped_column(ForeignKey("trips.id", ondelete="CASCADE"))
+    version: Mapped[int] = mapped_column(BigInteger())
+    deleted_date: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+    )
+
+    @classmethod
+    def retention_cutoff(cls) -> datetime.datetime:
+        """
+        Tombstones of markers deleted before the cutoff are reaped.
+        """
+        return datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(
+            seconds=settings.deleted_markers_retention,
+        )
+
+    def __str__(self):
+        return f"Deleted marker [#{self.marker_id}] of trip [#{self.trip_id}]"
+
+    def __repr__(self):
+        return str(self)
@@ -1,4 +1,18 @@
-from sqlalchemy import Float, ForeignKey, Integer, String
+import datetime
+
+import sqlalchemy
+from sqlalchemy import (
+    DDL,
+    BigInteger,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    event,
+    func,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from MapsPlanner_API.db.base import Base
@@ -12,6 +26,10 @@ class MarkerORM(Base):
     """
 
     __tablename__ = "markers"
+    __table_args__ = (
+        # Trip markers listing, and their changes since a version.
+        Index("ix_markers_trip_id_version", "trip_id", "version"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     trip_id: Mapped[int] = mapped_column(ForeignKey("trips.id"))
@@ -22,6 +40,16 @@ class MarkerORM(Base):
     latitude: Mapped[float] = mapped_column(Float())
     longitude: Mapped[float] = mapped_column(Float())
 
+    # Maintained by the database on every write, see `set_marker_version`.
+    version: Mapped[int] = mapped_column(
+        BigInteger(),
+        server_default=sqlalchemy.text("0"),
+    )
+    updated_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+    )
+
     def to_api(self) -> Marker:
         return Marker(
             id=self.id,
@@ -38,3 +66,86 @@ class MarkerORM(Base):
 
     def __repr__(self):
         return str(self)
+
+
+# Bounding box queries, see BoundingBox. Postgres' built-in geometric `point` keeps
+# the index free of extensions.
+Index(
+    "ix_markers_location",
+    func.point(MarkerORM.longitude, MarkerORM.latitude),
+    postgresql_using="gist",
+)
+
+
+# Versions of the trip markers, whichever code path writes them:
+# - TripORM.markers_version is bumped once per statement writing markers of the
+#   trip, and written markers get the version the statement bumps the trip to.
+# - Deleted markers of live trips leave a DeletedMarkerORM tombstone, of that
+#   version too.
+# The trip row lock, taken on the first written marker, orders versions as the
+# writing transactions commit, so syncing clients never miss a change. Writes of
+# several trips take their locks in id order beforehand, see `lock_trips`.
+MARKER_VERSION_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION set_marker_version() RETURNS trigger AS $$
+BEGIN
+    SELECT markers_version + 1 INTO NEW.version
+    FROM trips WHERE id = NEW.trip_id FOR UPDATE;
+    NEW.version := coalesce(NEW.version, 0);
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+MARKERS_VERSION_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION bump_trips_markers_version() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE trips SET markers_version = markers_version + 1
+        WHERE id IN (SELECT trip_id FROM new_markers);
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE trips SET markers_version = markers_version + 1
+        WHERE id IN (SELECT trip_id FROM old_markers);
+    ELSE
+        WITH bumped_trips AS (
+            UPDATE trips SET markers_version = markers_version + 1
+            WHERE id IN (SELECT trip_id FROM old_markers)
+            RETURNING id, markers_version, deleted_date
+        )
+        INSERT INTO deleted_markers (marker_id, trip_id, version)
+        SELECT old_markers.id, old_markers.trip_id, bumped_trips.markers_version
+        FROM old_markers JOIN bumped_trips ON bumped_trips.id = old_markers.trip_id
+        WHERE bumped_trips.deleted_date IS NULL;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+MARKERS_VERSION_TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER markers_set_version
+    BEFORE INSERT OR UPDATE ON markers
+    FOR EACH ROW EXECUTE FUNCTION set_marker_version()
+    """,
+    *(
+        f"""
+        CREATE TRIGGER markers_{operation.lower()}_version
+        AFTER {operation} ON markers
+        REFERENCING {transition_table} TABLE AS {transition_table.lower()}_markers
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_trips_markers_version()
+        """
+        for operation, transition_table in (
+            ("INSERT", "NEW"),
+            ("UPDATE", "OLD"),
+            ("DELETE", "OLD"),
+        )
+    ),
+]
+
+for statement in [
+    MARKER_VERSION_FUNCTION_SQL,
+    MARKERS_VERSION_FUNCTION_SQL,
+    *MARKERS_VERSION_TRIGGERS_SQL,
+]:
+    event.listen(MarkerORM.__table__, "after_create", DDL(statement))
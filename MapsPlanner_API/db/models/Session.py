@@ -1,14 +1,17 @@
 import binascii
 import os
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 
-from sqlalchemy import DateTime, ForeignKey, String, func
+from sqlalchemy import DateTime, ForeignKey, Index, String, func, text
 from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncSession
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from MapsPlanner_API.db.base import Base
 from MapsPlanner_API.db.models.User import UserORM
+from MapsPlanner_API.settings import settings
 from MapsPlanner_API.utils import classproperty
+from MapsPlanner_API.web.api.authentication.signed_tokens import token_signer
 
 
 class SessionORM(AsyncAttrs, Base):
@@ -18,6 +21,14 @@ class SessionORM(AsyncAttrs, Base):
     """
 
     __tablename__ = "sessions"
+    __table_args__ = (
+        Index("ix_sessions_creation_date", "creation_date"),
+        Index(
+            "ix_sessions_revoked_date",
+            "revoked_date",
+            postgresql_where=text("revoked_date IS NOT NULL"),
+        ),
+    )
 
     DEFAULT_TOKEN_LENGTH = 64
 
@@ -29,6 +40,10 @@ class SessionORM(AsyncAttrs, Base):
         DateTime(timezone=True),
         server_default=func.now(),
     )
+    revoked_date: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+    )
 
     @classmethod
     def _generate_token(cls, length: int = DEFAULT_TOKEN_LENGTH):
@@ -36,12 +51,41 @@ class SessionORM(AsyncAttrs, Base):
 
     @classmethod
     async def create_session(cls, db: AsyncSession, user: UserORM) -> "SessionORM":
-        token = cls._generate_token()
+        if token_signer.enabled:
+            if user.id is None:
+                db.add(user)
+                await db.flush()
+            token = token_signer.issue(user.id)
+        else:
+            token = cls._generate_token()
         session: SessionORM = SessionORM(user=user, token=token)
         db.add(session)
         await db.commit()
         return session
 
+    def revoke(self) -> None:
+        self.revoked_date = datetime.now(tz=timezone.utc)
+
+        if claims := token_signer.verify(self.token):
+            token_signer.revoked.add(claims)
+
+    @classmethod
+    def expiration_cutoff(cls) -> datetime:
+        """
+        Sessions created before the cutoff are expired.
+        """
+        return datetime.now(tz=timezone.utc) - timedelta(
+            seconds=settings.session_lifetime,
+        )
+
+    @property
+    def expiration_date(self) -> datetime:
+        return self.creation_date + timedelta(seconds=settings.session_lifetime)
+
+    @property
+    def is_revoked(self) -> bool:
+        return self.revoked_date is not None
+
     @classproperty
     def empty(cls) -> "SessionORM":
         return cls(token="", creation_date=datetime.now(tz=timezone.utc), user_id=None)
@@ -1,14 +1,38 @@
 import datetime
-from typing import List
+from typing import List, Optional, Union
 
 import sqlalchemy
-from sqlalchemy import DateTime, ForeignKey, String, func
+from sqlalchemy import (
+    DDL,
+    BigInteger,
+    Computed,
+    DateTime,
+    ForeignKey,
+    Index,
+    Select,
+    String,
+    event,
+    func,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.asyncio import AsyncAttrs
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import (
+    Mapped,
+    joinedload,
+    mapped_column,
+    query_expression,
+    relationship,
+)
 
 from MapsPlanner_API.db.base import Base
 from MapsPlanner_API.db.models.Marker import MarkerORM
 from MapsPlanner_API.db.models.User import UserORM
+from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.query_filters.search import search_vector_expression
+from MapsPlanner_API.web.services.image_derivatives import EImageSize
+from MapsPlanner_API.web.services.image_store import image_store
+
+SEARCH_VECTOR_SQL = search_vector_expression((("name", "A"), ("description", "B")))
 
 
 class TripORM(AsyncAttrs, Base):
@@ -17,6 +41,30 @@ class TripORM(AsyncAttrs, Base):
     """
 
     __tablename__ = "trips"
+    __table_args__ = (
+        # Keyset pagination of user trips.
+        Index("ix_trips_user_id_id", "user_id", "id"),
+        # Deleted trips reaping.
+        Index(
+            "ix_trips_deleted_date",
+            "deleted_date",
+            postgresql_where=sqlalchemy.text("deleted_date IS NOT NULL"),
+        ),
+        # Trips search, see TripFilter.
+        Index("ix_trips_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_trips_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_trips_description_trgm",
+            "description",
+            postgresql_using="gin",
+            postgresql_ops={"description": "gin_trgm_ops"},
+        ),
+    )
 
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
 
@@ -26,12 +74,41 @@ class TripORM(AsyncAttrs, Base):
         String(),
         server_default=sqlalchemy.text("''"),
     )
+    # Content hash of the picture in the image store.
     picture: Mapped[str | None] = mapped_column(String(), nullable=True)
     creation_date: Mapped[datetime.datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
     )
 
+    # Deleted trips are hidden, until reaped after the undo window.
+    deleted_date: Mapped[Optional[datetime.datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+    )
+
+    # Maintained by the database on every write of the trip markers, see
+    # MarkerORM triggers.
+    markers_version: Mapped[int] = mapped_column(
+        BigInteger(),
+        server_default=sqlalchemy.text("0"),
+    )
+    # Latest version of the deleted markers tombstones reaped, clients syncing
+    # from an older version do a full resync.
+    pruned_markers_version: Mapped[int] = mapped_column(
+        BigInteger(),
+        server_default=sqlalchemy.text("0"),
+    )
+
+    # Maintained by the database, for full-text search.
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR(),
+        Computed(SEARCH_VECTOR_SQL, persisted=True),
+        deferred=True,
+    )
+    # Loaded by searches only.
+    search_rank: Mapped[Optional[float]] = query_expression()
+
     # Forward relations
     markers: Mapped[List[MarkerORM]] = relationship(
         MarkerORM,
@@ -40,28 +117,69 @@ class TripORM(AsyncAttrs, Base):
     )
     user: Mapped[UserORM] = relationship(UserORM, back_populates="trips")
 
-    def to_api(self, detailed: bool = False) -> "Trip":
-        from MapsPlanner_API.web.api.trips.schema import Trip
+    @classmethod
+    def with_markers(cls, query: Select) -> Select:
+        """
+        Loads the trips markers within the same statement, for `to_api(detailed=True)`.
+        Results of such query must be de-duplicated with `.unique()`.
+        """
+        return query.options(joinedload(cls.markers))
 
-        trip = Trip(
+    def to_api(self, detailed: bool = False) -> Union["Trip", "TripDetails"]:
+        from MapsPlanner_API.web.api.trips.schema import Trip, TripDetails
+
+        fields = dict(
             id=self.id,
             name=self.name,
             description=self.description,
-            picture=self.picture,
+            picture=image_store.url_for(self.picture) if self.picture else None,
+            picture_thumbnail=(
+                image_store.url_for(self.picture, EImageSize.thumbnail.value)
+                if self.picture
+                else None
+            ),
             creation_date=self.creation_date,
             user_id=self.user_id,
         )
 
-        if detailed:
-            raise NotImplementedError("Need to somehow fetch markers ......")
-        else:
-            return trip
+        if not detailed:
+            return Trip(**fields)
+
+        if "markers" in sqlalchemy.inspect(self).unloaded:
+            # Lazy loading would issue a query per trip, and fails under asyncio.
+            raise ValueError("Trip markers are not loaded, see TripORM.with_markers.")
+
+        return TripDetails(
+            **fields,
+            markers=[marker_orm.to_api() for marker_orm in self.markers],
+        )
+
+    @classmethod
+    def undo_cutoff(cls) -> datetime.datetime:
+        """
+        Trips deleted before the cutoff can no longer be restored.
+        """
+        return datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(
+            seconds=settings.trip_undo_window,
+        )
 
     def is_accessible_to_user(self, user: UserORM) -> bool:
-        return user.is_active and (self.user_id == user.id or user.is_administrator)
+        return (
+            user.is_active
+            and self.deleted_date is None
+            and (self.user_id == user.id or user.is_administrator)
+        )
 
     def __str__(self):
         return f"Trip [#{self.id}]: ${self.name}"
 
     def __repr__(self):
         return str(self)
+
+
+# Provides the operator class of the trigram indexes.
+event.listen(
+    TripORM.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"),
+)
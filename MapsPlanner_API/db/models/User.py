@@ -10,6 +10,8 @@ from sqlalchemy.sql import expression
 from sqlalchemy_utils import ChoiceType
 
 from MapsPlanner_API.db.base import Base
+from MapsPlanner_API.web.services.image_derivatives import EImageSize
+from MapsPlanner_API.web.services.image_store import image_store
 
 
 class EGender(IntEnum):
@@ -78,6 +80,18 @@ class UserORM(AsyncAttrs, Base):
         result = await session.execute(query)
         return result.scalar_one_or_none()
 
+    @property
+    def profile_picture_thumbnail(self) -> Optional[str]:
+        picture_hash = (
+            image_store.hash_from_url(self.profile_picture)
+            if self.profile_picture
+            else None
+        )
+        if picture_hash is None:
+            return None
+
+        return image_store.url_for(picture_hash, EImageSize.thumbnail.value)
+
     def to_api(self) -> "User":
         from MapsPlanner_API.web.api.users.schema import User
 
@@ -88,6 +102,7 @@ class UserORM(AsyncAttrs, Base):
             full_name=f"{self.first_name} {self.last_name}",
             email=self.email,
             profile_picture=self.profile_picture,
+            profile_picture_thumbnail=self.profile_picture_thumbnail,
             is_active=self.is_active,
             is_administrator=self.is_administrator,
         )
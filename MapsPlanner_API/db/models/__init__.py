@@ -2,6 +2,7 @@ import pkgutil
 from pathlib import Path
 
 from MapsPlanner_API.db.models.AuditLog import AuditLogORM
+from MapsPlanner_API.db.models.DeletedMarker import DeletedMarkerORM
 from MapsPlanner_API.db.models.Marker import MarkerORM
 from MapsPlanner_API.db.models.Session import SessionORM
 from MapsPlanner_API.db.models.Trip import TripORM
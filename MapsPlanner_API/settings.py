@@ -26,6 +26,15 @@ class LogLevel(str, enum.Enum):  # noqa: WPS600
     FATAL = "FATAL"
 
 
+class SessionTokenMode(str, enum.Enum):  # noqa: WPS600
+    """Possible session token kinds."""
+
+    # Random token, validated against the sessions table.
+    OPAQUE = "opaque"
+    # HMAC signed token, validated without touching the database.
+    SIGNED = "signed"
+
+
 class Settings(BaseSettings, extra=Extra.allow):
     """
     Application settings.
@@ -69,6 +78,80 @@ class Settings(BaseSettings, extra=Extra.allow):
     # Maptiler
     maptiler_api_key: str = environ.get("maptiler_api_key")
 
+    # Content addressed images storage, the only copy of uploaded images.
+    image_store_path: Path = environ["image_store_path"]
+
+    # Resized image variants
+    image_derivatives_path: Path = environ.get(
+        "image_derivatives_path",
+        TEMP_DIR / "MapsPlanner_API" / "image_derivatives",
+    )
+    image_derivatives_workers: int = environ.get("image_derivatives_workers", 2)
+    image_derivatives_quality: int = environ.get("image_derivatives_quality", 75)
+
+    # Remote images fetching
+    image_fetch_concurrency: int = environ.get("image_fetch_concurrency", 8)
+    image_fetch_max_bytes: int = environ.get("image_fetch_max_bytes", 10 * 1024 * 1024)
+    image_fetch_timeout: float = environ.get("image_fetch_timeout", 10)
+    image_url_cache_size: int = environ.get("image_url_cache_size", 1024)
+
+    # Lists pagination
+    page_size: int = environ.get("page_size", 20)
+    max_page_size: int = environ.get("max_page_size", 200)
+    # Maximal markers returned for a map viewport.
+    bbox_max_markers: int = environ.get("bbox_max_markers", 5000)
+    # In-memory trip markers indexes, nearest markers and clusters (per worker):
+    # trips kept, and seconds after which an unused index is dropped. Indexes are
+    # rebuilt anyway once the trip markers are written.
+    marker_index_cache_size: int = environ.get("marker_index_cache_size", 256)
+    marker_index_ttl: float = environ.get("marker_index_ttl", 5 * 60)
+    # Markers vector tiles of trips kept in memory (per worker).
+    tile_cache_size: int = environ.get("tile_cache_size", 4096)
+
+    # Route optimization: processes per worker, search time (seconds) and markers.
+    route_workers: int = environ.get("route_workers", 2)
+    route_time_budget: float = environ.get("route_time_budget", 1)
+    route_max_markers: int = environ.get("route_max_markers", 3000)
+    # Maximal origins, or destinations, of a distance matrix.
+    distance_matrix_max_points: int = environ.get("distance_matrix_max_points", 5000)
+    # Maximal markers updated, or deleted, by a single batch request.
+    markers_batch_max_size: int = environ.get("markers_batch_max_size", 1000)
+
+    # Deleted trips can be restored during the undo window (seconds), then are
+    # reaped in the background: interval (seconds) and rows deleted per transaction.
+    trip_undo_window: int = environ.get("trip_undo_window", 24 * 60 * 60)
+    trip_reap_interval: float = environ.get("trip_reap_interval", 10 * 60)
+    trip_reap_batch_size: int = environ.get("trip_reap_batch_size", 5000)
+    # Deleted markers tombstones are kept (seconds) for syncing clients, which do a
+    # full resync past it, then are reaped along with the deleted trips.
+    deleted_markers_retention: int = environ.get(
+        "deleted_markers_retention",
+        30 * 24 * 60 * 60,
+    )
+
+    # Sessions
+    session_token_mode: SessionTokenMode = environ.get(
+        "session_token_mode",
+        SessionTokenMode.OPAQUE,
+    )
+    session_token_secret: str = environ.get("session_token_secret", "")
+    session_lifetime: int = environ.get("session_lifetime", 30 * 24 * 60 * 60)
+    # Expired sessions purge: interval (seconds) and rows deleted per transaction.
+    session_purge_interval: float = environ.get("session_purge_interval", 60 * 60)
+    session_purge_batch_size: int = environ.get("session_purge_batch_size", 1000)
+    # Interval (seconds) for pulling revoked signed sessions from the database.
+    session_revocation_refresh_interval: float = environ.get(
+        "session_revocation_refresh_interval",
+        10,
+    )
+
+    # Authenticated sessions cache (per worker). Zero TTL disables the cache.
+    session_cache_size: int = environ.get("session_cache_size", 10_000)
+    session_cache_ttl: float = environ.get("session_cache_ttl", 60)
+    # Trips owners cache (per worker), for access checks. Zero TTL disables it.
+    trip_owners_cache_size: int = environ.get("trip_owners_cache_size", 10_000)
+    trip_owners_cache_ttl: float = environ.get("trip_owners_cache_ttl", 60)
+
     # Allowed origins on cors
 
     @property
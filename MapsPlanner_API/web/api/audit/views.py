@@ -4,24 +4,33 @@ from fastapi import APIRouter, Depends
 from fastapi_filter import FilterDepends
 from sqlalchemy import Select
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+from starlette.responses import Response
 
 from MapsPlanner_API.db.dependencies import get_db_session
 from MapsPlanner_API.db.models.AuditLog import AuditLogORM
 from MapsPlanner_API.web.api.audit.schema import AuditFilter, AuditLog
-from MapsPlanner_API.web.api.dependencies import get_queryset
+from MapsPlanner_API.web.api.dependencies import get_paginated_queryset
+from MapsPlanner_API.web.api.query_filters import paginate_results
 
 router = APIRouter(prefix="/audit", tags=["Audit"])
 
 
 @router.get("/")
 async def audit_logs(
+    request: Request,
+    response: Response,
     db: Annotated[AsyncSession, Depends(get_db_session)],
-    query: Annotated[Select, Depends(get_queryset(AuditLogORM))],
+    query: Annotated[Select, Depends(get_paginated_queryset(AuditLogORM))],
     audit_filter: Annotated[AuditFilter, FilterDepends(AuditFilter)],
 ) -> List[AuditLog]:
     query = audit_filter.filter(query)
 
     audit_logs_result = await db.execute(query)
-    audit_logs: List[AuditLogORM] = audit_logs_result.scalars()
+    audit_logs: List[AuditLogORM] = paginate_results(
+        request,
+        response,
+        audit_logs_result.scalars().all(),
+    )
 
     return [await audit_log.to_api() for audit_log in audit_logs]
@@ -1,8 +1,12 @@
+import asyncio
+import re
+import time
 from logging import getLogger
-from typing import Optional
+from typing import Any, Dict, Optional
 
-import requests
-from fastapi import APIRouter, Depends, HTTPException
+import httpx
+import jwt
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
@@ -12,6 +16,9 @@ from MapsPlanner_API.db.dependencies import get_db_session
 from MapsPlanner_API.db.models.Session import SessionORM
 from MapsPlanner_API.db.models.User import UserORM
 from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.users.utils import ingest_profile_picture
+from MapsPlanner_API.web.services.http_client import get_http_client
+from MapsPlanner_API.web.services.image_store import image_store
 
 router = APIRouter(prefix="/google")
 
@@ -28,19 +35,85 @@ class GoogleUserInfo(BaseModel):
     picture: str  # as URL
 
 
+class GoogleOpenIDConfiguration:
+    """
+    Caches Google OpenID discovery document and signing keys (JWKS), honoring the
+    `Cache-Control: max-age` Google serves them with.
+    """
+
+    discovery_url = "https://accounts.google.com/.well-known/openid-configuration"
+    issuers = ("https://accounts.google.com", "accounts.google.com")
+    default_max_age = 60 * 60
+    min_refetch = 60
+
+    def __init__(self):
+        self._discovery: Dict[str, Any] = {}
+        self._discovery_expiry = 0.0
+        self._keys: Dict[str, Any] = {}
+        self._keys_expiry = 0.0
+        self._keys_fetch_time = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, field: str) -> str:
+        if time.monotonic() >= self._discovery_expiry:
+            async with self._lock:
+                if time.monotonic() >= self._discovery_expiry:
+                    self._discovery, self._discovery_expiry = await self._fetch(
+                        self.discovery_url,
+                    )
+
+        return self._discovery[field]
+
+    async def get_signing_key(self, kid: Optional[str]) -> Any:
+        if self._should_fetch_keys(kid):
+            jwks_uri = await self.get("jwks_uri")
+            async with self._lock:
+                if self._should_fetch_keys(kid):
+                    jwks, self._keys_expiry = await self._fetch(jwks_uri)
+                    self._keys_fetch_time = time.monotonic()
+                    self._keys = {
+                        jwk["kid"]: jwt.PyJWK(jwk).key for jwk in jwks["keys"]
+                    }
+
+        try:
+            return self._keys[kid]
+        except KeyError:
+            raise jwt.InvalidTokenError(f"Unknown signing key {kid=}.")
+
+    def _should_fetch_keys(self, kid: Optional[str]) -> bool:
+        now = time.monotonic()
+        if now >= self._keys_expiry:
+            return True
+
+        # Unknown kid might mean Google rotated its keys, refetch them (throttled).
+        return kid not in self._keys and now - self._keys_fetch_time > self.min_refetch
+
+    async def _fetch(self, url: str) -> tuple[Dict[str, Any], float]:
+        response = await get_http_client().get(url)
+        response.raise_for_status()
+
+        cache_control = response.headers.get("Cache-Control", "")
+        max_age = re.search(r"max-age=(\d+)", cache_control)
+        ttl = int(max_age.group(1)) if max_age else self.default_max_age
+
+        return response.json(), time.monotonic() + ttl
+
+
 class GoogleAuthenticator:
     client_id = settings.google_auth_client_id
     client_secret = settings.google_auth_client_secret
     redirect_uri = f"{settings.backend_url}/api/auth/google"
     scopes = ["openid", "profile", "email"]
+    userinfo_url = "https://www.googleapis.com/oauth2/v1/userinfo"
+    openid_configuration = GoogleOpenIDConfiguration()
 
     @classmethod
     def get_login_url(cls):
         return f"https://accounts.google.com/o/oauth2/auth?response_type=code&client_id={cls.client_id}&redirect_uri={cls.redirect_uri}&scope={'%20'.join(cls.scopes)}&access_type=offline"
 
     @classmethod
-    def get_user_info(cls, code: str) -> GoogleUserInfo:
-        token_url = "https://accounts.google.com/o/oauth2/token"
+    async def get_user_info(cls, code: str) -> GoogleUserInfo:
+        client = get_http_client()
         data = {
             "code": code,
             "client_id": cls.client_id,
@@ -48,17 +121,59 @@ class GoogleAuthenticator:
             "redirect_uri": cls.redirect_uri,
             "grant_type": "authorization_code",
         }
-        response = requests.post(token_url, data=data)
-        access_token = response.json().get("access_token")
-        user_info = requests.get(
-            "https://www.googleapis.com/oauth2/v1/userinfo",
-            headers={"Authorization": f"Bearer {access_token}"},
+        response = await client.post(
+            await cls.openid_configuration.get("token_endpoint"),
+            data=data,
+        )
+        response.raise_for_status()
+        tokens = response.json()
+
+        # Profile claims of a verified id_token spare the userinfo round trip.
+        if id_token := tokens.get("id_token"):
+            claims = await cls.verify_id_token(id_token)
+            try:
+                return GoogleUserInfo(
+                    id=claims["sub"],
+                    email=claims["email"],
+                    verified_email=claims.get("email_verified", False),
+                    name=claims["name"],
+                    given_name=claims["given_name"],
+                    family_name=claims["family_name"],
+                    picture=claims["picture"],
+                )
+            except KeyError:
+                logger.debug("id_token lacks profile claims, fetching userinfo.")
+
+        user_info = await client.get(
+            cls.userinfo_url,
+            headers={"Authorization": f"Bearer {tokens.get('access_token')}"},
         )
 
         user_info.raise_for_status()
 
         return GoogleUserInfo(**user_info.json())
 
+    @classmethod
+    async def verify_id_token(cls, id_token: str) -> Dict[str, Any]:
+        """
+        Verifies the id_token signature, audience and expiry locally, against the
+        cached Google signing keys.
+        """
+        header = jwt.get_unverified_header(id_token)
+        key = await cls.openid_configuration.get_signing_key(header.get("kid"))
+        claims = jwt.decode(
+            id_token,
+            key,
+            algorithms=["RS256"],
+            audience=cls.client_id,
+            options={"require": ["iss", "sub", "aud", "exp"]},
+        )
+
+        if claims["iss"] not in cls.openid_configuration.issuers:
+            raise jwt.InvalidIssuerError(f"Invalid id_token issuer {claims['iss']}.")
+
+        return claims
+
     @classmethod
     def create_user(cls, userinfo: GoogleUserInfo) -> UserORM:
         # Convert profile picture to base64
@@ -74,6 +189,7 @@ class GoogleAuthenticator:
 
 @router.get("/")
 async def login_google(
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db_session),
     code: Optional[str] = None,
 ):
@@ -86,7 +202,7 @@ async def login_google(
     else:
         # Callback with code, get user details
         try:
-            userinfo = GoogleAuthenticator.get_user_info(code)
+            userinfo = await GoogleAuthenticator.get_user_info(code)
             user_orm, user_created = (
                 await UserORM.get_user(db, userinfo.email),
                 False,
@@ -98,6 +214,11 @@ async def login_google(
                 db.add(user_orm)
                 await db.commit()
 
+            # Remote profile pictures are copied into the image store in background.
+            picture = user_orm.profile_picture
+            if picture and image_store.hash_from_url(picture) is None:
+                background_tasks.add_task(ingest_profile_picture, user_orm.id, picture)
+
             # Set session cookie
             session: SessionORM = await SessionORM.create_session(db, user_orm)
             response = RedirectResponse(
@@ -106,7 +227,7 @@ async def login_google(
             response.set_cookie(key="token", value=session.token, secure=True)
             return response
 
-        except requests.exceptions.HTTPError as ex:
+        except (httpx.HTTPError, jwt.InvalidTokenError) as ex:
             logger.exception(f"Authentication Failed: {str(ex) or '---'}")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -0,0 +1,229 @@
+import json
+import time
+from collections import OrderedDict
+from logging import getLogger
+from typing import Any, Dict, NamedTuple, Optional, Set
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+
+from MapsPlanner_API.db.models.User import UserORM
+from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.authentication.signed_tokens import (
+    SignedSessionToken,
+    token_signer,
+)
+from MapsPlanner_API.web.api.metrics.registry import metrics_registry
+
+logger = getLogger("api")
+
+NOTIFY_CHANNEL = "session_cache_invalidation"
+
+
+class CachedSession(NamedTuple):
+    user_id: int
+    is_active: bool
+    is_administrator: bool
+    # Loaded column values, used to rebuild the user without querying it.
+    user_columns: Dict[str, Any]
+    expires_at: float
+
+
+class SessionCache:
+    """
+    Bounded, TTL based LRU cache of resolved sessions (token -> user).
+
+    Each worker holds its own cache; invalidations are fanned out to the other
+    workers with Postgres LISTEN/NOTIFY on `NOTIFY_CHANNEL`.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._entries: OrderedDict[str, CachedSession] = OrderedDict()
+        self._user_tokens: Dict[int, Set[str]] = {}
+        self._listener_connection: Optional[AsyncConnection] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, token: str) -> Optional[CachedSession]:
+        entry = self._entries.get(token)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            self._discard(token)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return entry
+
+    def put(
+        self,
+        token: str,
+        user: UserORM,
+        session_expiration: Optional[float] = None,
+    ) -> None:
+        """
+        Caches the user of `token`, no longer than the session expiration timestamp.
+        """
+        if not self.enabled:
+            return
+
+        ttl = self.ttl
+        if session_expiration is not None:
+            ttl = min(ttl, session_expiration - time.time())
+
+        self._discard(token)
+        self._entries[token] = CachedSession(
+            user_id=user.id,
+            is_active=user.is_active,
+            is_administrator=user.is_administrator,
+            user_columns={
+                column.key: getattr(user, column.key)
+                for column in inspect(UserORM).column_attrs
+                if not column.deferred
+            },
+            expires_at=time.monotonic() + ttl,
+        )
+        self._user_tokens.setdefault(user.id, set()).add(token)
+
+        while len(self._entries) > self.max_size:
+            oldest_token = next(iter(self._entries))
+            self._discard(oldest_token)
+            self.evictions += 1
+
+    def invalidate_token(self, token: str) -> None:
+        if self._discard(token):
+            self.invalidations += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        for token in list(self._user_tokens.get(user_id, ())):
+            self.invalidate_token(token)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._user_tokens.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def attach_user(self, db: AsyncSession, entry: CachedSession) -> UserORM:
+        """
+        Returns the cached user as a persistent instance of `db`, without querying.
+        """
+        key = identity_key(UserORM, entry.user_id)
+        if (user := db.identity_map.get(key)) is not None:
+            return user
+
+        user = UserORM(**entry.user_columns)
+        make_transient_to_detached(user)
+        db.add(user)
+        return user
+
+    async def publish_user_invalidation(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        revoked_token: Optional[str] = None,
+    ) -> None:
+        """
+        Invalidates the user sessions on this worker, and on the other workers once
+        the current transaction commits.
+        Signed `revoked_token` is also added to the other workers revocation set.
+        """
+        self.invalidate_user(user_id)
+        await db.execute(*_notify_statement(user_id, revoked_token))
+
+    async def start_listener(self, engine: AsyncEngine) -> None:
+        if not self.enabled:
+            return
+
+        self._listener_connection = await engine.connect()
+        raw_connection = await self._listener_connection.get_raw_connection()
+        await raw_connection.driver_connection.add_listener(
+            NOTIFY_CHANNEL,
+            self._on_notification,
+        )
+
+    async def stop_listener(self) -> None:
+        if self._listener_connection is not None:
+            await self._listener_connection.close()
+            self._listener_connection = None
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str):
+        try:
+            message = json.loads(payload)
+            self.invalidate_user(message["user_id"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Invalid session cache notification: {payload!r}")
+            return
+
+        revoked_token = message.get("revoked_token")
+        if revoked_token and (claims := SignedSessionToken.parse(revoked_token)):
+            token_signer.revoked.add(claims)
+
+    def _discard(self, token: str) -> bool:
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return False
+
+        user_tokens = self._user_tokens.get(entry.user_id)
+        if user_tokens is not None:
+            user_tokens.discard(token)
+            if not user_tokens:
+                del self._user_tokens[entry.user_id]
+
+        return True
+
+
+def _notify_statement(user_id: int, revoked_token: Optional[str] = None):
+    message = {"user_id": user_id}
+    if revoked_token and SignedSessionToken.is_signed(revoked_token):
+        message["revoked_token"] = revoked_token
+
+    return (
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": NOTIFY_CHANNEL, "payload": json.dumps(message)},
+    )
+
+
+session_cache = SessionCache(
+    max_size=int(settings.session_cache_size),
+    ttl=float(settings.session_cache_ttl),
+)
+metrics_registry.register("session_cache", session_cache.stats)
+
+
+@event.listens_for(UserORM, "after_update")
+def _invalidate_updated_user(mapper, connection, target: UserORM) -> None:
+    """
+    Any flushed change to a user (activation, permissions, profile) invalidates it.
+    """
+    if session_cache.enabled:
+        session_cache.invalidate_user(target.id)
+        connection.execute(*_notify_statement(target.id))
@@ -0,0 +1,118 @@
+import asyncio
+import time
+from logging import getLogger
+from typing import Any, Dict, Optional
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from MapsPlanner_API.db.models.Session import SessionORM
+from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.metrics.registry import metrics_registry
+
+logger = getLogger("api")
+
+
+class ExpiredSessionsPurger:
+    """
+    Periodically deletes expired sessions in bounded batches.
+
+    Each batch is its own short transaction, and rows locked by another worker
+    purging at the same time are skipped, so the purge never holds long locks.
+    """
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+
+        self.total_purged = 0
+        self.last_run: Dict[str, Any] = {}
+        self.table_size: Dict[str, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def purge_batch(self, db: AsyncSession) -> int:
+        expired_sessions = (
+            select(SessionORM.token)
+            .where(SessionORM.creation_date < SessionORM.expiration_cutoff())
+            .order_by(SessionORM.creation_date)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        result = await db.execute(
+            delete(SessionORM)
+            .where(SessionORM.token.in_(expired_sessions.scalar_subquery()))
+            .execution_options(synchronize_session=False),
+        )
+        await db.commit()
+        return result.rowcount
+
+    async def purge(self, session_factory: async_sessionmaker) -> int:
+        purged = batches = 0
+        started_at = time.monotonic()
+
+        async with session_factory() as db:
+            while True:
+                batch_purged = await self.purge_batch(db)
+                purged += batch_purged
+                batches += 1
+                if batch_purged < self.batch_size:
+                    break
+                # Let other requests run between batches.
+                await asyncio.sleep(0)
+
+            self.table_size = await self._measure_table(db)
+
+        duration = time.monotonic() - started_at
+        self.total_purged += purged
+        self.last_run = {
+            "purged": purged,
+            "batches": batches,
+            "duration": duration,
+            "rows_per_second": purged / duration if duration else None,
+            "finished_at": time.time(),
+        }
+        return purged
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "total_purged": self.total_purged,
+            "last_run": self.last_run,
+            "table": self.table_size,
+        }
+
+    def start(self, session_factory: async_sessionmaker) -> None:
+        self._task = asyncio.create_task(self._purge_loop(session_factory))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _purge_loop(self, session_factory: async_sessionmaker) -> None:
+        while True:
+            try:
+                purged = await self.purge(session_factory)
+                logger.info(f"Purged {purged} expired sessions.")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Failed to purge expired sessions.")
+
+            await asyncio.sleep(self.interval)
+
+    @classmethod
+    async def _measure_table(cls, db: AsyncSession) -> Dict[str, Any]:
+        query = text(
+            "SELECT pg_total_relation_size(oid) AS total_bytes, "
+            "reltuples::bigint AS estimated_rows "
+            "FROM pg_class WHERE oid = to_regclass(:table_name)",
+        )
+        row = (await db.execute(query, {"table_name": SessionORM.__tablename__})).one()
+        return {"total_bytes": row.total_bytes, "estimated_rows": row.estimated_rows}
+
+
+expired_sessions_purger = ExpiredSessionsPurger(
+    interval=float(settings.session_purge_interval),
+    batch_size=int(settings.session_purge_batch_size),
+)
+metrics_registry.register("session_purge", expired_sessions_purger.stats)
@@ -0,0 +1,207 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import struct
+import time
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+from typing import Dict, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from MapsPlanner_API.settings import SessionTokenMode, settings
+
+logger = getLogger("api")
+
+TOKEN_PREFIX = "s1."
+
+# user_id, issued_at, expires_at, jti
+_PAYLOAD_FORMAT = struct.Struct(">QII8s")
+
+# Revocations committed slightly before the last refresh may become visible only
+# after it, so every refresh re-reads a small overlap window.
+_REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class SignedSessionToken(NamedTuple):
+    user_id: int
+    issued_at: int
+    expires_at: int
+    jti: str
+
+    @classmethod
+    def is_signed(cls, token: str) -> bool:
+        return token.startswith(TOKEN_PREFIX)
+
+    @classmethod
+    def parse(cls, token: str) -> Optional["SignedSessionToken"]:
+        """
+        Decodes the token claims, without verifying the signature.
+        """
+        try:
+            payload, _signature = token[len(TOKEN_PREFIX) :].split(".")
+            user_id, issued_at, expires_at, jti = _PAYLOAD_FORMAT.unpack(
+                _b64decode(payload),
+            )
+        except (ValueError, binascii.Error, struct.error):
+            return None
+
+        return cls(user_id, issued_at, expires_at, jti.hex())
+
+
+class RevokedSessions:
+    """
+    Compact set of revoked signed sessions, keyed by the token `jti`.
+
+    Only revocations of tokens that did not expire yet are kept; the set is loaded
+    from the sessions table and refreshed incrementally by `revoked_date`.
+    """
+
+    def __init__(self):
+        self._revoked: Dict[str, int] = {}
+        self._watermark: Optional[datetime] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self._revoked
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def add(self, claims: SignedSessionToken) -> None:
+        if claims.expires_at > time.time():
+            self._revoked[claims.jti] = claims.expires_at
+
+    def prune(self) -> None:
+        now = time.time()
+        self._revoked = {
+            jti: expires_at
+            for jti, expires_at in self._revoked.items()
+            if expires_at > now
+        }
+
+    async def refresh(self, db: AsyncSession) -> None:
+        from MapsPlanner_API.db.models.Session import SessionORM
+
+        now = datetime.now(tz=timezone.utc)
+        if self._watermark is None:
+            revoked_since = now - timedelta(seconds=settings.session_lifetime)
+        else:
+            revoked_since = self._watermark - _REFRESH_OVERLAP
+
+        query = (
+            select(SessionORM.token, SessionORM.revoked_date)
+            .where(SessionORM.revoked_date >= revoked_since)
+            .where(SessionORM.token.startswith(TOKEN_PREFIX))
+        )
+
+        for token, revoked_date in await db.execute(query):
+            if claims := SignedSessionToken.parse(token):
+                self.add(claims)
+            self._watermark = max(self._watermark or revoked_date, revoked_date)
+
+        self._watermark = self._watermark or revoked_since
+        self.prune()
+
+    def start(self, session_factory: async_sessionmaker) -> None:
+        self._refresh_task = asyncio.create_task(self._refresh_loop(session_factory))
+
+    async def stop(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    async def _refresh_loop(self, session_factory: async_sessionmaker) -> None:
+        while True:
+            try:
+                async with session_factory() as db:
+                    await self.refresh(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Failed to refresh revoked sessions.")
+
+            await asyncio.sleep(settings.session_revocation_refresh_interval)
+
+
+class SessionTokenSigner:
+    """
+    Issues and verifies HMAC signed session tokens, of the form
+    `s1.<payload>.<signature>`.
+    """
+
+    def __init__(self, secret: str, lifetime: int):
+        self._key = secret.encode()
+        self.lifetime = lifetime
+        self.revoked = RevokedSessions()
+
+    @property
+    def enabled(self) -> bool:
+        return settings.session_token_mode == SessionTokenMode.SIGNED
+
+    def validate(self) -> None:
+        """
+        Fails fast on startup when signed sessions are enabled without a secret,
+        instead of failing the first login.
+
+        @raises ValueError when `session_token_secret` is missing.
+        """
+        if self.enabled and not self._key:
+            raise ValueError("`session_token_secret` is required for signed sessions.")
+
+    def issue(self, user_id: int) -> str:
+        if not self._key:
+            raise ValueError("`session_token_secret` is required for signed sessions.")
+
+        issued_at = int(time.time())
+        payload = _b64encode(
+            _PAYLOAD_FORMAT.pack(
+                user_id,
+                issued_at,
+                issued_at + self.lifetime,
+                os.urandom(8),
+            ),
+        )
+        return f"{TOKEN_PREFIX}{payload}.{self._sign(payload)}"
+
+    def verify(self, token: str) -> Optional[SignedSessionToken]:
+        """
+        Returns the token claims if it is authentic, not expired and not revoked.
+        """
+        if not self._key or not SignedSessionToken.is_signed(token):
+            return None
+
+        payload, _, signature = token[len(TOKEN_PREFIX) :].partition(".")
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+
+        claims = SignedSessionToken.parse(token)
+        if claims is None or claims.expires_at <= time.time():
+            return None
+        if claims.jti in self.revoked:
+            return None
+
+        return claims
+
+    def _sign(self, payload: str) -> str:
+        return _b64encode(
+            hmac.new(self._key, payload.encode(), hashlib.sha256).digest()
+        )
+
+
+token_signer = SessionTokenSigner(
+    secret=settings.session_token_secret,
+    lifetime=int(settings.session_lifetime),
+)
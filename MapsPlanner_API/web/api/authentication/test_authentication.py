@@ -1,21 +1,34 @@
+import contextlib
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
 from typing import List
 
+import httpx
+import jwt
 import pytest
 from _pytest.monkeypatch import MonkeyPatch
+from cryptography.hazmat.primitives.asymmetric import rsa
 from fastapi import FastAPI
-from httpx import AsyncClient
-from requests.exceptions import HTTPError
+from httpx import AsyncClient, HTTPError
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
+from MapsPlanner_API.db.models.Session import SessionORM
 from MapsPlanner_API.db.models.User import UserORM
-from MapsPlanner_API.settings import settings
+from MapsPlanner_API.settings import SessionTokenMode, settings
 from MapsPlanner_API.utils import raise_
 from MapsPlanner_API.web.api.authentication.google_auth import (
     GoogleAuthenticator,
     GoogleUserInfo,
 )
+from MapsPlanner_API.web.api.authentication.session_cache import session_cache
+from MapsPlanner_API.web.api.authentication.session_purger import ExpiredSessionsPurger
+from MapsPlanner_API.web.api.authentication.signed_tokens import SessionTokenSigner
+from MapsPlanner_API.web.services.image_ingestion import ImageIngestion
+from MapsPlanner_API.web.services.image_store import LocalImageStore
 
 
 @pytest.mark.anyio
@@ -48,11 +61,10 @@ async def test_authentication_success(
         picture="",
     )
 
-    monkeypatch.setattr(
-        GoogleAuthenticator,
-        "get_user_info",
-        lambda code: mock_user_info,
-    )
+    async def get_user_info(code: str) -> GoogleUserInfo:
+        return mock_user_info
+
+    monkeypatch.setattr(GoogleAuthenticator, "get_user_info", get_user_info)
 
     monkeypatch.setattr(settings, "user_auto_approval", user_auto_approval)
 
@@ -87,18 +99,216 @@ async def test_authentication_success(
 
 
 @pytest.mark.anyio
-async def test_authentication_failed(
+async def test_authentication_profile_picture(
     monkeypatch: MonkeyPatch,
+    tmp_path: Path,
     fastapi_app: FastAPI,
     client: AsyncClient,
+    dbsession: AsyncSession,
 ):
+    picture = b"\x89PNG\r\n\x1a\n" + os.urandom(1024)
+    picture_url = "https://lh3.googleusercontent.test/avatar"
+    mock_user_info = GoogleUserInfo(
+        id="somefakeid",
+        email="fake@email.com",
+        verified_email=True,
+        name="Fake User",
+        given_name="Fake",
+        family_name="user",
+        picture=picture_url,
+    )
+
+    async def get_user_info(code: str) -> GoogleUserInfo:
+        return mock_user_info
+
+    monkeypatch.setattr(GoogleAuthenticator, "get_user_info", get_user_info)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200,
+            headers={"Content-Type": "image/png"},
+            content=picture,
+        )
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(
+        "MapsPlanner_API.web.services.image_ingestion.get_http_client",
+        lambda: http_client,
+    )
+    ingestion = ImageIngestion(
+        store=LocalImageStore(tmp_path),
+        max_concurrency=1,
+        max_bytes=len(picture),
+        timeout=1,
+        cache_size=8,
+    )
     monkeypatch.setattr(
-        GoogleAuthenticator,
-        "get_user_info",
-        lambda code: raise_(HTTPError()),
+        "MapsPlanner_API.web.api.users.utils.image_ingestion", ingestion
     )
 
+    @contextlib.asynccontextmanager
+    async def get_session():
+        yield dbsession
+
+    # The background task updates the user within the test transaction.
+    monkeypatch.setattr("MapsPlanner_API.web.api.users.utils.get_session", get_session)
+
+    url = fastapi_app.url_path_for("login_google")
+    await client.get(url, params={"code": "authcode"})
+
+    # The Google picture is served from the image store, along with its thumbnail.
+    user = await UserORM.get_user(dbsession, mock_user_info.email)
+    await dbsession.refresh(user)
+    picture_hash = LocalImageStore.hash_from_url(user.profile_picture)
+    assert picture_hash is not None
+    assert LocalImageStore(tmp_path).read(picture_hash) == picture
+    assert user.to_api().profile_picture_thumbnail is not None
+
+    await http_client.aclose()
+
+
+@pytest.mark.anyio
+async def test_verify_id_token(monkeypatch: MonkeyPatch):
+    signing_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    monkeypatch.setattr(GoogleAuthenticator, "client_id", "fake-client-id")
+
+    async def get_signing_key(kid: str):
+        return signing_key.public_key()
+
+    monkeypatch.setattr(
+        GoogleAuthenticator.openid_configuration,
+        "get_signing_key",
+        get_signing_key,
+    )
+
+    def make_id_token(**claims) -> str:
+        return jwt.encode(
+            {
+                "iss": "https://accounts.google.com",
+                "aud": GoogleAuthenticator.client_id,
+                "sub": "somefakeid",
+                "exp": int(time.time()) + 60,
+                **claims,
+            },
+            signing_key,
+            algorithm="RS256",
+            headers={"kid": "fake"},
+        )
+
+    # Test 1: Valid token claims are returned.
+    claims = await GoogleAuthenticator.verify_id_token(make_id_token())
+    assert claims["sub"] == "somefakeid"
+
+    # Test 2: Foreign audience, issuer or expired tokens are rejected.
+    for invalid_claims in [
+        {"aud": "another-client"},
+        {"iss": "https://evil.com"},
+        {"exp": int(time.time()) - 60},
+    ]:
+        with pytest.raises(jwt.InvalidTokenError):
+            await GoogleAuthenticator.verify_id_token(make_id_token(**invalid_claims))
+
+
+@pytest.mark.anyio
+async def test_authentication_failed(
+    monkeypatch: MonkeyPatch,
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+):
+    async def get_user_info(code: str) -> GoogleUserInfo:
+        raise_(HTTPError("Token exchange failed."))
+
+    monkeypatch.setattr(GoogleAuthenticator, "get_user_info", get_user_info)
+
     url = fastapi_app.url_path_for("login_google")
     response = await client.get(url, params={"code": "authcode"})
 
     assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.anyio
+async def test_session_cache(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    users: List[UserORM],
+):
+    session: SessionORM
+    session, *other_sessions = await users[0].awaitable_attrs.sessions
+    cookies = {"token": session.token}
+    url = fastapi_app.url_path_for("current_user")
+    session_cache.clear()
+
+    # Test 1: Second request for the same token is served from cache.
+    hits, misses = session_cache.hits, session_cache.misses
+    for _ in range(2):
+        response = await client.get(url, cookies=cookies)
+        assert response.status_code == status.HTTP_200_OK
+
+    assert session_cache.misses == misses + 1
+    assert session_cache.hits == hits + 1
+
+    # Test 2: Logout invalidates the cached session.
+    response = await client.get(fastapi_app.url_path_for("logout"), cookies=cookies)
+    assert response.status_code == status.HTTP_200_OK
+    assert session_cache.get(session.token) is None
+
+    response = await client.get(url, cookies=cookies)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_signed_session_token():
+    signer = SessionTokenSigner(secret="secret", lifetime=60)
+    token = signer.issue(user_id=7)
+
+    # Test 1: Authentic token is verified without the database.
+    claims = signer.verify(token)
+    assert claims is not None and claims.user_id == 7
+    assert claims.expires_at - claims.issued_at == 60
+
+    # Test 2: Tampered or foreign tokens are rejected.
+    assert signer.verify(token[:-1] + ("A" if token[-1] != "A" else "B")) is None
+    assert SessionTokenSigner(secret="other", lifetime=60).verify(token) is None
+
+    # Test 3: Revoked token is rejected.
+    signer.revoked.add(claims)
+    assert signer.verify(token) is None
+
+
+def test_signed_session_token_secret(monkeypatch: MonkeyPatch):
+    signer = SessionTokenSigner(secret="", lifetime=60)
+
+    # Test 1: A missing secret is accepted with opaque sessions.
+    monkeypatch.setattr(settings, "session_token_mode", SessionTokenMode.OPAQUE)
+    signer.validate()
+
+    # Test 2: A missing secret fails the startup with signed sessions.
+    monkeypatch.setattr(settings, "session_token_mode", SessionTokenMode.SIGNED)
+    with pytest.raises(ValueError):
+        signer.validate()
+
+
+@pytest.mark.anyio
+async def test_expired_session(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    users: List[UserORM],
+):
+    session = await SessionORM.create_session(dbsession, users[0])
+    session.creation_date = SessionORM.expiration_cutoff() - timedelta(minutes=1)
+    dbsession.add(session)
+    await dbsession.commit()
+
+    # Test 1: Expired session is not authenticated.
+    url = fastapi_app.url_path_for("current_user")
+    response = await client.get(url, cookies={"token": session.token})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    # Test 2: Purge deletes the expired session only.
+    purger = ExpiredSessionsPurger(interval=0, batch_size=1)
+    assert await purger.purge_batch(dbsession) == 1
+    assert await purger.purge_batch(dbsession) == 0
+
+    remaining_tokens = (await dbsession.scalars(select(SessionORM.token))).all()
+    assert session.token not in remaining_tokens
+    assert len(remaining_tokens) == len(users)
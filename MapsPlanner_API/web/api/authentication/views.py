@@ -8,6 +8,7 @@ from starlette.responses import Response
 
 from MapsPlanner_API.db.dependencies import get_db_session
 from MapsPlanner_API.db.models import SessionORM
+from MapsPlanner_API.web.api.authentication.session_cache import session_cache
 
 from .google_auth import router as google_auth_router
 
@@ -23,8 +24,13 @@ async def logout(
 ):
     token = request.cookies.get("token")
     session: Optional[SessionORM] = await db.get(SessionORM, token)
-    if session:
-        await db.delete(session)
+    if session and not session.is_revoked:
+        session.revoke()
+        await session_cache.publish_user_invalidation(
+            db,
+            session.user_id,
+            revoked_token=session.token,
+        )
         response.delete_cookie("token")
         return {"logged_out": True}
     else:
@@ -0,0 +1,333 @@
+import time
+from collections import OrderedDict
+from logging import getLogger
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set
+
+from fastapi import HTTPException
+from sqlalchemy import Integer, any_, literal, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+from starlette import status
+
+from MapsPlanner_API.db.models.Marker import MarkerORM
+from MapsPlanner_API.db.models.Trip import TripORM
+from MapsPlanner_API.db.models.User import UserORM
+from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.markers.utils import marker_id_in
+from MapsPlanner_API.web.api.metrics.registry import metrics_registry
+
+logger = getLogger("api")
+
+NOTIFY_CHANNEL = "trip_owners_cache_invalidation"
+
+
+class CachedTripOwner(NamedTuple):
+    user_id: int
+    expires_at: float
+
+
+class TripOwnersCache:
+    """
+    Bounded, TTL based LRU cache of the owners of live trips (trip -> user).
+
+    Trips never change owner, but are deleted: each worker holds its own cache,
+    and deletions are fanned out to the other workers with Postgres LISTEN/NOTIFY
+    on `NOTIFY_CHANNEL`.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._entries: OrderedDict[int, CachedTripOwner] = OrderedDict()
+        self._listener_connection: Optional[AsyncConnection] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, trip_id: int) -> Optional[int]:
+        entry = self._entries.get(trip_id)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            del self._entries[trip_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(trip_id)
+        self.hits += 1
+        return entry.user_id
+
+    def put(self, trip_id: int, user_id: int) -> None:
+        if not self.enabled:
+            return
+
+        self._entries[trip_id] = CachedTripOwner(
+            user_id=user_id,
+            expires_at=time.monotonic() + self.ttl,
+        )
+        self._entries.move_to_end(trip_id)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, trip_id: int) -> None:
+        if self._entries.pop(trip_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    async def publish_trip_deletion(self, db: AsyncSession, trip_id: int) -> None:
+        """
+        Invalidates the trip on this worker, and on the other workers once the
+        current transaction commits.
+        """
+        self.invalidate(trip_id)
+        await db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": NOTIFY_CHANNEL, "payload": str(trip_id)},
+        )
+
+    async def start_listener(self, engine: AsyncEngine) -> None:
+        if not self.enabled:
+            return
+
+        self._listener_connection = await engine.connect()
+        raw_connection = await self._listener_connection.get_raw_connection()
+        await raw_connection.driver_connection.add_listener(
+            NOTIFY_CHANNEL,
+            self._on_notification,
+        )
+
+    async def stop_listener(self) -> None:
+        if self._listener_connection is not None:
+            await self._listener_connection.close()
+            self._listener_connection = None
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str):
+        try:
+            self.invalidate(int(payload))
+        except ValueError:
+            logger.warning(f"Invalid trip owners cache notification: {payload!r}")
+
+
+trip_owners_cache = TripOwnersCache(
+    max_size=int(settings.trip_owners_cache_size),
+    ttl=float(settings.trip_owners_cache_ttl),
+)
+metrics_registry.register("trip_owners_cache", trip_owners_cache.stats)
+
+
+class OwnershipAuthorizer:
+    """
+    Decides which live trips, and markers of them, a user accesses: administrators
+    access every trip, other users the trips they own.
+
+    Ownership is read along with the checked rows, by primary key, through the
+    markers -> trips join for markers. Owners are memoized for the request, and
+    across requests in `trip_owners_cache`, so checking a trip already seen takes
+    no query.
+
+    One instance serves a request, see `get_authorizer`.
+    """
+
+    def __init__(self, db: AsyncSession, user: UserORM):
+        self.db = db
+        self.user = user
+
+        # Owner of each checked trip, None for missing or deleted trips.
+        self._trip_owners: Dict[int, Optional[int]] = {}
+        # Trip of each checked marker, None for missing markers.
+        self._marker_trips: Dict[int, Optional[int]] = {}
+
+    def _record_owner(self, trip_id: int, user_id: Optional[int]) -> None:
+        self._trip_owners[trip_id] = user_id
+        if user_id is not None:
+            trip_owners_cache.put(trip_id, user_id)
+
+    def _known_owner(self, trip_id: int) -> Optional[int]:
+        if trip_id not in self._trip_owners:
+            if (user_id := trip_owners_cache.get(trip_id)) is not None:
+                self._trip_owners[trip_id] = user_id
+
+        return self._trip_owners.get(trip_id)
+
+    def _is_owner(self, user_id: Optional[int]) -> bool:
+        return user_id is not None and (
+            self.user.is_administrator or user_id == self.user.id
+        )
+
+    def _is_denied(self, trip_id: int) -> bool:
+        """
+        @returns whether the trip is already known to be inaccessible.
+        """
+        user_id = self._known_owner(trip_id)
+        return trip_id in self._trip_owners and not self._is_owner(user_id)
+
+    async def can_access_trip(self, trip_id: int) -> bool:
+        if trip_id not in self._trip_owners and self._known_owner(trip_id) is None:
+            user_id = await self.db.scalar(
+                select(TripORM.user_id).where(
+                    TripORM.id == trip_id,
+                    TripORM.deleted_date.is_(None),
+                ),
+            )
+            self._record_owner(trip_id, user_id)
+
+        return self._is_owner(self._trip_owners[trip_id])
+
+    async def accessible_trips(self, trip_ids: Iterable[int]) -> Set[int]:
+        """
+        @returns the trips the user accesses among `trip_ids`, in a single query
+        for the trips whose owner is not known yet.
+        """
+        trip_ids = set(trip_ids)
+        unknown = {
+            trip_id
+            for trip_id in trip_ids
+            if trip_id not in self._trip_owners and self._known_owner(trip_id) is None
+        }
+        if unknown:
+            rows = await self.db.execute(
+                select(TripORM.id, TripORM.user_id).where(
+                    TripORM.id == any_(literal(list(unknown), ARRAY(Integer))),
+                    TripORM.deleted_date.is_(None),
+                ),
+            )
+            owners = {row.id: row.user_id for row in rows.all()}
+            for trip_id in unknown:
+                self._record_owner(trip_id, owners.get(trip_id))
+
+        return {
+            trip_id
+            for trip_id in trip_ids
+            if self._is_owner(self._trip_owners[trip_id])
+        }
+
+    async def authorize_trip(self, trip_id: int) -> None:
+        """
+        @raises HTTPException 404 when the user does not access the trip.
+        """
+        if not await self.can_access_trip(trip_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Trip #{trip_id} not found.",
+            )
+
+    async def load_trip(self, trip_id: int) -> TripORM:
+        """
+        @raises HTTPException 404 when the user does not access the trip.
+        """
+        trip: Optional[TripORM] = None
+        if not self._is_denied(trip_id):
+            trip = await self.db.scalar(
+                select(TripORM).where(
+                    TripORM.id == trip_id,
+                    TripORM.deleted_date.is_(None),
+                ),
+            )
+            self._record_owner(trip_id, trip.user_id if trip else None)
+
+        if trip is None or not self._is_owner(trip.user_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Trip #{trip_id} not found.",
+            )
+
+        return trip
+
+    async def load_marker(self, marker_id: int) -> MarkerORM:
+        """
+        @raises HTTPException 404 when the user does not access the marker.
+        """
+        markers = await self._load_markers([marker_id])
+        if not markers:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Marker #{marker_id} not found.",
+            )
+
+        return markers[0]
+
+    async def load_markers(self, marker_ids: Iterable[int]) -> List[MarkerORM]:
+        """
+        Loads the markers with a single query, and locks them until the end of the
+        transaction, before their trips, see `lock_trips`.
+
+        @raises HTTPException 404 when the user does not access some markers.
+        """
+        marker_ids = set(marker_ids)
+        markers = await self._load_markers(marker_ids, for_update=True)
+
+        missing = sorted(marker_ids - {marker.id for marker in markers})
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Markers not found: {missing[:20]}.",
+            )
+
+        return markers
+
+    async def _load_markers(
+        self,
+        marker_ids: Iterable[int],
+        for_update: bool = False,
+    ) -> List[MarkerORM]:
+        marker_ids = [
+            marker_id
+            for marker_id in marker_ids
+            if not (
+                marker_id in self._marker_trips
+                and (
+                    self._marker_trips[marker_id] is None
+                    or self._is_denied(self._marker_trips[marker_id])
+                )
+            )
+        ]
+        if not marker_ids:
+            return []
+
+        query = (
+            select(MarkerORM, TripORM.user_id)
+            .join(TripORM)
+            .where(marker_id_in(marker_ids), TripORM.deleted_date.is_(None))
+        )
+        if for_update:
+            # Locked in id order, as concurrent batches would deadlock otherwise.
+            query = query.order_by(MarkerORM.id).with_for_update(of=MarkerORM)
+
+        markers = []
+        for marker, user_id in (await self.db.execute(query)).all():
+            self._marker_trips[marker.id] = marker.trip_id
+            self._record_owner(marker.trip_id, user_id)
+            if self._is_owner(user_id):
+                markers.append(marker)
+
+        for marker_id in marker_ids:
+            self._marker_trips.setdefault(marker_id, None)
+
+        return markers
@@ -0,0 +1,82 @@
+import asyncio
+from typing import List
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from MapsPlanner_API.db.models.Marker import MarkerORM
+from MapsPlanner_API.db.models.Trip import TripORM
+from MapsPlanner_API.db.models.User import UserORM
+from MapsPlanner_API.web.api.authorization.ownership import (
+    OwnershipAuthorizer,
+    trip_owners_cache,
+)
+
+
+@pytest.mark.anyio
+async def test_ownership_authorizer(
+    _engine: AsyncEngine,
+    dbsession: AsyncSession,
+    users: List[UserORM],
+):
+    owner, other_user = users[0], users[1]
+    owner.is_administrator = other_user.is_administrator = False
+
+    trip = TripORM(user_id=owner.id, name="Trip", description="")
+    trip.markers = [
+        MarkerORM(
+            category=0,
+            title="Marker",
+            description="",
+            latitude=32.1,
+            longitude=34.8,
+        ),
+    ]
+    other_trip = TripORM(user_id=other_user.id, name="Other trip", description="")
+    dbsession.add_all([trip, other_trip])
+    await dbsession.commit()
+    trip_owners_cache.clear()
+
+    marker = trip.markers[0]
+    unknown_trip_id = max(trip.id, other_trip.id) + 1000
+
+    # Test 1: Users access their trips and markers only.
+    authorizer = OwnershipAuthorizer(dbsession, owner)
+    assert await authorizer.can_access_trip(trip.id)
+    assert not await authorizer.can_access_trip(other_trip.id)
+    assert (await authorizer.load_marker(marker.id)).id == marker.id
+    assert await authorizer.accessible_trips(
+        [trip.id, other_trip.id, unknown_trip_id],
+    ) == {trip.id}
+
+    with pytest.raises(HTTPException):
+        await authorizer.load_trip(other_trip.id)
+    with pytest.raises(HTTPException):
+        await OwnershipAuthorizer(dbsession, other_user).load_marker(marker.id)
+
+    # Test 2: Owners are cached across requests.
+    hits = trip_owners_cache.hits
+    assert await OwnershipAuthorizer(dbsession, owner).can_access_trip(trip.id)
+    assert trip_owners_cache.hits == hits + 1
+
+    # Test 3: Administrators access every trip.
+    other_user.is_administrator = True
+    assert await OwnershipAuthorizer(dbsession, other_user).can_access_trip(trip.id)
+
+    # Test 4: Trip deletions are fanned out to the other workers caches.
+    await trip_owners_cache.start_listener(_engine)
+    try:
+        async with AsyncSession(_engine) as other_worker_db:
+            await trip_owners_cache.publish_trip_deletion(other_worker_db, trip.id)
+            # Cached again, as by another worker, until the deletion commits.
+            trip_owners_cache.put(trip.id, owner.id)
+            await other_worker_db.commit()
+
+        for _attempt in range(100):
+            if trip_owners_cache.get(trip.id) is None:
+                break
+            await asyncio.sleep(0.01)
+        assert trip_owners_cache.get(trip.id) is None
+    finally:
+        await trip_owners_cache.stop_listener()
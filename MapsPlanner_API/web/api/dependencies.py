@@ -1,7 +1,7 @@
 from functools import partial
 from typing import Annotated, Any, Awaitable, Callable, Literal, Type
 
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Query
 from sqlalchemy import Select, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
@@ -13,7 +13,14 @@ from MapsPlanner_API.db.dependencies import get_db_session
 from MapsPlanner_API.db.models.AuditLog import AuditLogORM
 from MapsPlanner_API.db.models.Session import SessionORM
 from MapsPlanner_API.db.models.User import UserORM
-from MapsPlanner_API.web.api.query_filters import PAGE_SIZE
+from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.authentication.session_cache import session_cache
+from MapsPlanner_API.web.api.authentication.signed_tokens import (
+    SignedSessionToken,
+    token_signer,
+)
+from MapsPlanner_API.web.api.authorization.ownership import OwnershipAuthorizer
+from MapsPlanner_API.web.api.query_filters.pagination import KeysetPagination
 
 TAuditLogger = Callable[[...], Awaitable[Any]]
 
@@ -31,15 +38,39 @@ async def get_current_user(
     if not token:
         raise not_authentication_exception
 
-    session: Optional[SessionORM] = await db.get(SessionORM, token)
-    user: Optional[UserORM] = None
-
-    if session:
-        _user: UserORM = await session.awaitable_attrs.user
-        if _user.is_active:
-            user = _user
+    # Signed tokens are verified in CPU, opaque ones against the sessions table.
+    claims: Optional[SignedSessionToken] = None
+    if token_signer.enabled and SignedSessionToken.is_signed(token):
+        if (claims := token_signer.verify(token)) is None:
+            raise not_authentication_exception
 
-    if user:
+    user: Optional[UserORM] = None
+    session_expiration: Optional[float] = None
+
+    if cached_session := session_cache.get(token):
+        user = session_cache.attach_user(db, cached_session)
+    elif claims:
+        user = await db.get(UserORM, claims.user_id)
+        session_expiration = claims.expires_at
+    else:
+        # Resolve the session and its user in a single round trip.
+        query = (
+            select(UserORM, SessionORM.creation_date)
+            .join(SessionORM, SessionORM.user_id == UserORM.id)
+            .where(
+                SessionORM.token == token,
+                SessionORM.revoked_date.is_(None),
+                SessionORM.creation_date > SessionORM.expiration_cutoff(),
+            )
+        )
+        if row := (await db.execute(query)).one_or_none():
+            user, creation_date = row
+            session_expiration = creation_date.timestamp() + settings.session_lifetime
+
+    if user and not cached_session:
+        session_cache.put(token, user, session_expiration)
+
+    if user and user.is_active:
         return user
     raise not_authentication_exception
 
@@ -51,14 +82,43 @@ async def get_audit_logger(
     return partial(AuditLogORM.log, db, user=user)
 
 
-def get_queryset(model_class: Type[BaseORM], order_field: Optional[str] = "id"):
+async def get_bulk_audit_logger(
+    user: Annotated[UserORM, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+) -> TAuditLogger:
+    return partial(AuditLogORM.log_many, db, user=user)
+
+
+async def get_authorizer(
+    user: Annotated[UserORM, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+) -> OwnershipAuthorizer:
+    return OwnershipAuthorizer(db, user)
+
+
+def get_queryset(
+    model_class: Type[BaseORM],
+    order_field: Optional[str] = "id",
+    deleted: bool = False,
+):
+    """
+    @param: deleted - for soft deleted models, whether to query the deleted rows
+    rather than the live ones.
+    """
+
     async def _make_dependency(
         user: Annotated[UserORM, Depends(get_current_user)],
-        page: Optional[int] = None,
         impersonate_user_id: Optional[int | Literal["all"]] = None,
     ) -> Select:
         query = select(model_class)
 
+        if hasattr(model_class, "deleted_date"):
+            query = query.where(
+                model_class.deleted_date.is_not(None)
+                if deleted
+                else model_class.deleted_date.is_(None),
+            )
+
         # Access control - Filter by user id
         if impersonate_user_id is None or user.is_administrator is False:
             query = query.where(model_class.user_id == user.id)
@@ -69,10 +129,51 @@ def get_queryset(model_class: Type[BaseORM], order_field: Optional[str] = "id"):
         if order_field is not None:
             query = query.order_by(getattr(model_class, order_field).desc())
 
-        # Should paginate?
-        if page is not None:
-            query.slice(PAGE_SIZE * page, PAGE_SIZE)
-
         return query
 
     return _make_dependency
+
+
+def get_pagination(model_class: Type[BaseORM], order_field: str = "id"):
+    """
+    Keyset pagination of a listing, for views applying it on their own query.
+    Views should pass the fetched rows through `paginate_results`.
+    """
+
+    async def _make_dependency(
+        request: Request,
+        cursor: Optional[str] = None,
+        page_size: Annotated[
+            Optional[int],
+            Query(ge=1, le=settings.max_page_size),
+        ] = None,
+    ) -> KeysetPagination:
+        pagination = KeysetPagination(
+            model_class,
+            order_field,
+            page_size or settings.page_size,
+            cursor,
+        )
+        request.state.pagination = pagination
+
+        return pagination
+
+    return _make_dependency
+
+
+def get_paginated_queryset(model_class: Type[BaseORM], order_field: str = "id"):
+    """
+    Access controlled queryset, paginated with a `(order_field, id)` keyset cursor.
+    Views should pass the fetched rows through `paginate_results`.
+    """
+
+    async def _make_dependency(
+        query: Annotated[Select, Depends(get_queryset(model_class, order_field=None))],
+        pagination: Annotated[
+            KeysetPagination,
+            Depends(get_pagination(model_class, order_field)),
+        ],
+    ) -> Select:
+        return pagination.apply(query)
+
+    return _make_dependency
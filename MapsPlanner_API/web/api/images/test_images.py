@@ -0,0 +1,212 @@
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import List
+
+import httpx
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from fastapi import FastAPI
+from httpx import AsyncClient
+from PIL import Image
+from starlette import status
+
+from MapsPlanner_API.web.services.image_derivatives import (
+    IMAGE_SIZES,
+    EImageFormat,
+    EImageSize,
+    ImageDerivatives,
+    image_derivatives,
+)
+from MapsPlanner_API.web.services.image_ingestion import ImageFetchError, ImageIngestion
+from MapsPlanner_API.web.services.image_store import LocalImageStore, image_store
+
+PNG_IMAGE = b"\x89PNG\r\n\x1a\n" + os.urandom(1024)
+
+
+@pytest.mark.anyio
+async def test_get_image(
+    monkeypatch: MonkeyPatch,
+    tmp_path: Path,
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+):
+    monkeypatch.setattr(image_store, "root", tmp_path)
+    image_hash = await image_store.put(PNG_IMAGE)
+    url = fastapi_app.url_path_for("get_image", image_hash=image_hash)
+
+    # Test 1: Same content is stored once.
+    assert await image_store.put(PNG_IMAGE) == image_hash
+    assert len([path for path in tmp_path.rglob("*") if path.is_file()]) == 1
+
+    # Test 2: Full image is served with its ETag.
+    response = await client.get(url)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["Content-Type"] == "image/png"
+    assert response.content == PNG_IMAGE
+    etag = response.headers["ETag"]
+
+    # Test 3: Conditional request is answered without content.
+    response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    # Test 4: Range requests.
+    response = await client.get(url, headers={"Range": "bytes=10-19"})
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.headers["Content-Range"] == f"bytes 10-19/{len(PNG_IMAGE)}"
+    assert response.content == PNG_IMAGE[10:20]
+
+    response = await client.get(url, headers={"Range": f"bytes={len(PNG_IMAGE)}-"})
+    assert response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+
+    # Test 5: Unknown image.
+    response = await client.get(
+        fastapi_app.url_path_for("get_image", image_hash="0" * 64),
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.anyio
+async def test_get_image_derivative(
+    monkeypatch: MonkeyPatch,
+    tmp_path: Path,
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+):
+    monkeypatch.setattr(image_store, "root", tmp_path / "images")
+    monkeypatch.setattr(image_derivatives, "root", tmp_path / "derivatives")
+
+    picture = io.BytesIO()
+    Image.new("RGB", (1000, 500), "red").save(picture, format="PNG")
+    image_hash = await image_store.put(picture.getvalue())
+    url = fastapi_app.url_path_for("get_image", image_hash=image_hash)
+
+    # Test 1: Resized variant, in the format requested.
+    response = await client.get(url, params={"size": "small", "format": "jpeg"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["Content-Type"] == "image/jpeg"
+    with Image.open(io.BytesIO(response.content)) as thumbnail:
+        assert thumbnail.size == (IMAGE_SIZES[EImageSize.small], 160)
+
+    # Test 2: Format is negotiated by the Accept header, and cached on disk.
+    response = await client.get(
+        url,
+        params={"size": "small"},
+        headers={"Accept": "image/webp,*/*"},
+    )
+    assert response.headers["Content-Type"] == "image/webp"
+    assert response.headers["Vary"] == "Accept"
+    assert len(list((tmp_path / "derivatives").rglob("small.*"))) == 2
+
+    response = await client.get(
+        url,
+        params={"size": "small"},
+        headers={"Accept": "image/webp", "If-None-Match": response.headers["ETag"]},
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    # Test 3: Invalid size.
+    response = await client.get(url, params={"size": "huge"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.anyio
+async def test_image_derivatives_broken_pool(tmp_path: Path):
+    store = LocalImageStore(tmp_path / "images")
+    derivatives = ImageDerivatives(
+        store=store,
+        root=tmp_path / "derivatives",
+        max_workers=1,
+        quality=75,
+    )
+
+    picture = io.BytesIO()
+    Image.new("RGB", (400, 200), "red").save(picture, format="PNG")
+    image_hash = store.write(picture.getvalue())
+
+    # A pool whose worker died, as when killed for memory.
+    broken_executor = ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    with pytest.raises(BrokenProcessPool):
+        broken_executor.submit(os._exit, 1).result()
+    derivatives._executor = broken_executor
+
+    # Test 1: The pool is replaced, and the render retried on the new one.
+    path = await derivatives.get(image_hash, EImageSize.small, EImageFormat.jpeg)
+    assert path is not None and path.exists()
+    assert derivatives._executor not in {None, broken_executor}
+    assert (derivatives.rendered, derivatives.failures) == (1, 0)
+
+    derivatives.shutdown()
+
+
+@pytest.mark.anyio
+async def test_ingest_image_url(monkeypatch: MonkeyPatch, tmp_path: Path):
+    requested_paths: List[str] = []
+    shared_download = asyncio.Event()
+
+    async def oversized_image():
+        yield PNG_IMAGE
+        yield b"0"
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requested_paths.append(request.url.path)
+        headers = {"Content-Type": "image/png"}
+
+        if request.url.path == "/shared.png":
+            await shared_download.wait()
+        elif request.url.path == "/slow.png":
+            await asyncio.sleep(1)
+        elif request.url.path == "/oversized.png":
+            return httpx.Response(200, headers=headers, content=oversized_image())
+
+        return httpx.Response(200, headers=headers, content=PNG_IMAGE)
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(
+        "MapsPlanner_API.web.services.image_ingestion.get_http_client",
+        lambda: http_client,
+    )
+    ingestion = ImageIngestion(
+        store=LocalImageStore(tmp_path),
+        max_concurrency=4,
+        max_bytes=len(PNG_IMAGE),
+        timeout=0.1,
+        cache_size=8,
+    )
+
+    # Test 1: Concurrent requests for the same URL share a single download.
+    url = "https://images.test/shared.png"
+    ingestions = [asyncio.ensure_future(ingestion.ingest_url(url)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    shared_download.set()
+    image_hashes = await asyncio.gather(*ingestions)
+
+    assert len(set(image_hashes)) == 1
+    assert requested_paths == ["/shared.png"]
+    assert ingestion.downloads == 1
+
+    # Test 2: Ingested URLs are served from the cache.
+    assert await ingestion.ingest_url(url) == image_hashes[0]
+    assert requested_paths == ["/shared.png"]
+    assert ingestion.cache_hits == 1
+
+    # Test 3: The size limit is enforced while streaming, without Content-Length.
+    with pytest.raises(ImageFetchError):
+        await ingestion.ingest_url("https://images.test/oversized.png")
+
+    # Test 4: Slow downloads time out.
+    with pytest.raises(ImageFetchError):
+        await ingestion.ingest_url("https://images.test/slow.png")
+
+    assert ingestion.failures == 2
+    assert len([path for path in tmp_path.rglob("*") if path.is_file()]) == 1
+    assert ingestion.stats()["inflight"] == 0
+
+    await http_client.aclose()
@@ -0,0 +1,135 @@
+import re
+from typing import Annotated, Optional, Tuple
+
+import anyio
+from fastapi import APIRouter, HTTPException, Query
+from starlette import status
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+
+from MapsPlanner_API.web.services.image_derivatives import (
+    EImageFormat,
+    EImageSize,
+    ImageRenderError,
+    image_derivatives,
+)
+from MapsPlanner_API.web.services.image_store import ImageInfo, image_store
+
+router = APIRouter(prefix="/images", tags=["Images"])
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single `bytes=start-end` range into inclusive offsets.
+
+    @returns None when the header should be ignored (malformed or multi range).
+    @raises HTTPException 416 when the range is not satisfiable.
+    """
+    match = _RANGE_PATTERN.match(range_header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range, i.e. the last N bytes.
+        start, end = max(size - int(last), 0), size - 1
+
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+
+    return start, end
+
+
+@router.get("/{image_hash}")
+async def get_image(
+    image_hash: str,
+    request: Request,
+    size: Optional[EImageSize] = None,
+    image_format: Annotated[Optional[EImageFormat], Query(alias="format")] = None,
+) -> Response:
+    """
+    Streams a stored image. Images are immutable, so they are cacheable forever.
+
+    With `size`, a downscaled variant is served instead, in `format` or else the
+    most compact format the client accepts.
+    """
+    image: Optional[ImageInfo] = await image_store.get_info(image_hash)
+    if image is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found.",
+        )
+
+    etag = f'"{image.image_hash}"'
+    headers = {
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+
+    if size is not None:
+        if image_format is None:
+            image_format = image_derivatives.negotiate_format(
+                request.headers.get("accept", ""),
+            )
+            headers["Vary"] = "Accept"
+        elif not image_derivatives.is_supported(image_format):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported image format {image_format.value}.",
+            )
+        etag = f'"{image.image_hash}-{size.value}.{image_format.value}"'
+
+    headers["ETag"] = etag
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in if_none_match or if_none_match.strip() == "*":
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    path = image_store.path_for(image.image_hash)
+    content_type, content_size = image.content_type, image.size
+    if size is not None:
+        try:
+            path = await image_derivatives.get(image.image_hash, size, image_format)
+        except ImageRenderError:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Image cannot be resized.",
+            )
+        if path is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Image not found.",
+            )
+        content_type = image_format.content_type
+        content_size = (await anyio.to_thread.run_sync(path.stat)).st_size
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = parse_range(range_header, content_size)
+
+    if byte_range is None:
+        return StreamingResponse(
+            image_store.iter_file(path),
+            media_type=content_type,
+            headers={**headers, "Content-Length": str(content_size)},
+        )
+
+    start, end = byte_range
+    return StreamingResponse(
+        image_store.iter_file(path, start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=content_type,
+        headers={
+            **headers,
+            "Content-Range": f"bytes {start}-{end}/{content_size}",
+            "Content-Length": str(end - start + 1),
+        },
+    )
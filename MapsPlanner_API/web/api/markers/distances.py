@@ -0,0 +1,136 @@
+import json
+from enum import Enum
+from typing import AsyncIterator, Iterator, Optional, Tuple
+
+import anyio
+import numpy as np
+
+EARTH_RADIUS = 6_371_008.8  # Mean radius, in meters.
+
+# Distances computed and sent at once, rows are batched up to this many cells.
+DISTANCE_MATRIX_BLOCK_CELLS = 1 << 20
+
+
+class EDistanceMatrixFormat(str, Enum):
+    json = "json"
+    # Row-major little endian float32 meters, the shape in response headers.
+    float32 = "float32"
+
+    @property
+    def media_type(self) -> str:
+        if self == EDistanceMatrixFormat.float32:
+            return "application/octet-stream"
+
+        return "application/json"
+
+
+def to_unit_vectors(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    @returns (n, 3) points on the unit sphere. Their euclidean (chord) distance
+    orders them as their great-circle distance, without any antimeridian or pole
+    special case.
+    """
+    latitudes, longitudes = np.radians(latitudes), np.radians(longitudes)
+    cos_latitudes = np.cos(latitudes)
+    return np.column_stack(
+        (
+            cos_latitudes * np.cos(longitudes),
+            cos_latitudes * np.sin(longitudes),
+            np.sin(latitudes),
+        ),
+    )
+
+
+def chord_to_meters(chord: np.ndarray) -> np.ndarray:
+    return 2 * EARTH_RADIUS * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def great_circle_distances(
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    other_latitudes: np.ndarray,
+    other_longitudes: np.ndarray,
+) -> np.ndarray:
+    """
+    @returns the (n, m) haversine distances, in meters, between the n points and
+    the m other points, computed at once by broadcasting.
+    """
+    latitudes = np.radians(np.asarray(latitudes, dtype=np.float64))[:, None]
+    longitudes = np.radians(np.asarray(longitudes, dtype=np.float64))[:, None]
+    other_latitudes = np.radians(np.asarray(other_latitudes, dtype=np.float64))
+    other_longitudes = np.radians(np.asarray(other_longitudes, dtype=np.float64))
+
+    haversine = (
+        np.sin((other_latitudes - latitudes) / 2) ** 2
+        + np.cos(latitudes)
+        * np.cos(other_latitudes)
+        * np.sin((other_longitudes - longitudes) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(haversine, 0, 1)))
+
+
+class DistanceMatrix:
+    """
+    Great-circle distances between origins and destinations, computed and encoded
+    in blocks of rows, in a worker thread, so large matrices are streamed in
+    bounded memory without blocking the event loop.
+    """
+
+    def __init__(self, origins: np.ndarray, destinations: np.ndarray):
+        """
+        @param: origins, destinations - (n, 2) latitudes and longitudes.
+        """
+        self.origins = origins
+        self.destinations = destinations
+        columns = max(len(destinations), 1)
+        self.block_rows = max(1, DISTANCE_MATRIX_BLOCK_CELLS // columns)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.origins), len(self.destinations)
+
+    def blocks(self) -> Iterator[np.ndarray]:
+        """
+        Distances are derived from the dot products of unit vectors, a single
+        matrix product per block. It is an order of magnitude faster than
+        haversine, precise to centimeters.
+        """
+        latitudes, longitudes = self.destinations[:, 0], self.destinations[:, 1]
+        destinations = to_unit_vectors(latitudes, longitudes)
+        for start in range(0, len(self.origins), self.block_rows):
+            origins = self.origins[start : start + self.block_rows]
+            origins = to_unit_vectors(origins[:, 0], origins[:, 1])
+            squared_chords = np.maximum(2 - 2 * (origins @ destinations.T), 0)
+            yield chord_to_meters(np.sqrt(squared_chords))
+
+    async def stream(
+        self,
+        matrix_format: EDistanceMatrixFormat,
+    ) -> AsyncIterator[bytes]:
+        encode = (
+            self._encode_float32
+            if matrix_format == EDistanceMatrixFormat.float32
+            else self._encode_json
+        )
+        blocks = enumerate(self.blocks())
+
+        def next_chunk() -> Optional[bytes]:
+            # None rather than StopIteration, which can not cross threads.
+            block = next(blocks, None)
+            return None if block is None else encode(*block)
+
+        while (chunk := await anyio.to_thread.run_sync(next_chunk)) is not None:
+            yield chunk
+
+        if matrix_format == EDistanceMatrixFormat.json:
+            yield b"]}" if len(self.origins) else b'{"distances":[]}'
+
+    @classmethod
+    def _encode_float32(cls, _index: int, block: np.ndarray) -> bytes:
+        return block.astype("<f4").tobytes()
+
+    @classmethod
+    def _encode_json(cls, index: int, block: np.ndarray) -> bytes:
+        rows = np.round(block, 1).tolist()
+        encoded = ",".join(json.dumps(row) for row in rows)
+        return (("," if index else '{"distances":[') + encoded).encode()
@@ -0,0 +1,322 @@
+import csv
+import io
+import json
+import re
+from enum import Enum
+from pathlib import PurePath
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from xml.etree.ElementTree import Element, ParseError, iterparse
+
+import anyio
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from MapsPlanner_API.db.models.Marker import MarkerORM
+from MapsPlanner_API.web.api.markers.schema import (
+    MarkerImportError,
+    MarkerImportRow,
+    MarkersImportSummary,
+)
+
+# Rows parsed, validated and copied at once.
+IMPORT_CHUNK_SIZE = 5000
+# Rows errors reported back, the summary counts all of them.
+MAX_REPORTED_ERRORS = 1000
+
+_READ_SIZE = 64 * 1024
+# Largest GeoJSON feature, as a feature is decoded once fully read.
+_MAX_FEATURE_SIZE = 1024 * 1024
+# Decoding errors this close to the end of the read data may be due to a value
+# cut by the read, e.g. `nul` or `\u12`, rather than to a malformed file.
+_TRUNCATED_TAIL_SIZE = 16
+_FEATURES_PATTERN = re.compile(r'"features"\s*:\s*\[')
+
+COPY_COLUMNS = ("trip_id", "category", "title", "description", "latitude", "longitude")
+
+TRawRow = Dict[str, Any]
+
+
+class EMarkerImportFormat(str, Enum):
+    geojson = "geojson"
+    gpx = "gpx"
+    kml = "kml"
+    csv = "csv"
+
+    @classmethod
+    def from_filename(cls, filename: Optional[str]) -> Optional["EMarkerImportFormat"]:
+        suffix = PurePath(filename or "").suffix.lower().lstrip(".")
+        if suffix == "json":
+            return cls.geojson
+
+        try:
+            return cls(suffix)
+        except ValueError:
+            return None
+
+
+class MarkerImportFileError(Exception):
+    """
+    The file is malformed as a whole, rather than some of its rows.
+    """
+
+
+def _local_name(element: Element) -> str:
+    return element.tag.rsplit("}", 1)[-1]
+
+
+def _child_text(element: Element, name: str) -> Optional[str]:
+    for child in element:
+        if _local_name(child) == name:
+            return child.text
+
+    return None
+
+
+def _iter_xml_elements(file: BinaryIO, name: str) -> Iterator[Element]:
+    """
+    Yields the `name` elements of an XML file as they are parsed. Elements are
+    discarded once parsed, right after being yielded for `name` ones, or once
+    their `name` ancestor is, so the document is never held in memory.
+    """
+    parents: List[Element] = []
+    # Open `name` elements, whose descendants are kept until they are yielded.
+    open_elements = 0
+    for event, element in iterparse(file, events=("start", "end")):
+        is_yielded = _local_name(element) == name
+        if event == "start":
+            parents.append(element)
+            open_elements += is_yielded
+            continue
+
+        parents.pop()
+        if is_yielded:
+            open_elements -= 1
+            yield element
+        elif open_elements:
+            continue
+
+        element.clear()
+        if parents:
+            parents[-1].remove(element)
+
+
+def parse_csv(file: BinaryIO) -> Iterator[TRawRow]:
+    reader = csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    aliases = {
+        "name": "title",
+        "lat": "latitude",
+        "lon": "longitude",
+        "lng": "longitude",
+    }
+
+    for row in reader:
+        normalized = {}
+        for column, value in row.items():
+            column = (column or "").strip().lower()
+            normalized[aliases.get(column, column)] = value
+        yield normalized
+
+
+def parse_geojson(file: BinaryIO) -> Iterator[TRawRow]:
+    """
+    Incrementally decodes the features of a FeatureCollection, one at a time.
+    """
+    decoder = json.JSONDecoder()
+    text = io.TextIOWrapper(file, encoding="utf-8-sig")
+    buffer, position, eof = "", 0, False
+
+    def read_more() -> None:
+        nonlocal buffer, position, eof
+        data = text.read(_READ_SIZE)
+        eof = not data
+        buffer, position = buffer[position:] + data, 0
+
+    while (match := _FEATURES_PATTERN.search(buffer)) is None:
+        if eof:
+            raise MarkerImportFileError("GeoJSON must be a FeatureCollection.")
+        # Keep a tail, the key may be split between reads.
+        buffer, position = buffer[-16:], 0
+        read_more()
+    position = match.end()
+
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position == len(buffer):
+            if eof:
+                raise MarkerImportFileError("Unexpected end of GeoJSON features.")
+            read_more()
+            continue
+        if buffer[position] == "]":
+            return
+
+        try:
+            feature, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as err:
+            is_truncated = err.pos >= len(buffer) - _TRUNCATED_TAIL_SIZE or (
+                err.msg.startswith("Unterminated string")
+            )
+            if eof or not is_truncated:
+                raise MarkerImportFileError(f"Invalid GeoJSON: {err}")
+            if len(buffer) - position > _MAX_FEATURE_SIZE:
+                raise MarkerImportFileError("GeoJSON feature is too large.")
+            read_more()
+            continue
+
+        geometry = feature.get("geometry") if isinstance(feature, dict) else None
+        if not isinstance(geometry, dict) or geometry.get("type") != "Point":
+            yield {"error": "Only Point features can be imported."}
+            continue
+
+        coordinates = geometry.get("coordinates")
+        if not isinstance(coordinates, list) or len(coordinates) < 2:
+            yield {"error": "Invalid Point coordinates."}
+            continue
+
+        longitude, latitude, *_altitude = coordinates
+        properties = feature.get("properties") or {}
+        yield {
+            "title": properties.get("title") or properties.get("name"),
+            "description": properties.get("description") or "",
+            "category": properties.get("category"),
+            "latitude": latitude,
+            "longitude": longitude,
+        }
+
+
+def parse_gpx(file: BinaryIO) -> Iterator[TRawRow]:
+    for waypoint in _iter_xml_elements(file, "wpt"):
+        yield {
+            "title": _child_text(waypoint, "name"),
+            "description": _child_text(waypoint, "desc") or "",
+            "category": _child_text(waypoint, "type"),
+            "latitude": waypoint.get("lat"),
+            "longitude": waypoint.get("lon"),
+        }
+
+
+def parse_kml(file: BinaryIO) -> Iterator[TRawRow]:
+    for placemark in _iter_xml_elements(file, "Placemark"):
+        coordinates = category = None
+        for element in placemark.iter():
+            tag = _local_name(element)
+            if tag == "coordinates":
+                coordinates = (element.text or "").strip()
+            elif tag == "Data" and element.get("name") == "category":
+                category = _child_text(element, "value")
+
+        # Other geometries hold several whitespace separated coordinates.
+        if not coordinates or len(coordinates.split()) != 1:
+            yield {"error": "Only Point placemarks can be imported."}
+            continue
+
+        longitude, latitude, *_altitude = coordinates.split(",") + [None]
+        yield {
+            "title": _child_text(placemark, "name"),
+            "description": _child_text(placemark, "description") or "",
+            "category": category,
+            "latitude": latitude,
+            "longitude": longitude,
+        }
+
+
+TMarkersParser = Callable[[BinaryIO], Iterator[TRawRow]]
+
+MARKER_PARSERS: Dict[EMarkerImportFormat, TMarkersParser] = {
+    EMarkerImportFormat.csv: parse_csv,
+    EMarkerImportFormat.geojson: parse_geojson,
+    EMarkerImportFormat.gpx: parse_gpx,
+    EMarkerImportFormat.kml: parse_kml,
+}
+
+
+class MarkersImporter:
+    """
+    Imports the markers of an uploaded file into a trip.
+
+    The file is parsed incrementally, and rows are validated in chunks in a worker
+    thread and bulk loaded with `COPY`, chunk by chunk, so only a chunk is held in
+    memory at a time. Invalid rows are reported and skipped, while a malformed
+    file fails the import as a whole.
+    """
+
+    def __init__(self, db: AsyncSession, trip_id: int):
+        self.db = db
+        self.trip_id = trip_id
+
+        self.total_rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[MarkerImportError] = []
+
+    async def run(
+        self,
+        file: BinaryIO,
+        import_format: EMarkerImportFormat,
+    ) -> MarkersImportSummary:
+        rows = enumerate(MARKER_PARSERS[import_format](file), start=1)
+        connection = await (await self.db.connection()).get_raw_connection()
+
+        while records := await anyio.to_thread.run_sync(self._next_chunk, rows):
+            valid_records = [record for record in records if record is not None]
+            if valid_records:
+                await connection.driver_connection.copy_records_to_table(
+                    MarkerORM.__tablename__,
+                    records=valid_records,
+                    columns=COPY_COLUMNS,
+                )
+                self.imported += len(valid_records)
+
+        return MarkersImportSummary(
+            total_rows=self.total_rows,
+            imported=self.imported,
+            failed=self.failed,
+            errors=self.errors,
+            errors_truncated=self.failed > len(self.errors),
+        )
+
+    def _next_chunk(self, rows: Iterator[Tuple[int, TRawRow]]) -> List[Optional[tuple]]:
+        """
+        @returns the next chunk of rows as COPY records, None for invalid rows.
+        """
+        records = []
+        try:
+            for row_number, raw_row in rows:
+                records.append(self._to_record(row_number, raw_row))
+                if len(records) == IMPORT_CHUNK_SIZE:
+                    break
+        except (ParseError, UnicodeDecodeError, csv.Error) as err:
+            raise MarkerImportFileError(f"Malformed file: {err}")
+
+        self.total_rows += len(records)
+        return records
+
+    def _to_record(self, row_number: int, raw_row: TRawRow) -> Optional[tuple]:
+        try:
+            if "error" in raw_row:
+                raise ValueError(raw_row["error"])
+            row = MarkerImportRow.model_validate(raw_row)
+        except ValidationError as err:
+            return self._report(
+                row_number,
+                "; ".join(
+                    f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+                    for error in err.errors()
+                ),
+            )
+        except ValueError as err:
+            return self._report(row_number, str(err))
+
+        return (
+            self.trip_id,
+            row.category.value,
+            row.title,
+            row.description,
+            row.latitude,
+            row.longitude,
+        )
+
+    def _report(self, row_number: int, error: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(MarkerImportError(row=row_number, error=error))
@@ -0,0 +1,266 @@
+import heapq
+from logging import getLogger
+from typing import Dict, List, Optional, Set, Tuple
+
+import anyio
+import numpy as np
+from sqlalchemy import Float, Select, func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from MapsPlanner_API.db.connection import get_session
+from MapsPlanner_API.db.models.Marker import MarkerORM
+from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.markers.distances import (
+    EARTH_RADIUS,
+    chord_to_meters,
+    to_unit_vectors,
+)
+from MapsPlanner_API.web.api.markers.schema import EMarkerCategory
+from MapsPlanner_API.web.services.trip_cache import TripCache, load_markers_version
+
+logger = getLogger("api")
+
+# Maximal `k` of a nearest markers query.
+MAX_NEAREST_MARKERS = 100
+
+# Points held by a leaf, compared at once with NumPy.
+KD_TREE_LEAF_SIZE = 32
+
+
+class SphericalKDTree:
+    """
+    Static KD-tree over points on the unit sphere, stored in flat arrays.
+
+    Points are reordered so each node covers a contiguous range, and leaves are
+    scanned with vectorized NumPy operations, hence queries only run Python code
+    per visited node, a handful of them for small `k`.
+    """
+
+    def __init__(self, points: np.ndarray, leaf_size: int = KD_TREE_LEAF_SIZE):
+        self.leaf_size = leaf_size
+        self.order = np.arange(len(points))
+        self.points = points
+
+        # Per node: covered range, bounding box and children (-1 for leaves).
+        self._ranges: List[Tuple[int, int]] = []
+        self._lows: List[np.ndarray] = []
+        self._highs: List[np.ndarray] = []
+        self._children: List[Tuple[int, int]] = []
+
+        if len(points):
+            self._build(0, len(points))
+        self.points = points[self.order]
+
+    def _build(self, start: int, end: int) -> int:
+        node = len(self._ranges)
+        node_points = self.points[self.order[start:end]]
+        low, high = node_points.min(axis=0), node_points.max(axis=0)
+
+        self._ranges.append((start, end))
+        self._lows.append(low)
+        self._highs.append(high)
+        self._children.append((-1, -1))
+
+        if end - start > self.leaf_size:
+            axis = int(np.argmax(high - low))
+            middle = (end - start) // 2
+            partition = np.argpartition(node_points[:, axis], middle)
+            self.order[start:end] = self.order[start:end][partition]
+            left = self._build(start, start + middle)
+            right = self._build(start + middle, end)
+            self._children[node] = (left, right)
+
+        return node
+
+    def _box_distance(self, node: int, point: np.ndarray) -> float:
+        gap = np.maximum(self._lows[node] - point, 0) + np.maximum(
+            point - self._highs[node],
+            0,
+        )
+        return float(gap @ gap)
+
+    def query(
+        self,
+        point: np.ndarray,
+        k: int,
+        mask: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        @param: mask - booleans, by original point index, of the points to consider.
+        @returns original indices of the k nearest points, and their squared chord
+        distances, nearest first.
+        """
+        best_indices = np.empty(0, dtype=np.int64)
+        best_distances = np.empty(0)
+        if not self._ranges:
+            return best_indices, best_distances
+
+        heap = [(0.0, 0)]
+        while heap:
+            box_distance, node = heapq.heappop(heap)
+            if len(best_distances) == k and box_distance > best_distances[-1]:
+                break
+
+            left, right = self._children[node]
+            if left >= 0:
+                for child in (left, right):
+                    heapq.heappush(heap, (self._box_distance(child, point), child))
+                continue
+
+            start, end = self._ranges[node]
+            indices = self.order[start:end]
+            offsets = self.points[start:end] - point
+            distances = np.einsum("ij,ij->i", offsets, offsets)
+            if mask is not None:
+                kept = mask[indices]
+                indices, distances = indices[kept], distances[kept]
+
+            best_indices = np.concatenate((best_indices, indices))
+            best_distances = np.concatenate((best_distances, distances))
+            nearest = np.argsort(best_distances, kind="stable")[:k]
+            best_indices = best_indices[nearest]
+            best_distances = best_distances[nearest]
+
+        return best_indices, best_distances
+
+
+class TripMarkersIndex:
+    """
+    Nearest neighbour index of the markers of a trip.
+    """
+
+    def __init__(self, ids: np.ndarray, categories: np.ndarray, tree: SphericalKDTree):
+        self.ids = ids
+        self.categories = categories
+        self.tree = tree
+
+    @classmethod
+    def build(
+        cls,
+        ids: np.ndarray,
+        categories: np.ndarray,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+    ) -> "TripMarkersIndex":
+        return cls(
+            ids=ids,
+            categories=categories,
+            tree=SphericalKDTree(to_unit_vectors(latitudes, longitudes)),
+        )
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int,
+        categories: Optional[List[EMarkerCategory]] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        @returns `(marker id, distance in meters)` of the k nearest markers.
+        """
+        mask = None
+        if categories:
+            mask = np.isin(self.categories, [category.value for category in categories])
+
+        point = to_unit_vectors(np.array([latitude]), np.array([longitude]))[0]
+        indices, distances = self.tree.query(point, k, mask)
+        meters = chord_to_meters(np.sqrt(distances))
+        return list(zip(self.ids[indices].tolist(), meters.tolist()))
+
+
+def great_circle_distance(latitude: float, longitude: float):
+    """
+    @returns the haversine distance, in meters, of markers to the point.
+    """
+    latitude_param = func.radians(literal(latitude, Float))
+    marker_latitude = func.radians(MarkerORM.latitude)
+    half_latitude_delta = (marker_latitude - latitude_param) / 2
+    half_longitude_delta = (
+        func.radians(MarkerORM.longitude) - func.radians(literal(longitude, Float))
+    ) / 2
+
+    haversine = func.power(func.sin(half_latitude_delta), 2) + func.cos(
+        latitude_param,
+    ) * func.cos(marker_latitude) * func.power(func.sin(half_longitude_delta), 2)
+    return 2 * EARTH_RADIUS * func.asin(func.least(func.sqrt(haversine), 1.0))
+
+
+def nearest_markers_query(
+    markers_query: Select,
+    latitude: float,
+    longitude: float,
+    k: int,
+) -> Select:
+    """
+    SQL fallback for trips without a built index, and queries across trips.
+
+    @param: markers_query - access controlled markers query, narrowed through the
+    markers trip index.
+    @returns `(MarkerORM, distance)` rows of the k nearest markers.
+    """
+    distance = great_circle_distance(latitude, longitude).label("distance")
+    return markers_query.add_columns(distance).order_by(distance).limit(k)
+
+
+class NearestMarkers:
+    """
+    Serves nearest markers queries of trips from in-memory indexes.
+
+    Indexes are built lazily, in the background after the first query of a trip
+    version, which is answered by SQL meanwhile.
+    """
+
+    def __init__(self, cache: TripCache[TripMarkersIndex]):
+        self.cache = cache
+        self._building: Set[int] = set()
+
+    def get(self, trip_id: int, markers_version: int) -> Optional[TripMarkersIndex]:
+        return self.cache.get(trip_id, markers_version)
+
+    async def build(self, trip_id: int) -> None:
+        if trip_id in self._building:
+            return
+
+        self._building.add(trip_id)
+        try:
+            async with get_session() as db:
+                markers_version = await load_markers_version(db, trip_id)
+                index = await self.load(db, trip_id)
+            self.cache.put(trip_id, markers_version, index)
+        except Exception:
+            logger.exception(f"Failed to index markers of trip #{trip_id}.")
+        finally:
+            self._building.discard(trip_id)
+
+    @classmethod
+    async def load(cls, db: AsyncSession, trip_id: int) -> TripMarkersIndex:
+        rows = (
+            await db.execute(
+                select(
+                    MarkerORM.id,
+                    MarkerORM.category,
+                    MarkerORM.latitude,
+                    MarkerORM.longitude,
+                ).where(MarkerORM.trip_id == trip_id),
+            )
+        ).all()
+
+        columns: Dict[str, np.ndarray] = {
+            "ids": np.array([row.id for row in rows], dtype=np.int64),
+            "categories": np.array([row.category for row in rows], dtype=np.int16),
+            "latitudes": np.array([row.latitude for row in rows], dtype=np.float64),
+            "longitudes": np.array([row.longitude for row in rows], dtype=np.float64),
+        }
+        # Building is CPU bound, keep it off the event loop.
+        return await anyio.to_thread.run_sync(
+            lambda: TripMarkersIndex.build(**columns),
+        )
+
+
+nearest_markers = NearestMarkers(
+    TripCache(
+        "nearest_markers",
+        max_size=int(settings.marker_index_cache_size),
+        ttl=float(settings.marker_index_ttl),
+    ),
+)
@@ -1,7 +1,8 @@
+import datetime
 from enum import IntEnum
-from typing import List, Optional
+from typing import Any, List, Optional, Tuple
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 
 class EMarkerCategory(IntEnum):
@@ -23,6 +24,15 @@ class Marker(BaseModel):
     longitude: float
 
 
+class NearestMarker(Marker):
+    distance: float = Field(description="Great-circle distance, in meters.")
+
+
+class VersionedMarker(Marker):
+    version: int  # Trip markers version of the marker last write.
+    updated_at: datetime.datetime
+
+
 class APIMarkerCreationRequest(BaseModel):
     trip_id: int
     category: EMarkerCategory
@@ -32,12 +42,91 @@ class APIMarkerCreationRequest(BaseModel):
     longitude: float
 
 
+class MarkerCreationRejection(BaseModel):
+    index: int  # Of the marker in the request
+    trip_id: int
+    error: str
+
+
+class MarkersCreationResult(BaseModel):
+    created: List[Marker]
+    rejected: List[MarkerCreationRejection]
+
+
 class APIMarkerUpdateRequest(BaseModel):
     category: Optional[EMarkerCategory] = None
     title: Optional[str] = None
     description: Optional[str] = None
 
 
+class APIMarkerBatchUpdateRequest(APIMarkerUpdateRequest):
+    id: int
+
+
 class APIMarkerGenerationRequest(BaseModel):
     trip_id: int
     categories: List[EMarkerCategory]
+
+
+class MarkerImportRow(BaseModel):
+    title: str
+    description: str = ""
+    category: EMarkerCategory = EMarkerCategory.Nature
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+
+    @field_validator("category", mode="before")
+    def validate_category(cls, category: Any) -> Any:
+        """
+        Imported files may name the category rather than number it.
+        """
+        if category is None or category == "":
+            return EMarkerCategory.Nature
+        if isinstance(category, str) and not category.isdigit():
+            try:
+                return EMarkerCategory[category]
+            except KeyError:
+                raise ValueError(f"Unknown category {category!r}.")
+
+        return int(category)
+
+
+class MarkerImportError(BaseModel):
+    row: int
+    error: str
+
+
+class MarkersImportSummary(BaseModel):
+    total_rows: int
+    imported: int
+    failed: int
+    errors: List[MarkerImportError]
+    errors_truncated: bool
+
+
+class APIDistanceMatrixPoints(BaseModel):
+    """
+    Either markers, or coordinates as (latitude, longitude) pairs.
+    """
+
+    marker_ids: Optional[List[int]] = None
+    coordinates: Optional[List[Tuple[float, float]]] = None
+
+    @model_validator(mode="after")
+    def validate_points(self) -> "APIDistanceMatrixPoints":
+        if (self.marker_ids is None) == (self.coordinates is None):
+            raise ValueError("Either marker_ids or coordinates must be given.")
+
+        for latitude, longitude in self.coordinates or []:
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise ValueError(f"Invalid coordinates: {latitude}, {longitude}.")
+
+        return self
+
+    def __len__(self) -> int:
+        return len(self.marker_ids or self.coordinates or [])
+
+
+class APIDistanceMatrixRequest(BaseModel):
+    origins: APIDistanceMatrixPoints
+    destinations: Optional[APIDistanceMatrixPoints] = None  # Defaults to origins
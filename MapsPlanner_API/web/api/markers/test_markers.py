@@ -0,0 +1,454 @@
+import io
+import json
+import tracemalloc
+from typing import Awaitable, Callable, List
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from MapsPlanner_API.db.models.AuditLog import AuditLogORM, EAuditAction
+from MapsPlanner_API.db.models.Marker import MarkerORM
+from MapsPlanner_API.db.models.Session import SessionORM
+from MapsPlanner_API.db.models.Trip import TripORM
+from MapsPlanner_API.db.models.User import UserORM
+from MapsPlanner_API.web.api.markers.importers import (
+    MarkerImportFileError,
+    parse_geojson,
+    parse_gpx,
+)
+from MapsPlanner_API.web.api.markers.nearest import NearestMarkers, nearest_markers
+from MapsPlanner_API.web.api.markers.schema import (
+    MarkersCreationResult,
+    MarkersImportSummary,
+)
+from MapsPlanner_API.web.services.trip_cache import load_markers_version
+
+
+@pytest.mark.anyio
+async def test_create_markers(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    users: List[UserORM],
+    access_token: SessionORM,
+    trip_factory: Callable[..., Awaitable[TripORM]],
+):
+    access_user = await access_token.awaitable_attrs.user
+    trip = await trip_factory()
+    other_trip = await trip_factory(owner=users[1], name="Other trip")
+
+    def creation_request(trip_id: int, title: str):
+        return {
+            "trip_id": trip_id,
+            "category": 1,
+            "title": title,
+            "description": "",
+            "latitude": 32.1,
+            "longitude": 34.8,
+        }
+
+    # Test 1: Markers of other users trips are rejected, unless by administrators.
+    response = await client.post(
+        fastapi_app.url_path_for("create_markers"),
+        json=[
+            creation_request(trip.id, "First"),
+            creation_request(other_trip.id, "Rejected"),
+            creation_request(trip.id, "Second"),
+        ],
+        cookies={"token": access_token.token},
+    )
+    expected_status_code = (
+        status.HTTP_201_CREATED if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+    result = MarkersCreationResult(**response.json())
+
+    if access_user.is_administrator:
+        assert [marker.title for marker in result.created] == [
+            "First",
+            "Rejected",
+            "Second",
+        ]
+        assert not result.rejected
+    else:
+        assert [marker.title for marker in result.created] == ["First", "Second"]
+        assert all(marker.trip_id == trip.id for marker in result.created)
+        assert [
+            (rejection.index, rejection.trip_id) for rejection in result.rejected
+        ] == [(1, other_trip.id)]
+
+    markers_count = await dbsession.scalar(
+        select(func.count()).where(MarkerORM.trip_id == trip.id),
+    )
+    assert markers_count == 2
+
+
+@pytest.mark.anyio
+async def test_update_and_delete_markers(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    access_token: SessionORM,
+    trip_factory: Callable[..., Awaitable[TripORM]],
+):
+    access_user = await access_token.awaitable_attrs.user
+    trip = await trip_factory(markers=[{"category": 0}] * 3)
+
+    url = fastapi_app.url_path_for("update_markers")
+    cookies = {"token": access_token.token}
+    marker_ids = [marker.id for marker in trip.markers]
+    unknown_marker_id = max(marker_ids) + 1000
+
+    # Test 1: Markers are updated at once, fields left out are kept.
+    response = await client.patch(
+        url,
+        json=[
+            {"id": marker_ids[0], "category": 4},
+            {"id": marker_ids[1], "title": "Renamed"},
+        ],
+        cookies=cookies,
+    )
+    expected_status_code = (
+        status.HTTP_200_OK if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+    assert [(marker["category"], marker["title"]) for marker in response.json()] == [
+        (4, "Marker 0"),
+        (0, "Renamed"),
+    ]
+
+    audit_logs_count = await dbsession.scalar(
+        select(func.count()).where(
+            AuditLogORM.action == EAuditAction.Modification,
+            AuditLogORM.target_id.in_(marker_ids),
+        ),
+    )
+    assert audit_logs_count == 2
+
+    # Test 2: Batches with an unknown marker are not applied.
+    response = await client.patch(
+        url,
+        json=[
+            {"id": marker_ids[2], "category": 4},
+            {"id": unknown_marker_id, "category": 4},
+        ],
+        cookies=cookies,
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    category = await dbsession.scalar(
+        select(MarkerORM.category).where(MarkerORM.id == marker_ids[2]),
+    )
+    assert category == 0
+
+    # Test 3: Markers are deleted at once.
+    response = await client.request(
+        "DELETE",
+        fastapi_app.url_path_for("delete_markers"),
+        json=marker_ids[:2],
+        cookies=cookies,
+    )
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    remaining_ids = await dbsession.scalars(
+        select(MarkerORM.id).where(MarkerORM.trip_id == trip.id).order_by(MarkerORM.id),
+    )
+    assert remaining_ids.all() == marker_ids[2:]
+
+
+@pytest.mark.anyio
+async def test_import_markers(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    access_token: SessionORM,
+    trip_factory: Callable[..., Awaitable[TripORM]],
+):
+    access_user = await access_token.awaitable_attrs.user
+    trip = await trip_factory()
+
+    url = fastapi_app.url_path_for("import_markers", trip_id=trip.id)
+    cookies = {"token": access_token.token}
+    csv_file = (
+        "title,description,category,lat,lon\n"
+        "Beach,,Beach,32.1,34.7\n"
+        "Park,Nice,3,32.2,34.8\n"
+        "Nowhere,,Beach,132.2,34.8\n"
+    )
+
+    # Test 1: Valid rows are imported, invalid ones are reported.
+    response = await client.post(
+        url,
+        files={"file": ("places.csv", csv_file, "text/csv")},
+        cookies=cookies,
+    )
+    expected_status_code = (
+        status.HTTP_201_CREATED if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+    summary = MarkersImportSummary(**response.json())
+    assert (summary.total_rows, summary.imported, summary.failed) == (3, 2, 1)
+    assert summary.errors[0].row == 3
+
+    markers_count = await dbsession.scalar(
+        select(func.count()).where(MarkerORM.trip_id == trip.id),
+    )
+    assert markers_count == 2
+
+    # Test 2: Malformed files are rejected as a whole.
+    response = await client.post(
+        url,
+        files={"file": ("places.geojson", '{"features": [{"geometry"', "text/json")},
+        cookies=cookies,
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_markers_import_parsers():
+    # Test 1: Elements around the imported ones are not kept while parsing.
+    track_points = "".join(
+        f'<trkpt lat="32.{index}" lon="34.{index}"><ele>10</ele></trkpt>'
+        for index in range(50_000)
+    )
+    gpx_file = io.BytesIO(
+        (
+            '<gpx xmlns="http://www.topografix.com/GPX/1/1">'
+            f"<trk><trkseg>{track_points}</trkseg></trk>"
+            '<wpt lat="32.1" lon="34.8"><name>Beach</name></wpt>'
+            "</gpx>"
+        ).encode(),
+    )
+    tracemalloc.start()
+    try:
+        rows = list(parse_gpx(gpx_file))
+        _size, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert [row["title"] for row in rows] == ["Beach"]
+    assert peak < 2 * 1024 * 1024
+
+    # Test 2: Features are decoded whatever their split between reads.
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [34.8, 32.1]},
+            "properties": {"name": f"\u00e9{'x' * index}", "category": None},
+        }
+        for index in range(3000)
+    ]
+    geojson_file = io.BytesIO(
+        json.dumps({"type": "FeatureCollection", "features": features}).encode(),
+    )
+    titles = [row["title"] for row in parse_geojson(geojson_file)]
+    assert titles == [feature["properties"]["name"] for feature in features]
+
+    # Test 3: Malformed features fail without reading the rest of the file.
+    read_sizes = []
+
+    class ReadSizesFile(io.BytesIO):
+        def read1(self, size: int = -1) -> bytes:
+            data = super().read1(size)
+            read_sizes.append(len(data))
+            return data
+
+    geojson_file = ReadSizesFile(
+        b'{"type": "FeatureCollection", "features": [{"geometry": oops}, '
+        + b'{"geometry": null}, ' * 1_000_000
+        + b"]}",
+    )
+    with pytest.raises(MarkerImportFileError):
+        list(parse_geojson(geojson_file))
+    assert 0 < sum(read_sizes) < 1024 * 1024
+
+
+@pytest.mark.anyio
+async def test_get_markers_in_bounding_box(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    access_token: SessionORM,
+    trip_factory: Callable[..., Awaitable[TripORM]],
+):
+    access_user = await access_token.awaitable_attrs.user
+    trip = await trip_factory(
+        markers=[
+            {"title": title, "latitude": latitude, "longitude": longitude}
+            for title, latitude, longitude in [
+                ("Fiji", -17.7, 178.1),
+                ("Samoa", -13.8, -172.1),
+                ("Tel Aviv", 32.1, 34.8),
+            ]
+        ],
+    )
+
+    url = fastapi_app.url_path_for("get_markers_in_bounding_box")
+    cookies = {"token": access_token.token}
+
+    # Test 1: Only markers inside the box are returned.
+    response = await client.get(
+        url,
+        params={"bbox": "30,30,40,40", "trip_id": trip.id},
+        cookies=cookies,
+    )
+    expected_status_code = (
+        status.HTTP_200_OK if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+    assert [marker["title"] for marker in response.json()] == ["Tel Aviv"]
+
+    # Test 2: Boxes crossing the antimeridian.
+    response = await client.get(
+        url,
+        params={"bbox": "170,-20,-170,-10", "trip_id": trip.id},
+        cookies=cookies,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert {marker["title"] for marker in response.json()} == {"Fiji", "Samoa"}
+
+    # Test 3: Invalid boxes are rejected.
+    response = await client.get(url, params={"bbox": "0,40,10,30"}, cookies=cookies)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.anyio
+async def test_get_nearest_markers(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    access_token: SessionORM,
+    trip_factory: Callable[..., Awaitable[TripORM]],
+):
+    access_user = await access_token.awaitable_attrs.user
+    trip = await trip_factory(
+        markers=[
+            {
+                "title": title,
+                "category": category,
+                "latitude": latitude,
+                "longitude": longitude,
+            }
+            for title, category, latitude, longitude in [
+                ("Fiji", 4, -17.7, 178.1),
+                ("Samoa", 4, -13.8, -172.1),
+                ("Tel Aviv", 2, 32.1, 34.8),
+            ]
+        ],
+    )
+
+    url = fastapi_app.url_path_for("get_nearest_markers")
+    cookies = {"token": access_token.token}
+    params = {"lat": -16, "lon": -179, "k": 2, "trip_id": trip.id}
+
+    # Test 1: Cold trips are served by SQL, nearest first, across the antimeridian.
+    response = await client.get(url, params=params, cookies=cookies)
+    expected_status_code = (
+        status.HTTP_200_OK if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+    assert [marker["title"] for marker in response.json()] == ["Fiji", "Samoa"]
+    sql_distances = [marker["distance"] for marker in response.json()]
+
+    # Test 2: Indexed trips give the same results.
+    nearest_markers.cache.put(
+        trip.id,
+        await load_markers_version(dbsession, trip.id),
+        await NearestMarkers.load(dbsession, trip.id),
+    )
+    response = await client.get(url, params=params, cookies=cookies)
+    assert [marker["title"] for marker in response.json()] == ["Fiji", "Samoa"]
+    assert [marker["distance"] for marker in response.json()] == pytest.approx(
+        sql_distances,
+    )
+
+    # Test 3: Indexes are not served once the trip markers are written, be it by
+    # another worker.
+    dbsession.add(
+        MarkerORM(
+            trip_id=trip.id,
+            category=4,
+            title="Taveuni",
+            description="",
+            latitude=-16.8,
+            longitude=-179.9,
+        ),
+    )
+    await dbsession.commit()
+    response = await client.get(url, params=params, cookies=cookies)
+    assert [marker["title"] for marker in response.json()] == ["Taveuni", "Fiji"]
+
+    # Test 4: Category filter.
+    response = await client.get(
+        url,
+        params={**params, "category": 2},
+        cookies=cookies,
+    )
+    assert [marker["title"] for marker in response.json()] == ["Tel Aviv"]
+
+
+@pytest.mark.anyio
+async def test_get_distance_matrix(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    access_token: SessionORM,
+    trip_factory: Callable[..., Awaitable[TripORM]],
+):
+    access_user = await access_token.awaitable_attrs.user
+    trip = await trip_factory(
+        markers=[{"latitude": 0.0, "longitude": longitude} for longitude in [0.0, 1.0]],
+    )
+
+    url = fastapi_app.url_path_for("get_distance_matrix")
+    cookies = {"token": access_token.token}
+    marker_ids = [marker.id for marker in trip.markers]
+
+    # Test 1: Distances between markers.
+    response = await client.post(
+        url,
+        json={"origins": {"marker_ids": marker_ids}},
+        cookies=cookies,
+    )
+    expected_status_code = (
+        status.HTTP_200_OK if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+    distances = response.json()["distances"]
+    assert distances[0][0] == distances[1][1] == 0
+    assert distances[0][1] == pytest.approx(111_195, rel=1e-3)
+
+    # Test 2: Coordinates, as float32.
+    response = await client.post(
+        url,
+        params={"format": "float32"},
+        json={
+            "origins": {"marker_ids": marker_ids},
+            "destinations": {"coordinates": [[0.0, 2.0], [0.0, 3.0], [0.0, 4.0]]},
+        },
+        cookies=cookies,
+    )
+    assert response.headers["X-Matrix-Rows"] == "2"
+    assert response.headers["X-Matrix-Columns"] == "3"
+    distances = np.frombuffer(response.content, dtype="<f4").reshape(2, 3)
+    assert distances[1, 0] == pytest.approx(111_195, rel=1e-3)
+
+    # Test 3: Unknown markers.
+    response = await client.post(
+        url,
+        json={"origins": {"marker_ids": [-1]}},
+        cookies=cookies,
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -1,23 +1,200 @@
-from typing import Optional
+from typing import Iterable, List
 
-from sqlalchemy import select
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import (
+    ColumnElement,
+    Float,
+    Insert,
+    Integer,
+    Select,
+    String,
+    Update,
+    any_,
+    func,
+    insert,
+    literal,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
 
 from MapsPlanner_API.db.models.Marker import MarkerORM
+from MapsPlanner_API.db.models.Trip import TripORM
 from MapsPlanner_API.db.models.User import UserORM
+from MapsPlanner_API.web.api.markers.schema import (
+    APIDistanceMatrixPoints,
+    APIMarkerBatchUpdateRequest,
+    APIMarkerCreationRequest,
+)
 
 
-async def validate_marker_for_user(
+def marker_id_in(marker_ids: Iterable[int]) -> ColumnElement[bool]:
+    """
+    `id = ANY(:ids)`, which binds a single array however many ids are given.
+    """
+    return MarkerORM.id == any_(literal(list(marker_ids), ARRAY(Integer)))
+
+
+async def lock_trips(db: AsyncSession, trip_ids: Iterable[int]) -> None:
+    """
+    Locks the trips rows in id order, until the end of the transaction.
+
+    Writing markers locks their trip, see MarkerORM triggers, in the order the
+    statement writes them: writes of several trips lock them first, so that
+    concurrent writes wait on each other instead of deadlocking.
+    """
+    await db.execute(
+        select(TripORM.id)
+        .where(TripORM.id == any_(literal(sorted(set(trip_ids)), ARRAY(Integer))))
+        .order_by(TripORM.id)
+        .with_for_update(),
+    )
+
+
+def accessible_markers_query(user: UserORM) -> Select:
+    """
+    @returns the markers of the live trips the user may access.
+    """
+    query = select(MarkerORM).join(TripORM).where(TripORM.deleted_date.is_(None))
+    if not user.is_administrator:
+        query = query.where(TripORM.user_id == user.id)
+
+    return query
+
+
+async def resolve_points(
     db: AsyncSession,
     user: UserORM,
-    marker_id: int,
-) -> Optional[MarkerORM]:
-    where_clause = [MarkerORM.id == marker_id]
-    if not user.is_administrator:
-        user_trips_ids = [trip.id for trip in await user.awaitable_attrs.trips]
-        where_clause.append(MarkerORM.trip_id.in_(user_trips_ids))
+    points: APIDistanceMatrixPoints,
+) -> np.ndarray:
+    """
+    @returns (n, 2) latitudes and longitudes of the points, in their order.
+    @raises HTTPException 404 when some markers are not accessible to the user.
+    """
+    if points.coordinates is not None:
+        return np.array(points.coordinates, dtype=np.float64).reshape(-1, 2)
+
+    query = (
+        accessible_markers_query(user)
+        .with_only_columns(MarkerORM.id, MarkerORM.latitude, MarkerORM.longitude)
+        .where(MarkerORM.id.in_(set(points.marker_ids)))
+    )
+    locations = {
+        row.id: (row.latitude, row.longitude) for row in (await db.execute(query)).all()
+    }
+
+    missing = sorted(set(points.marker_ids) - locations.keys())
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Markers not found: {missing[:20]}.",
+        )
+
+    return np.array(
+        [locations[marker_id] for marker_id in points.marker_ids],
+        dtype=np.float64,
+    ).reshape(-1, 2)
+
+
+def markers_bulk_insert_query(
+    creation_requests: List[APIMarkerCreationRequest],
+) -> Insert:
+    """
+    Builds a single `INSERT ... SELECT FROM unnest(...) RETURNING` statement. The
+    markers are sent as one array per column, so the statement has 6 parameters
+    however many markers are inserted.
+
+    @returns the inserted markers columns.
+    """
+    column_types = {
+        "trip_id": Integer,
+        "category": Integer,
+        "title": String,
+        "description": String,
+        "latitude": Float,
+        "longitude": Float,
+    }
+    rows = (
+        func.unnest(
+            *(
+                literal(
+                    [getattr(request, column) for request in creation_requests],
+                    ARRAY(column_type),
+                )
+                for column, column_type in column_types.items()
+            ),
+        )
+        .table_valued(*column_types)
+        .render_derived()
+    )
+
+    return (
+        insert(MarkerORM)
+        .from_select(
+            list(column_types),
+            select(*(rows.c[column] for column in column_types)),
+        )
+        .returning(
+            MarkerORM.id,
+            MarkerORM.trip_id,
+            MarkerORM.category,
+            MarkerORM.title,
+            MarkerORM.description,
+            MarkerORM.latitude,
+            MarkerORM.longitude,
+        )
+    )
+
+
+def markers_bulk_update_query(
+    update_requests: List[APIMarkerBatchUpdateRequest],
+) -> Update:
+    """
+    Builds a single `UPDATE ... FROM unnest(...) RETURNING` statement, the changes
+    being sent as one array per column as in `markers_bulk_insert_query`. Fields
+    left out of a request are NULL, and keep the marker value.
 
-    query = select(MarkerORM).where(*where_clause)
+    @returns the updated markers columns.
+    """
+    column_types = {
+        "id": Integer,
+        "category": Integer,
+        "title": String,
+        "description": String,
+    }
+    changes = (
+        func.unnest(
+            *(
+                literal(
+                    [getattr(request, column) for request in update_requests],
+                    ARRAY(column_type),
+                )
+                for column, column_type in column_types.items()
+            ),
+        )
+        .table_valued(*column_types)
+        .render_derived(name="changes")
+    )
 
-    result = await db.execute(query)
-    return result.scalar_one_or_none()
+    return (
+        update(MarkerORM)
+        .where(MarkerORM.id == changes.c.id)
+        .values(
+            category=func.coalesce(changes.c.category, MarkerORM.category),
+            title=func.coalesce(changes.c.title, MarkerORM.title),
+            description=func.coalesce(changes.c.description, MarkerORM.description),
+        )
+        .returning(
+            MarkerORM.id,
+            MarkerORM.trip_id,
+            MarkerORM.category,
+            MarkerORM.title,
+            MarkerORM.description,
+            MarkerORM.latitude,
+            MarkerORM.longitude,
+        )
+        .execution_options(synchronize_session=False)
+    )
@@ -1,126 +1,266 @@
 from typing import Annotated, List, Optional
 
-import sqlalchemy.exc
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Body,
+    Depends,
+    HTTPException,
+    Query,
+    UploadFile,
+)
+from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
-from starlette.responses import Response
+from starlette.responses import Response, StreamingResponse
 
 from MapsPlanner_API.db.dependencies import get_db_session
 from MapsPlanner_API.db.models.AuditLog import EAuditAction
 from MapsPlanner_API.db.models.Marker import MarkerORM
-from MapsPlanner_API.db.models.Trip import TripORM
 from MapsPlanner_API.db.models.User import UserORM
+from MapsPlanner_API.settings import settings
 from MapsPlanner_API.utils import Timer
 from MapsPlanner_API.web import api_logger
+from MapsPlanner_API.web.api.authorization.ownership import OwnershipAuthorizer
 from MapsPlanner_API.web.api.dependencies import (
     TAuditLogger,
     get_audit_logger,
+    get_authorizer,
+    get_bulk_audit_logger,
     get_current_user,
 )
+from MapsPlanner_API.web.api.markers.distances import (
+    DistanceMatrix,
+    EDistanceMatrixFormat,
+)
+from MapsPlanner_API.web.api.markers.importers import (
+    EMarkerImportFormat,
+    MarkerImportFileError,
+    MarkersImporter,
+)
 from MapsPlanner_API.web.api.markers.logic import MarkerLogic
+from MapsPlanner_API.web.api.markers.nearest import (
+    MAX_NEAREST_MARKERS,
+    nearest_markers,
+    nearest_markers_query,
+)
 from MapsPlanner_API.web.api.markers.schema import (
+    APIDistanceMatrixRequest,
+    APIMarkerBatchUpdateRequest,
     APIMarkerCreationRequest,
     APIMarkerGenerationRequest,
     APIMarkerUpdateRequest,
+    EMarkerCategory,
     Marker,
+    MarkerCreationRejection,
+    MarkersCreationResult,
+    MarkersImportSummary,
+    NearestMarker,
 )
-from MapsPlanner_API.web.api.markers.transformers import MarkerTransformer
-from MapsPlanner_API.web.api.markers.utils import validate_marker_for_user
-from MapsPlanner_API.web.api.trips.utils import validate_trip_for_user
+from MapsPlanner_API.web.api.markers.utils import (
+    accessible_markers_query,
+    lock_trips,
+    marker_id_in,
+    markers_bulk_insert_query,
+    markers_bulk_update_query,
+    resolve_points,
+)
+from MapsPlanner_API.web.api.query_filters.bounding_box import (
+    BoundingBox,
+    BoundingBoxFilter,
+)
+from MapsPlanner_API.web.services.trip_cache import load_markers_version
 
 router = APIRouter(prefix="/markers", tags=["Markers"])
 
 
-@router.get("/{marker_id}")
-async def get_marker(
-    marker_id: int,
-    user: Annotated[UserORM, Depends(get_current_user)],
-    db: Annotated[AsyncSession, Depends(get_db_session)],
-) -> Marker:
-    marker = await validate_marker_for_user(db, user, marker_id)
-    if not marker:
+def validate_batch_size(size: int) -> None:
+    max_size = int(settings.markers_batch_max_size)
+    if size > max_size:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Marker #{marker_id} not found.",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batches are limited to {max_size} markers.",
         )
 
-    return marker.to_api()
 
-
-@router.get("/{trip_id}")
-async def get_trip_markers(
-    trip_id: int,
+@router.get("/")
+async def get_markers_in_bounding_box(
+    bbox: BoundingBoxFilter(
+        description=(
+            "minLon,minLat,maxLon,maxLat. "
+            "minLon > maxLon for boxes crossing the antimeridian."
+        ),
+        examples=["2.25,48.81,2.42,48.90", "170,-20,-170,0"],
+    ),
     user: Annotated[UserORM, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(get_db_session)],
+    trip_id: Optional[int] = None,
+    limit: Annotated[int, Query(ge=1, le=settings.bbox_max_markers)] = int(
+        settings.bbox_max_markers,
+    ),
 ) -> List[Marker]:
-    no_result_exception = HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail=f"Trip #{trip_id} not found.",
+    bounding_box: BoundingBox = bbox
+    query = accessible_markers_query(user).where(
+        bounding_box.contains(MarkerORM.longitude, MarkerORM.latitude),
     )
+    if trip_id is not None:
+        query = query.where(MarkerORM.trip_id == trip_id)
 
-    try:
-        trip_orm: TripORM = await db.get_one(TripORM, trip_id)
-        if trip_orm.is_accessible_to_user(user):
-            markers_query = select(MarkerORM).where(MarkerORM.trip_id == trip_id)
-            markers_orm = (await db.scalars(markers_query)).all()
-            print(markers_orm)
+    markers_orm = (await db.scalars(query.limit(limit))).all()
+    return [marker_orm.to_api() for marker_orm in markers_orm]
 
-            return [marker_orm.to_api() for marker_orm in markers_orm]
-        else:
-            raise no_result_exception
-    except sqlalchemy.exc.NoResultFound:
-        raise no_result_exception
 
+@router.get("/nearest")
+async def get_nearest_markers(
+    background_tasks: BackgroundTasks,
+    user: Annotated[UserORM, Depends(get_current_user)],
+    authorizer: Annotated[OwnershipAuthorizer, Depends(get_authorizer)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    lat: Annotated[float, Query(ge=-90, le=90)],
+    lon: Annotated[float, Query(ge=-180, le=180)],
+    k: Annotated[int, Query(ge=1, le=MAX_NEAREST_MARKERS)] = 10,
+    trip_id: Optional[int] = None,
+    category: Annotated[Optional[List[EMarkerCategory]], Query()] = None,
+) -> List[NearestMarker]:
+    if trip_id is not None:
+        await authorizer.authorize_trip(trip_id)
 
-@router.post("/")
-async def create_markers(
-    payload: List[APIMarkerCreationRequest],
-    response: Response,
+        markers_version = await load_markers_version(db, trip_id)
+        if (index := nearest_markers.get(trip_id, markers_version)) is not None:
+            nearest = index.nearest(lat, lon, k, category)
+            markers_query = select(MarkerORM).where(
+                MarkerORM.id.in_([marker_id for marker_id, _distance in nearest]),
+            )
+            markers = {
+                marker_orm.id: marker_orm.to_api().model_dump()
+                for marker_orm in (await db.scalars(markers_query)).all()
+            }
+            # Markers deleted meanwhile are skipped.
+            return [
+                NearestMarker(**markers[marker_id], distance=distance)
+                for marker_id, distance in nearest
+                if marker_id in markers
+            ]
+
+        background_tasks.add_task(nearest_markers.build, trip_id)
+        markers_query = select(MarkerORM).where(MarkerORM.trip_id == trip_id)
+    else:
+        markers_query = accessible_markers_query(user)
+
+    if category:
+        categories = [marker_category.value for marker_category in category]
+        markers_query = markers_query.where(MarkerORM.category.in_(categories))
+
+    rows = (await db.execute(nearest_markers_query(markers_query, lat, lon, k))).all()
+    return [
+        NearestMarker(**marker_orm.to_api().model_dump(), distance=distance)
+        for marker_orm, distance in rows
+    ]
+
+
+@router.post("/distance-matrix")
+async def get_distance_matrix(
+    payload: APIDistanceMatrixRequest,
     user: Annotated[UserORM, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(get_db_session)],
-) -> List[Marker]:
-    # Sanitize markers -- only allowed trips are count.
-    allowed_trips_query = (
-        select(TripORM.id).where(TripORM.user_id == user.id).distinct(TripORM.id)
+    matrix_format: Annotated[
+        EDistanceMatrixFormat,
+        Query(alias="format"),
+    ] = EDistanceMatrixFormat.json,
+) -> StreamingResponse:
+    """
+    Great-circle distances, in meters, from every origin to every destination.
+    """
+    max_points = int(settings.distance_matrix_max_points)
+    destinations = payload.destinations or payload.origins
+    if max(len(payload.origins), len(destinations)) > max_points:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Distance matrices are limited to {max_points} points a side.",
+        )
+
+    origins_locations = await resolve_points(db, user, payload.origins)
+    destinations_locations = (
+        origins_locations
+        if payload.destinations is None
+        else await resolve_points(db, user, payload.destinations)
     )
+    matrix = DistanceMatrix(origins_locations, destinations_locations)
 
-    allowed_trip_ids = (await db.scalars(allowed_trips_query)).all()
+    rows, columns = matrix.shape
+    headers = {"X-Matrix-Rows": str(rows), "X-Matrix-Columns": str(columns)}
+    if matrix_format == EDistanceMatrixFormat.float32:
+        headers["Content-Length"] = str(rows * columns * 4)
+
+    return StreamingResponse(
+        matrix.stream(matrix_format),
+        media_type=matrix_format.media_type,
+        headers=headers,
+    )
 
-    valid_creation_requests = [
-        creation_request
-        for creation_request in payload
-        if creation_request.trip_id in allowed_trip_ids
-    ]
 
-    markers_orm = MarkerTransformer.marker_creation_requests_to_markers(
-        valid_creation_requests,
+@router.get("/{marker_id}")
+async def get_marker(
+    marker_id: int,
+    authorizer: Annotated[OwnershipAuthorizer, Depends(get_authorizer)],
+) -> Marker:
+    marker = await authorizer.load_marker(marker_id)
+    return marker.to_api()
+
+
+@router.post("/")
+async def create_markers(
+    payload: List[APIMarkerCreationRequest],
+    response: Response,
+    authorizer: Annotated[OwnershipAuthorizer, Depends(get_authorizer)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+) -> MarkersCreationResult:
+    """
+    Markers of trips the user does not access are rejected, the others are created.
+    """
+    allowed_trip_ids = await authorizer.accessible_trips(
+        creation_request.trip_id for creation_request in payload
     )
 
-    db.add_all(markers_orm)
-    await db.commit()
+    valid_creation_requests = []
+    rejected = []
+    for index, creation_request in enumerate(payload):
+        if creation_request.trip_id in allowed_trip_ids:
+            valid_creation_requests.append(creation_request)
+        else:
+            rejected.append(
+                MarkerCreationRejection(
+                    index=index,
+                    trip_id=creation_request.trip_id,
+                    error=f"Trip #{creation_request.trip_id} not found.",
+                ),
+            )
+
+    created = []
+    if valid_creation_requests:
+        await lock_trips(
+            db,
+            (creation_request.trip_id for creation_request in valid_creation_requests),
+        )
+        result = await db.execute(markers_bulk_insert_query(valid_creation_requests))
+        created = [Marker(**row._asdict()) for row in result.all()]
+        await db.commit()
 
     response.status_code = status.HTTP_201_CREATED
-    return [marker_orm.to_api() for marker_orm in markers_orm]
+    return MarkersCreationResult(created=created, rejected=rejected)
 
 
 @router.post("/{trip_id}/generate-markers")
 async def generate_markers(
     trip_id: int,
     payload: APIMarkerGenerationRequest,
-    user: Annotated[UserORM, Depends(get_current_user)],
+    authorizer: Annotated[OwnershipAuthorizer, Depends(get_authorizer)],
     db: Annotated[AsyncSession, Depends(get_db_session)],
     audit: Annotated[TAuditLogger, Depends(get_audit_logger)],
 ) -> List[Marker]:
     assert trip_id == payload.trip_id
 
-    trip: TripORM = await validate_trip_for_user(
-        db,
-        user,
-        trip_id,
-        raise_on_not_found=True,
-    )
+    trip = await authorizer.load_trip(trip_id)
 
     generate_error: Optional[str] = None
     markers: List[MarkerORM]
@@ -154,21 +294,53 @@ async def generate_markers(
     return [marker.to_api() for marker in markers]
 
 
+@router.post("/{trip_id}/import")
+async def import_markers(
+    trip_id: int,
+    file: UploadFile,
+    response: Response,
+    authorizer: Annotated[OwnershipAuthorizer, Depends(get_authorizer)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    audit: Annotated[TAuditLogger, Depends(get_audit_logger)],
+    import_format: Annotated[
+        Optional[EMarkerImportFormat],
+        Query(alias="format", description="Defaults to the file extension."),
+    ] = None,
+) -> MarkersImportSummary:
+    trip = await authorizer.load_trip(trip_id)
+
+    import_format = import_format or EMarkerImportFormat.from_filename(file.filename)
+    if import_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unknown file format.",
+        )
+
+    try:
+        summary = await MarkersImporter(db, trip.id).run(file.file, import_format)
+    except MarkerImportFileError as err:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+
+    await audit(
+        action=EAuditAction.Creation,
+        target=trip,
+        imported_markers=summary.imported,
+    )
+
+    response.status_code = status.HTTP_201_CREATED
+    return summary
+
+
 @router.patch("/{marker_id}")
 async def update_marker(
     marker_id: int,
     payload: APIMarkerUpdateRequest,
-    user: Annotated[UserORM, Depends(get_current_user)],
+    authorizer: Annotated[OwnershipAuthorizer, Depends(get_authorizer)],
     audit: Annotated[TAuditLogger, Depends(get_audit_logger)],
     db: Annotated[AsyncSession, Depends(get_db_session)],
 ) -> Marker:
-    marker: Optional[MarkerORM] = await validate_marker_for_user(db, user, marker_id)
-
-    if marker is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Marker not found.",
-        )
+    marker = await authorizer.load_marker(marker_id)
 
     update_fields = payload.model_dump(exclude_none=True)
     changes = marker.diff(update_fields)
@@ -183,16 +355,77 @@ async def update_marker(
 async def delete_marker(
     marker_id: int,
     response: Response,
-    user: Annotated[UserORM, Depends(get_current_user)],
+    authorizer: Annotated[OwnershipAuthorizer, Depends(get_authorizer)],
     db: Annotated[AsyncSession, Depends(get_db_session)],
     audit: Annotated[TAuditLogger, Depends(get_audit_logger)],
 ):
-    marker = await validate_marker_for_user(db, user, marker_id)
-    if not marker:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Marker #{marker_id} not found.",
-        )
+    marker = await authorizer.load_marker(marker_id)
     await db.delete(marker)
     await audit(action=EAuditAction.Deletion, target=marker)
     response.status_code = status.HTTP_204_NO_CONTENT
+
+
+@router.patch("/")
+async def update_markers(
+    payload: List[APIMarkerBatchUpdateRequest],
+    authorizer: Annotated[OwnershipAuthorizer, Depends(get_authorizer)],
+    audit: Annotated[TAuditLogger, Depends(get_bulk_audit_logger)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+) -> List[Marker]:
+    """
+    Updates all the markers, or none of them when some are not found.
+    """
+    validate_batch_size(len(payload))
+    marker_ids = [update_request.id for update_request in payload]
+    if len(set(marker_ids)) != len(marker_ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Markers are updated at most once per batch.",
+        )
+    if not payload:
+        return []
+
+    markers = {
+        marker.id: marker for marker in await authorizer.load_markers(marker_ids)
+    }
+    targets = [markers[marker_id] for marker_id in marker_ids]
+    changes = [
+        markers[update_request.id].diff(
+            update_request.model_dump(exclude={"id"}, exclude_none=True),
+        )
+        for update_request in payload
+    ]
+
+    await lock_trips(db, (marker.trip_id for marker in targets))
+    result = await db.execute(markers_bulk_update_query(payload))
+    updated = {row.id: Marker(**row._asdict()) for row in result.all()}
+    await audit(EAuditAction.Modification, targets, changes=changes)
+    await db.commit()
+
+    return [updated[marker_id] for marker_id in marker_ids]
+
+
+@router.delete("/")
+async def delete_markers(
+    marker_ids: Annotated[List[int], Body()],
+    response: Response,
+    authorizer: Annotated[OwnershipAuthorizer, Depends(get_authorizer)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    audit: Annotated[TAuditLogger, Depends(get_bulk_audit_logger)],
+):
+    """
+    Deletes all the markers, or none of them when some are not found.
+    """
+    validate_batch_size(len(marker_ids))
+    if marker_ids:
+        markers = await authorizer.load_markers(marker_ids)
+        await lock_trips(db, (marker.trip_id for marker in markers))
+        await db.execute(
+            delete(MarkerORM)
+            .where(marker_id_in(marker_ids))
+            .execution_options(synchronize_session=False),
+        )
+        await audit(EAuditAction.Deletion, markers)
+        await db.commit()
+
+    response.status_code = status.HTTP_204_NO_CONTENT
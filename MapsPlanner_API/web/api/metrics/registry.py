@@ -0,0 +1,22 @@
+from typing import Any, Callable, Dict
+
+TMetricsProvider = Callable[[], Dict[str, Any]]
+
+
+class MetricsRegistry:
+    """
+    Collects in-process counters exposed by the different components of the API.
+    Each component registers a provider that returns a snapshot of its counters.
+    """
+
+    def __init__(self):
+        self._providers: Dict[str, TMetricsProvider] = {}
+
+    def register(self, name: str, provider: TMetricsProvider) -> None:
+        self._providers[name] = provider
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        return {name: provider() for name, provider in self._providers.items()}
+
+
+metrics_registry = MetricsRegistry()
@@ -0,0 +1,24 @@
+import os
+from typing import Annotated, Any, Dict
+
+from fastapi import APIRouter, Depends, HTTPException
+from starlette import status
+
+from MapsPlanner_API.db.models.User import UserORM
+from MapsPlanner_API.web.api.dependencies import get_current_user
+from MapsPlanner_API.web.api.metrics.registry import metrics_registry
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@router.get("/")
+async def metrics(
+    user: Annotated[UserORM, Depends(get_current_user)],
+) -> Dict[str, Any]:
+    """
+    Returns the counters of the worker that served the request.
+    """
+    if not user.is_administrator:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found.")
+
+    return {"worker_pid": os.getpid(), **metrics_registry.collect()}
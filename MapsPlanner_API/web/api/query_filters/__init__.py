@@ -1,3 +1,4 @@
-PAGE_SIZE = 20
-
+from .bounding_box import BoundingBox, BoundingBoxFilter
 from .date_range import DateRangeFilter
+from .pagination import KeysetPagination, paginate_results
+from .search import FullTextSearchFilterMixin
@@ -0,0 +1,84 @@
+from typing import NamedTuple
+
+from fastapi.params import Query
+from pydantic import AfterValidator
+from sqlalchemy import Float, func, literal, or_
+from sqlalchemy.sql import ColumnElement
+from typing_extensions import Annotated
+
+
+class BoundingBox(NamedTuple):
+    min_longitude: float
+    min_latitude: float
+    max_longitude: float
+    max_latitude: float
+
+    @property
+    def crosses_antimeridian(self) -> bool:
+        return self.min_longitude > self.max_longitude
+
+    def contains(
+        self,
+        longitude: ColumnElement,
+        latitude: ColumnElement,
+    ) -> ColumnElement:
+        """
+        Matches points inside the box, served by a GiST index over
+        `point(longitude, latitude)`. A box crossing the antimeridian is split in
+        two boxes, one on each side of it.
+        """
+        location = func.point(longitude, latitude)
+
+        def _box(min_longitude: float, max_longitude: float) -> ColumnElement:
+            return location.op("<@", is_comparison=True)(
+                func.box(
+                    func.point(
+                        literal(min_longitude, Float),
+                        literal(self.min_latitude, Float),
+                    ),
+                    func.point(
+                        literal(max_longitude, Float),
+                        literal(self.max_latitude, Float),
+                    ),
+                ),
+            )
+
+        if self.crosses_antimeridian:
+            return or_(
+                _box(self.min_longitude, 180.0),
+                _box(-180.0, self.max_longitude),
+            )
+
+        return _box(self.min_longitude, self.max_longitude)
+
+
+def bounding_box_param_validator(bbox: str) -> BoundingBox:
+    try:
+        bounding_box = BoundingBox(*(float(value) for value in bbox.split(",")))
+    except (TypeError, ValueError) as err:
+        raise ValueError(
+            "Bounding box must be minLon,minLat,maxLon,maxLat.",
+        ) from err
+
+    longitudes = (bounding_box.min_longitude, bounding_box.max_longitude)
+    latitudes = (bounding_box.min_latitude, bounding_box.max_latitude)
+    if not all(-180 <= longitude <= 180 for longitude in longitudes):
+        raise ValueError("Bounding box longitudes must be within [-180, 180].")
+    if not all(-90 <= latitude <= 90 for latitude in latitudes):
+        raise ValueError("Bounding box latitudes must be within [-90, 90].")
+    if bounding_box.min_latitude > bounding_box.max_latitude:
+        raise ValueError("Bounding box minLat must not exceed maxLat.")
+
+    # minLon > maxLon stands for a box crossing the antimeridian.
+    return bounding_box
+
+
+def BoundingBoxFilter(description="", examples=None):
+    return Annotated[
+        str,
+        AfterValidator(bounding_box_param_validator),
+        Query(
+            description=description,
+            examples=examples,
+        ),
+    ]
@@ -0,0 +1,134 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException
+from sqlalchemy import Select, tuple_
+from sqlalchemy.sql import ColumnElement
+from starlette import status
+from starlette.requests import Request
+from starlette.responses import Response
+
+from MapsPlanner_API.db.base import Base as BaseORM
+from MapsPlanner_API.utils import JSONEncoder
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class KeysetPagination:
+    """
+    Cursor based pagination, keyed on `(order_field, id)` in descending order.
+
+    Instead of an offset, the cursor holds the key of the last row of the previous
+    page, so every page is a bounded index range scan no matter how deep it is.
+    The cursor of the next page is returned on the `X-Next-Cursor` header.
+    """
+
+    def __init__(
+        self,
+        model_class: Type[BaseORM],
+        order_field: str,
+        page_size: int,
+        cursor: Optional[str] = None,
+    ):
+        self.model_class = model_class
+        self.order_field = order_field
+        self.page_size = page_size
+        self.cursor = cursor
+        self._order_expression: Optional[ColumnElement] = None
+
+    @property
+    def _order_column(self):
+        if self._order_expression is not None:
+            return self._order_expression
+
+        return getattr(self.model_class, self.order_field)
+
+    @property
+    def _is_keyed_by_id(self) -> bool:
+        order_property = getattr(self._order_column, "property", None)
+        return order_property is self.model_class.id.property
+
+    def apply(
+        self,
+        query: Select,
+        order_by: Optional[Tuple[str, ColumnElement]] = None,
+    ) -> Select:
+        """
+        @param: order_by - overrides the order field by an SQL expression, as an
+        `(attribute, expression)` pair. The attribute holds the expression value on
+        fetched rows, e.g. a `query_expression()` loaded by `with_expression()`.
+        """
+        if order_by is not None:
+            self.order_field, self._order_expression = order_by
+
+        self.after = self.decode_cursor(self.cursor) if self.cursor else None
+        id_column = self.model_class.id
+
+        if self._is_keyed_by_id:
+            if self.after is not None:
+                query = query.where(id_column < self.after[1])
+            query = query.order_by(id_column.desc())
+        else:
+            if self.after is not None:
+                query = query.where(
+                    tuple_(self._order_column, id_column) < tuple_(*self.after),
+                )
+            query = query.order_by(self._order_column.desc(), id_column.desc())
+
+        # One extra row tells whether there is a next page.
+        return query.limit(self.page_size + 1)
+
+    def paginate(self, rows: Sequence[BaseORM], response: Response) -> List[BaseORM]:
+        """
+        Trims the look-ahead row, and sets the next page cursor on the response.
+        """
+        page = list(rows[: self.page_size])
+
+        if len(rows) > self.page_size:
+            last = page[-1]
+            response.headers[NEXT_CURSOR_HEADER] = self.encode_cursor(
+                (getattr(last, self.order_field), last.id),
+            )
+
+        return page
+
+    @classmethod
+    def encode_cursor(cls, key: Tuple[Any, int]) -> str:
+        payload = JSONEncoder(separators=(",", ":")).encode(key)
+        return base64.urlsafe_b64encode(payload.encode()).rstrip(b"=").decode()
+
+    def decode_cursor(self, cursor: str) -> Tuple[Any, int]:
+        try:
+            payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            order_value, row_id = json.loads(payload)
+            python_type = self._order_column.type.python_type
+            if issubclass(python_type, (date, datetime)):
+                order_value = python_type.fromisoformat(order_value)
+            return order_value, int(row_id)
+        except (ValueError, TypeError, binascii.Error, NotImplementedError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor.",
+            )
+
+
+def paginate_results(
+    request: Request,
+    response: Response,
+    rows: Sequence[BaseORM],
+) -> List[BaseORM]:
+    """
+    Returns the current page rows of a `get_paginated_queryset` query.
+    """
+    pagination: Optional[KeysetPagination] = getattr(
+        request.state,
+        "pagination",
+        None,
+    )
+    if pagination is None:
+        return list(rows)
+
+    return pagination.paginate(rows, response)
@@ -0,0 +1,93 @@
+import re
+from typing import Optional, Tuple
+
+from sqlalchemy import Float, Select, func, literal, or_
+from sqlalchemy.orm import with_expression
+from sqlalchemy.sql import ColumnElement
+
+# Language agnostic: no stemming or stop words, so any language can be searched.
+TEXT_SEARCH_CONFIG = "simple"
+
+_SEARCH_TERM_PATTERN = re.compile(r"\w+")
+
+
+def search_vector_expression(weighted_fields: Tuple[Tuple[str, str], ...]) -> str:
+    """
+    @param: weighted_fields - `(column, weight)` pairs, weight is one of A-D.
+    @returns SQL of a weighted tsvector, to maintain as a generated column.
+    """
+    return " || ".join(
+        f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce({column}, '')), "
+        f"'{weight}')"
+        for column, weight in weighted_fields
+    )
+
+
+def prefix_tsquery(search: str) -> Optional[ColumnElement]:
+    """
+    Matches documents containing all the search words, the last ones as prefixes,
+    so partial words match while typing. Only word characters are kept, hence the
+    search can not inject tsquery operators.
+    """
+    terms = _SEARCH_TERM_PATTERN.findall(search)
+    if not terms:
+        return None
+
+    return func.to_tsquery(
+        TEXT_SEARCH_CONFIG,
+        " & ".join(f"{term}:*" for term in terms),
+    )
+
+
+class FullTextSearchFilterMixin:
+    """
+    Replaces the `ILIKE` scans of the `search` filter by an indexed search.
+
+    The model needs a maintained `search_vector` tsvector column (GIN indexed),
+    and a `search_rank` query expression. A row matches either by full-text prefix
+    match, or by a substring match of `search_model_fields`, that is meant to be
+    served by trigram indexes. Rows are ranked by `ts_rank`.
+    """
+
+    @property
+    def filtering_fields(self):
+        return [
+            (field_name, value)
+            for field_name, value in super().filtering_fields
+            if field_name != self.Constants.search_field_name
+        ]
+
+    @property
+    def search_ordering(self) -> Optional[Tuple[str, ColumnElement]]:
+        """
+        @returns the `(attribute, expression)` pair to rank search results by,
+        for `KeysetPagination.apply`.
+        """
+        if not self.search:
+            return None
+
+        return "search_rank", self._search_rank()
+
+    def filter(self, query: Select) -> Select:
+        query = super().filter(query)
+        if not self.search:
+            return query
+
+        model = self.Constants.model
+        conditions = [
+            getattr(model, field).ilike(f"%{self.search}%")
+            for field in self.Constants.search_model_fields
+        ]
+        if (tsquery := prefix_tsquery(self.search)) is not None:
+            conditions.append(model.search_vector.op("@@")(tsquery))
+
+        return query.where(or_(*conditions)).options(
+            with_expression(model.search_rank, self._search_rank()),
+        )
+
+    def _search_rank(self) -> ColumnElement:
+        tsquery = prefix_tsquery(self.search)
+        if tsquery is None:
+            return literal(0.0, type_=Float)
+
+        return func.ts_rank(self.Constants.model.search_vector, tsquery, type_=Float)
@@ -2,7 +2,10 @@ from fastapi.routing import APIRouter
 
 from MapsPlanner_API.web.api.audit.views import router as audit_router
 from MapsPlanner_API.web.api.authentication.views import router as auth_router
+from MapsPlanner_API.web.api.images.views import router as images_router
 from MapsPlanner_API.web.api.markers.views import router as markers_router
+from MapsPlanner_API.web.api.metrics.views import router as metrics_router
+from MapsPlanner_API.web.api.tiles.views import router as tiles_router
 from MapsPlanner_API.web.api.trips.views import router as trips_router
 from MapsPlanner_API.web.api.users.views import router as users_router
 
@@ -11,4 +14,7 @@ api_router.include_router(auth_router)
 api_router.include_router(users_router)
 api_router.include_router(trips_router)
 api_router.include_router(markers_router)
+api_router.include_router(tiles_router)
+api_router.include_router(images_router)
 api_router.include_router(audit_router)
+api_router.include_router(metrics_router)
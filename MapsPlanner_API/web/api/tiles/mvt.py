@@ -0,0 +1,126 @@
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from MapsPlanner_API.web.api.query_filters.bounding_box import BoundingBox
+from MapsPlanner_API.web.api.trips.clusters import from_mercator, to_mercator
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+# Tile coordinates resolution, the specification default.
+TILE_EXTENT = 4096
+
+TValue = Union[str, int]
+
+# Protobuf wire types.
+_VARINT = 0
+_LENGTH_DELIMITED = 2
+
+# Vector tile geometry.
+_POINT = 1
+_MOVE_TO = 1
+
+
+def _varint(value: int) -> bytes:
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+
+def _varint_field(field: int, value: int) -> bytes:
+    return _key(field, _VARINT) + _varint(value)
+
+
+def _bytes_field(field: int, value: bytes) -> bytes:
+    return _key(field, _LENGTH_DELIMITED) + _varint(len(value)) + value
+
+
+def _packed_field(field: int, values: Sequence[int]) -> bytes:
+    return _bytes_field(field, b"".join(_varint(value) for value in values))
+
+
+def _encode_value(value: TValue) -> bytes:
+    if isinstance(value, str):
+        return _bytes_field(1, value.encode())
+    if value >= 0:
+        return _varint_field(5, value)  # uint_value
+
+    return _varint_field(6, _zigzag(value))  # sint_value
+
+
+def tile_bounding_box(z: int, x: int, y: int) -> BoundingBox:
+    tiles = 1 << z
+    (north, west), (south, east) = from_mercator(
+        np.array([[x / tiles, y / tiles], [(x + 1) / tiles, (y + 1) / tiles]]),
+    )
+    return BoundingBox(float(west), float(south), float(east), float(north))
+
+
+def encode_points_layer(
+    name: str,
+    z: int,
+    x: int,
+    y: int,
+    ids: Sequence[int],
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    properties: Sequence[Dict[str, TValue]],
+) -> bytes:
+    """
+    Encodes a Mapbox Vector Tile (v2) of a single layer of point features.
+
+    @returns the encoded tile.
+    """
+    tiles = 1 << z
+    points = to_mercator(np.asarray(latitudes), np.asarray(longitudes))
+    pixels = np.floor(
+        (points * tiles - np.array([x, y])) * TILE_EXTENT,
+    ).astype(np.int64)
+    pixels = np.clip(pixels, 0, TILE_EXTENT - 1).tolist()
+
+    keys: Dict[str, int] = {}
+    values: Dict[Tuple[type, TValue], int] = {}
+    features: List[bytes] = []
+
+    for marker_id, (column, row), feature_properties in zip(
+        ids,
+        pixels,
+        properties,
+    ):
+        tags = []
+        for key, value in feature_properties.items():
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+
+        features.append(
+            _bytes_field(
+                2,
+                _varint_field(1, marker_id)
+                + _packed_field(2, tags)
+                + _varint_field(3, _POINT)
+                + _packed_field(
+                    4,
+                    [(_MOVE_TO & 0x7) | (1 << 3), _zigzag(column), _zigzag(row)],
+                ),
+            ),
+        )
+
+    layer = (
+        _varint_field(15, 2)  # version
+        + _bytes_field(1, name.encode())
+        + b"".join(features)
+        + b"".join(_bytes_field(3, key.encode()) for key in keys)
+        + b"".join(_bytes_field(4, _encode_value(value)) for _type, value in values)
+        + _varint_field(5, TILE_EXTENT)
+    )
+    return _bytes_field(3, layer)
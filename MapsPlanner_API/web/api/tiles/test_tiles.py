@@ -0,0 +1,94 @@
+from typing import Awaitable, Callable
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from MapsPlanner_API.db.models.Marker import MarkerORM
+from MapsPlanner_API.db.models.Session import SessionORM
+from MapsPlanner_API.db.models.Trip import TripORM
+from MapsPlanner_API.web.api.markers.schema import EMarkerCategory
+from MapsPlanner_API.web.api.tiles.mvt import MVT_MEDIA_TYPE
+
+
+@pytest.mark.anyio
+async def test_get_markers_tile(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    access_token: SessionORM,
+    trip_factory: Callable[..., Awaitable[TripORM]],
+):
+    access_user = await access_token.awaitable_attrs.user
+    trip = await trip_factory(
+        markers=[
+            {
+                "category": EMarkerCategory.Beach,
+                "title": "Tel Aviv beach",
+                "latitude": 32.1,
+                "longitude": 34.8,
+            },
+        ],
+    )
+
+    cookies = {"token": access_token.token}
+    params = {"trip_id": trip.id}
+
+    def tile_url(z: int, x: int, y: int) -> str:
+        return fastapi_app.url_path_for("get_markers_tile", z=z, x=x, y=y)
+
+    # Test 1: Tiles holding markers.
+    response = await client.get(tile_url(1, 1, 0), params=params, cookies=cookies)
+    expected_status_code = (
+        status.HTTP_200_OK if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+    assert response.headers["Content-Type"] == MVT_MEDIA_TYPE
+    assert b"Tel Aviv beach" in response.content
+
+    # Test 2: Tiles without markers.
+    response = await client.get(tile_url(1, 0, 1), params=params, cookies=cookies)
+    assert response.status_code == status.HTTP_200_OK
+    assert b"Tel Aviv beach" not in response.content
+
+    # Test 3: Cached tiles are refreshed on markers writes.
+    response = await client.post(
+        fastapi_app.url_path_for("create_markers"),
+        json=[
+            {
+                "trip_id": trip.id,
+                "category": EMarkerCategory.Parks,
+                "title": "Yarkon park",
+                "description": "",
+                "latitude": 32.1,
+                "longitude": 34.8,
+            },
+        ],
+        cookies=cookies,
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    response = await client.get(tile_url(1, 1, 0), params=params, cookies=cookies)
+    assert b"Yarkon park" in response.content
+
+    # Test 4: Cached tiles are refreshed on markers writes of other workers.
+    dbsession.add(
+        MarkerORM(
+            trip_id=trip.id,
+            category=EMarkerCategory.Beach,
+            title="Eilat beach",
+            description="",
+            latitude=29.5,
+            longitude=34.9,
+        ),
+    )
+    await dbsession.commit()
+    response = await client.get(tile_url(1, 1, 0), params=params, cookies=cookies)
+    assert b"Eilat beach" in response.content
+
+    # Test 5: Tiles out of the zoom level.
+    response = await client.get(tile_url(1, 2, 0), params=params, cookies=cookies)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,101 @@
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Path
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+from starlette.responses import Response
+
+from MapsPlanner_API.db.dependencies import get_db_session
+from MapsPlanner_API.db.models.Marker import MarkerORM
+from MapsPlanner_API.db.models.User import UserORM
+from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.authorization.ownership import OwnershipAuthorizer
+from MapsPlanner_API.web.api.dependencies import get_authorizer, get_current_user
+from MapsPlanner_API.web.api.markers.schema import EMarkerCategory
+from MapsPlanner_API.web.api.markers.utils import accessible_markers_query
+from MapsPlanner_API.web.api.tiles.mvt import (
+    MVT_MEDIA_TYPE,
+    encode_points_layer,
+    tile_bounding_box,
+)
+from MapsPlanner_API.web.api.trips.clusters import MAX_ZOOM
+from MapsPlanner_API.web.services.trip_cache import TripCache, load_markers_version
+
+router = APIRouter(prefix="/tiles", tags=["Tiles"])
+
+MARKERS_LAYER = "markers"
+
+# Encoded tiles of trips, by markers version and tile.
+trip_tiles_cache: TripCache[bytes] = TripCache(
+    "marker_tiles",
+    max_size=int(settings.tile_cache_size),
+    ttl=float(settings.marker_index_ttl),
+)
+
+
+@router.get("/{z}/{x}/{y}.mvt")
+async def get_markers_tile(
+    z: Annotated[int, Path(ge=0, le=MAX_ZOOM)],
+    x: Annotated[int, Path(ge=0)],
+    y: Annotated[int, Path(ge=0)],
+    user: Annotated[UserORM, Depends(get_current_user)],
+    authorizer: Annotated[OwnershipAuthorizer, Depends(get_authorizer)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    trip_id: Optional[int] = None,
+) -> Response:
+    """
+    Markers of a Web Mercator tile, as a Mapbox Vector Tile of a `markers` layer.
+    Scoped to a trip, or to all the trips of the user.
+    """
+    if x >= 1 << z or y >= 1 << z:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Tile {z}/{x}/{y} not found.",
+        )
+
+    query = accessible_markers_query(user)
+    if trip_id is not None:
+        await authorizer.authorize_trip(trip_id)
+        markers_version = await load_markers_version(db, trip_id)
+        tile = trip_tiles_cache.get(trip_id, markers_version, key=(z, x, y))
+        if tile is not None:
+            return Response(content=tile, media_type=MVT_MEDIA_TYPE)
+
+        query = query.where(MarkerORM.trip_id == trip_id)
+
+    bounding_box = tile_bounding_box(z, x, y)
+    query = (
+        query.with_only_columns(
+            MarkerORM.id,
+            MarkerORM.trip_id,
+            MarkerORM.category,
+            MarkerORM.title,
+            MarkerORM.latitude,
+            MarkerORM.longitude,
+        )
+        .where(bounding_box.contains(MarkerORM.longitude, MarkerORM.latitude))
+        .limit(int(settings.bbox_max_markers))
+    )
+    rows = (await db.execute(query)).all()
+
+    tile = encode_points_layer(
+        MARKERS_LAYER,
+        z,
+        x,
+        y,
+        ids=[row.id for row in rows],
+        latitudes=[row.latitude for row in rows],
+        longitudes=[row.longitude for row in rows],
+        properties=[
+            {
+                "trip_id": row.trip_id,
+                "title": row.title,
+                "category": EMarkerCategory(row.category).name,
+            }
+            for row in rows
+        ],
+    )
+    if trip_id is not None:
+        trip_tiles_cache.put(trip_id, markers_version, tile, key=(z, x, y))
+
+    return Response(content=tile, media_type=MVT_MEDIA_TYPE)
@@ -0,0 +1,231 @@
+from typing import List, Optional
+
+import anyio
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from MapsPlanner_API.db.models.Marker import MarkerORM
+from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.markers.schema import EMarkerCategory
+from MapsPlanner_API.web.api.query_filters.bounding_box import BoundingBox
+from MapsPlanner_API.web.api.trips.schema import MarkerCluster
+from MapsPlanner_API.web.services.trip_cache import TripCache, load_markers_version
+
+# Deepest clustered zoom, markers are returned one by one past it.
+MAX_CLUSTER_ZOOM = 16
+MAX_ZOOM = 22
+# Markers closer than about a grid cell (256px tiles) are clustered together.
+CLUSTER_CELL_PIXELS = 64
+
+# Web Mercator is undefined at the poles.
+MAX_MERCATOR_LATITUDE = 85.05112878
+
+_CATEGORIES = len(EMarkerCategory)
+_CELL_SHIFT = (256 // CLUSTER_CELL_PIXELS).bit_length() - 1
+
+
+def to_mercator(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    @returns (n, 2) Web Mercator coordinates, normalized to [0, 1], as in tiles.
+    """
+    latitudes = np.radians(
+        np.clip(latitudes, -MAX_MERCATOR_LATITUDE, MAX_MERCATOR_LATITUDE),
+    )
+    x = (np.asarray(longitudes) + 180) / 360
+    y = 0.5 - np.log(np.tan(np.pi / 4 + latitudes / 2)) / (2 * np.pi)
+    return np.column_stack((np.clip(x, 0, 1), np.clip(y, 0, 1)))
+
+
+def from_mercator(points: np.ndarray) -> np.ndarray:
+    """
+    @returns (n, 2) latitudes and longitudes of normalized Web Mercator points.
+    """
+    longitudes = points[:, 0] * 360 - 180
+    latitudes = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * points[:, 1]))))
+    return np.column_stack((latitudes, longitudes))
+
+
+class ClusterLevel:
+    """
+    Clusters of a zoom level, as parallel arrays.
+    """
+
+    def __init__(
+        self,
+        cells: np.ndarray,
+        counts: np.ndarray,
+        sums: np.ndarray,
+        histograms: np.ndarray,
+        marker_ids: np.ndarray,
+    ):
+        self.cells = cells  # (n, 2) grid cell of each cluster.
+        self.counts = counts
+        self.sums = sums  # (n, 2) sum of the markers mercator coordinates.
+        self.histograms = histograms  # (n, categories) markers per category.
+        self.marker_ids = marker_ids  # Marker of single marker clusters, else -1.
+        self.locations = from_mercator(sums / counts[:, None])
+
+    def parent(self) -> "ClusterLevel":
+        """
+        @returns the level a zoom out, whose cells are twice as large, hence each
+        cluster merges the clusters of its four sub-cells.
+        """
+        cells, inverse = np.unique(self.cells >> 1, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        counts = np.bincount(inverse, weights=self.counts, minlength=len(cells))
+        sums = np.column_stack(
+            [
+                np.bincount(inverse, weights=self.sums[:, axis], minlength=len(cells))
+                for axis in range(2)
+            ],
+        )
+        histograms = np.column_stack(
+            [
+                np.bincount(
+                    inverse,
+                    weights=self.histograms[:, category],
+                    minlength=len(cells),
+                )
+                for category in range(_CATEGORIES)
+            ],
+        ).astype(np.int64)
+
+        # A single marker cluster has a single child, the single marker cluster.
+        children = np.empty(len(cells), dtype=np.int64)
+        children[inverse] = np.arange(len(inverse))
+        marker_ids = np.where(counts == 1, self.marker_ids[children], -1)
+
+        return ClusterLevel(
+            cells=cells,
+            counts=counts.astype(np.int64),
+            sums=sums,
+            histograms=histograms,
+            marker_ids=marker_ids,
+        )
+
+    def within(self, bounding_box: Optional[BoundingBox]) -> np.ndarray:
+        """
+        @returns indices of the clusters centered inside the box.
+        """
+        if bounding_box is None:
+            return np.arange(len(self.counts))
+
+        latitudes, longitudes = self.locations[:, 0], self.locations[:, 1]
+        inside = (latitudes >= bounding_box.min_latitude) & (
+            latitudes <= bounding_box.max_latitude
+        )
+        after_min = longitudes >= bounding_box.min_longitude
+        before_max = longitudes <= bounding_box.max_longitude
+        if bounding_box.crosses_antimeridian:
+            return np.flatnonzero(inside & (after_min | before_max))
+
+        return np.flatnonzero(inside & after_min & before_max)
+
+
+class TripClusters:
+    """
+    Grid based cluster hierarchy of the markers of a trip, for every zoom level.
+
+    The deepest level is computed from the markers, each other level by merging
+    the clusters of the level below, so building is linear in the markers count
+    and a zoom level is served without touching the markers.
+    """
+
+    def __init__(self, levels: List[ClusterLevel], markers: ClusterLevel):
+        self.levels = levels
+        self.markers = markers
+
+    @classmethod
+    def build(
+        cls,
+        ids: np.ndarray,
+        categories: np.ndarray,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+    ) -> "TripClusters":
+        points = to_mercator(latitudes, longitudes)
+        grid_size = 1 << (MAX_CLUSTER_ZOOM + 1 + _CELL_SHIFT)
+        histograms = np.zeros((len(ids), _CATEGORIES), dtype=np.int64)
+        histograms[np.arange(len(ids)), categories] = 1
+
+        markers = ClusterLevel(
+            cells=np.minimum(points * grid_size, grid_size - 1).astype(np.int64),
+            counts=np.ones(len(ids), dtype=np.int64),
+            sums=points,
+            histograms=histograms,
+            marker_ids=ids,
+        )
+
+        levels = [markers.parent()]
+        for _zoom in range(MAX_CLUSTER_ZOOM):
+            levels.append(levels[-1].parent())
+
+        return cls(levels=levels[::-1], markers=markers)
+
+    def clusters(
+        self,
+        zoom: int,
+        bounding_box: Optional[BoundingBox] = None,
+    ) -> List[MarkerCluster]:
+        level = self.levels[zoom] if zoom <= MAX_CLUSTER_ZOOM else self.markers
+        return [
+            MarkerCluster(
+                latitude=level.locations[index, 0],
+                longitude=level.locations[index, 1],
+                count=level.counts[index],
+                categories={
+                    EMarkerCategory(category): count
+                    for category, count in enumerate(level.histograms[index].tolist())
+                    if count
+                },
+                marker_id=(
+                    int(level.marker_ids[index])
+                    if level.marker_ids[index] >= 0
+                    else None
+                ),
+            )
+            for index in level.within(bounding_box).tolist()
+        ]
+
+    @classmethod
+    async def load(cls, db: AsyncSession, trip_id: int) -> "TripClusters":
+        rows = (
+            await db.execute(
+                select(
+                    MarkerORM.id,
+                    MarkerORM.category,
+                    MarkerORM.latitude,
+                    MarkerORM.longitude,
+                ).where(MarkerORM.trip_id == trip_id),
+            )
+        ).all()
+
+        ids = np.array([row.id for row in rows], dtype=np.int64)
+        categories = np.array([row.category for row in rows], dtype=np.int64)
+        latitudes = np.array([row.latitude for row in rows], dtype=np.float64)
+        longitudes = np.array([row.longitude for row in rows], dtype=np.float64)
+        # Building is CPU bound, keep it off the event loop.
+        return await anyio.to_thread.run_sync(
+            cls.build,
+            ids,
+            categories,
+            latitudes,
+            longitudes,
+        )
+
+
+trip_clusters_cache: TripCache[TripClusters] = TripCache(
+    "marker_clusters",
+    max_size=int(settings.marker_index_cache_size),
+    ttl=float(settings.marker_index_ttl),
+)
+
+
+async def load_trip_clusters(db: AsyncSession, trip_id: int) -> TripClusters:
+    markers_version = await load_markers_version(db, trip_id)
+    if (trip_clusters := trip_clusters_cache.get(trip_id, markers_version)) is None:
+        trip_clusters = await TripClusters.load(db, trip_id)
+        trip_clusters_cache.put(trip_id, markers_version, trip_clusters)
+
+    return trip_clusters
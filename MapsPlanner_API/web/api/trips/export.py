@@ -0,0 +1,231 @@
+import json
+from enum import Enum
+from typing import AsyncIterator, Dict, List, Type
+from xml.sax.saxutils import escape
+
+from sqlalchemy import Row, Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import StreamingResponse
+
+from MapsPlanner_API.db.models.Marker import MarkerORM
+from MapsPlanner_API.db.models.Trip import TripORM
+from MapsPlanner_API.web.api.markers.schema import EMarkerCategory
+
+# Markers fetched per round trip of the server side cursor.
+EXPORT_BATCH_SIZE = 1000
+# Output is flushed to the client in chunks of about this size.
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+class ETripExportFormat(str, Enum):
+    geojson = "geojson"
+    gpx = "gpx"
+    kml = "kml"
+
+
+def export_query(trips_query: Select) -> Select:
+    """
+    @param: trips_query - access controlled trips query.
+    @returns the markers of the trips, grouped by trip. Trips without markers are
+    returned once, with null marker columns.
+    """
+    trips = (
+        trips_query.with_only_columns(TripORM.id, TripORM.name)
+        .order_by(None)
+        .subquery()
+    )
+
+    return (
+        select(
+            trips.c.id.label("trip_id"),
+            trips.c.name.label("trip_name"),
+            MarkerORM.id.label("marker_id"),
+            MarkerORM.category,
+            MarkerORM.title,
+            MarkerORM.description,
+            MarkerORM.latitude,
+            MarkerORM.longitude,
+        )
+        .outerjoin(MarkerORM, MarkerORM.trip_id == trips.c.id)
+        .order_by(trips.c.id, MarkerORM.id)
+    )
+
+
+class TripExporter:
+    """
+    Serializes trips markers incrementally, so exports are streamed in constant
+    memory, no matter how many markers the trips hold.
+    """
+
+    media_type: str
+    extension: str
+
+    def header(self) -> str:
+        return ""
+
+    def trip_start(self, row: Row) -> str:
+        return ""
+
+    def trip_end(self) -> str:
+        return ""
+
+    def marker(self, row: Row) -> str:
+        raise NotImplementedError
+
+    def footer(self) -> str:
+        return ""
+
+    async def stream(self, db: AsyncSession, query: Select) -> AsyncIterator[bytes]:
+        # Sent before querying, so the download starts right away.
+        yield self.header().encode()
+
+        result = await db.stream(
+            query.execution_options(yield_per=EXPORT_BATCH_SIZE),
+        )
+
+        chunk: List[str] = []
+        chunk_size = 0
+        current_trip_id = None
+
+        async for row in result:
+            if row.trip_id != current_trip_id:
+                if current_trip_id is not None:
+                    chunk.append(self.trip_end())
+                chunk.append(self.trip_start(row))
+                current_trip_id = row.trip_id
+
+            if row.marker_id is not None:
+                marker = self.marker(row)
+                chunk.append(marker)
+                chunk_size += len(marker)
+
+            if chunk_size >= EXPORT_CHUNK_SIZE:
+                yield "".join(chunk).encode()
+                chunk, chunk_size = [], 0
+
+        if current_trip_id is not None:
+            chunk.append(self.trip_end())
+        chunk.append(self.footer())
+        yield "".join(chunk).encode()
+
+
+class GeoJSONExporter(TripExporter):
+    media_type = "application/geo+json"
+    extension = "geojson"
+
+    def __init__(self):
+        self._separator = ""
+
+    def header(self) -> str:
+        return '{"type":"FeatureCollection","features":['
+
+    def marker(self, row: Row) -> str:
+        feature = {
+            "type": "Feature",
+            "id": row.marker_id,
+            "geometry": {
+                "type": "Point",
+                "coordinates": [row.longitude, row.latitude],
+            },
+            "properties": {
+                "trip_id": row.trip_id,
+                "trip_name": row.trip_name,
+                "title": row.title,
+                "description": row.description,
+                "category": EMarkerCategory(row.category).name,
+            },
+        }
+        separator, self._separator = self._separator, ","
+        return separator + json.dumps(feature, separators=(",", ":"))
+
+    def footer(self) -> str:
+        return "]}"
+
+
+class GPXExporter(TripExporter):
+    """
+    GPX has no grouping of waypoints, so the trip name is kept as their comment.
+    """
+
+    media_type = "application/gpx+xml"
+    extension = "gpx"
+
+    def header(self) -> str:
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<gpx version="1.1" creator="MapsPlanner" '
+            'xmlns="http://www.topografix.com/GPX/1/1">\n'
+        )
+
+    def marker(self, row: Row) -> str:
+        return (
+            f'<wpt lat="{row.latitude}" lon="{row.longitude}">'
+            f"<name>{escape(row.title)}</name>"
+            f"<cmt>{escape(row.trip_name)}</cmt>"
+            f"<desc>{escape(row.description)}</desc>"
+            f"<type>{EMarkerCategory(row.category).name}</type>"
+            "</wpt>\n"
+        )
+
+    def footer(self) -> str:
+        return "</gpx>\n"
+
+
+class KMLExporter(TripExporter):
+    media_type = "application/vnd.google-earth.kml+xml"
+    extension = "kml"
+
+    def header(self) -> str:
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>\n'
+        )
+
+    def trip_start(self, row: Row) -> str:
+        return f"<Folder><name>{escape(row.trip_name)}</name>\n"
+
+    def trip_end(self) -> str:
+        return "</Folder>\n"
+
+    def marker(self, row: Row) -> str:
+        return (
+            "<Placemark>"
+            f"<name>{escape(row.title)}</name>"
+            f"<description>{escape(row.description)}</description>"
+            '<ExtendedData><Data name="category">'
+            f"<value>{EMarkerCategory(row.category).name}</value>"
+            "</Data></ExtendedData>"
+            "<Point>"
+            f"<coordinates>{row.longitude},{row.latitude}</coordinates>"
+            "</Point>"
+            "</Placemark>\n"
+        )
+
+    def footer(self) -> str:
+        return "</Document></kml>\n"
+
+
+TRIP_EXPORTERS: Dict[ETripExportFormat, Type[TripExporter]] = {
+    ETripExportFormat.geojson: GeoJSONExporter,
+    ETripExportFormat.gpx: GPXExporter,
+    ETripExportFormat.kml: KMLExporter,
+}
+
+
+def export_response(
+    db: AsyncSession,
+    trips_query: Select,
+    export_format: ETripExportFormat,
+    filename: str,
+) -> StreamingResponse:
+    exporter = TRIP_EXPORTERS[export_format]()
+
+    return StreamingResponse(
+        exporter.stream(db, export_query(trips_query)),
+        media_type=exporter.media_type,
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="{filename}.{exporter.extension}"'
+            ),
+        },
+    )
@@ -0,0 +1,183 @@
+import asyncio
+import time
+from logging import getLogger
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import Select, delete, exists, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from MapsPlanner_API.db.models.DeletedMarker import DeletedMarkerORM
+from MapsPlanner_API.db.models.Marker import MarkerORM
+from MapsPlanner_API.db.models.Trip import TripORM
+from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.metrics.registry import metrics_registry
+
+logger = getLogger("api")
+
+
+class DeletedTripsReaper:
+    """
+    Periodically removes soft deleted trips whose undo window has passed, and
+    deleted markers tombstones past their retention.
+
+    Markers are deleted first, then the emptied trips, both with set based deletes
+    in bounded batches. Each batch is its own short transaction, and rows locked by
+    another worker reaping at the same time are skipped.
+    """
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+
+        self.total_trips = 0
+        self.total_markers = 0
+        self.total_tombstones = 0
+        self.last_run: Dict[str, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def _reapable_trips(cls) -> Select:
+        return select(TripORM.id).where(
+            TripORM.deleted_date.is_not(None),
+            TripORM.deleted_date < TripORM.undo_cutoff(),
+        )
+
+    async def reap_markers_batch(self, db: AsyncSession) -> int:
+        markers = (
+            select(MarkerORM.id)
+            .where(MarkerORM.trip_id.in_(self._reapable_trips().scalar_subquery()))
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        result = await db.execute(
+            delete(MarkerORM)
+            .where(MarkerORM.id.in_(markers.scalar_subquery()))
+            .execution_options(synchronize_session=False),
+        )
+        await db.commit()
+        return result.rowcount
+
+    async def reap_trips_batch(self, db: AsyncSession) -> int:
+        trips = (
+            self._reapable_trips()
+            .where(~exists().where(MarkerORM.trip_id == TripORM.id))
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        result = await db.execute(
+            delete(TripORM)
+            .where(TripORM.id.in_(trips.scalar_subquery()))
+            .execution_options(synchronize_session=False),
+        )
+        await db.commit()
+        return result.rowcount
+
+    async def reap_tombstones_batch(self, db: AsyncSession) -> int:
+        """
+        Drops tombstones past the retention, and records the latest version dropped
+        of their trips, for the clients syncing from before it.
+        """
+        tombstones = (
+            select(DeletedMarkerORM.marker_id)
+            .where(DeletedMarkerORM.deleted_date < DeletedMarkerORM.retention_cutoff())
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        result = await db.execute(
+            delete(DeletedMarkerORM)
+            .where(DeletedMarkerORM.marker_id.in_(tombstones.scalar_subquery()))
+            .returning(DeletedMarkerORM.trip_id, DeletedMarkerORM.version)
+            .execution_options(synchronize_session=False),
+        )
+        rows = result.all()
+
+        pruned_versions: Dict[int, int] = {}
+        for row in rows:
+            pruned_versions[row.trip_id] = max(
+                row.version,
+                pruned_versions.get(row.trip_id, 0),
+            )
+        # In id order, as trips are locked by markers writes, see `lock_trips`.
+        for trip_id, version in sorted(pruned_versions.items()):
+            await db.execute(
+                update(TripORM)
+                .where(TripORM.id == trip_id)
+                .values(
+                    pruned_markers_version=func.greatest(
+                        TripORM.pruned_markers_version,
+                        version,
+                    ),
+                )
+                .execution_options(synchronize_session=False),
+            )
+        await db.commit()
+        return len(rows)
+
+    async def reap(self, session_factory: async_sessionmaker) -> int:
+        started_at = time.monotonic()
+
+        async with session_factory() as db:
+            markers = await self._reap_batches(db, self.reap_markers_batch)
+            trips = await self._reap_batches(db, self.reap_trips_batch)
+            tombstones = await self._reap_batches(db, self.reap_tombstones_batch)
+
+        self.total_markers += markers
+        self.total_trips += trips
+        self.total_tombstones += tombstones
+        self.last_run = {
+            "trips": trips,
+            "markers": markers,
+            "tombstones": tombstones,
+            "duration": time.monotonic() - started_at,
+            "finished_at": time.time(),
+        }
+        return trips
+
+    async def _reap_batches(
+        self,
+        db: AsyncSession,
+        reap_batch: Callable[[AsyncSession], Awaitable[int]],
+    ) -> int:
+        reaped = 0
+        while True:
+            batch_reaped = await reap_batch(db)
+            reaped += batch_reaped
+            if batch_reaped < self.batch_size:
+                return reaped
+            # Let other requests run between batches.
+            await asyncio.sleep(0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "total_trips": self.total_trips,
+            "total_markers": self.total_markers,
+            "total_tombstones": self.total_tombstones,
+            "last_run": self.last_run,
+        }
+
+    def start(self, session_factory: async_sessionmaker) -> None:
+        self._task = asyncio.create_task(self._reap_loop(session_factory))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _reap_loop(self, session_factory: async_sessionmaker) -> None:
+        while True:
+            try:
+                reaped = await self.reap(session_factory)
+                logger.info(f"Reaped {reaped} deleted trips.")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Failed to reap deleted trips.")
+
+            await asyncio.sleep(self.interval)
+
+
+deleted_trips_reaper = DeletedTripsReaper(
+    interval=float(settings.trip_reap_interval),
+    batch_size=int(settings.trip_reap_batch_size),
+)
+metrics_registry.register("trip_reaper", deleted_trips_reaper.stats)
@@ -0,0 +1,345 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.markers.distances import great_circle_distances
+from MapsPlanner_API.web.api.metrics.registry import metrics_registry
+
+# Closest markers considered when improving the route around a marker.
+ROUTE_NEIGHBOURS = 10
+# Longest segment moved by Or-opt.
+OR_OPT_SEGMENT = 3
+# Improvements smaller than this, in meters, are float noise.
+_EPSILON = 1e-6
+
+
+class RouteSolver:
+    """
+    Shortest visiting order heuristic over a distance matrix.
+
+    The route is held as a cycle whose first node, the anchor, never moves. For
+    open routes the anchor is a dummy node at zero distance of every marker, so
+    the route runs from the node after it to the node before it, and fixing the
+    route start or end only forbids moves changing those two positions. For round
+    trips the anchor is the start marker itself.
+
+    A nearest neighbour route is improved by 2-opt and Or-opt moves, searched
+    among the closest markers of each marker, until no move improves it or the
+    time budget is over.
+    """
+
+    def __init__(
+        self,
+        distances: np.ndarray,
+        fix_first: bool,
+        fix_last: bool,
+        deadline: float,
+    ):
+        self.distances = distances
+        self.fix_first = fix_first
+        self.fix_last = fix_last
+        self.deadline = deadline
+        self.size = len(distances)
+
+        neighbours = min(ROUTE_NEIGHBOURS, self.size - 1)
+        candidates = np.argpartition(distances, neighbours, axis=1)
+        candidates = candidates[:, : neighbours + 1]
+        self.neighbours = [
+            [int(node) for node in row if node != index]
+            for index, row in enumerate(candidates)
+        ]
+
+        self.tour = np.empty(0, dtype=np.int64)
+        self.positions = np.empty(0, dtype=np.int64)
+
+    def solve(self, first: Optional[int], last: Optional[int]) -> np.ndarray:
+        """
+        @returns the cycle, starting with the anchor.
+        """
+        self.tour = self._nearest_neighbour(first, last)
+        self._update_positions()
+
+        if self.size > 3:
+            improved = True
+            while improved and time.monotonic() < self.deadline:
+                improved = self._two_opt_pass()
+                improved = self._or_opt_pass() or improved
+
+        return self.tour
+
+    def _nearest_neighbour(
+        self,
+        first: Optional[int],
+        last: Optional[int],
+    ) -> np.ndarray:
+        visited = np.zeros(self.size, dtype=bool)
+        tour = [0]
+        visited[0] = True
+        if first is not None:
+            tour.append(first)
+            visited[first] = True
+        if last is not None:
+            visited[last] = True
+
+        remaining = self.size - int(visited.sum())
+        for _step in range(remaining):
+            row = np.where(visited, np.inf, self.distances[tour[-1]])
+            node = int(np.argmin(row))
+            tour.append(node)
+            visited[node] = True
+
+        if last is not None:
+            tour.append(last)
+
+        return np.array(tour, dtype=np.int64)
+
+    def _update_positions(self) -> None:
+        self.positions = np.empty(self.size, dtype=np.int64)
+        self.positions[self.tour] = np.arange(self.size)
+
+    def _can_change(self, start: int, end: int) -> bool:
+        """
+        @returns whether the positions `start` to `end` can be rearranged.
+        """
+        if start < 1:
+            return False
+        if self.fix_first and start == 1:
+            return False
+
+        return not (self.fix_last and end == self.size - 1)
+
+    def _two_opt_pass(self) -> bool:
+        """
+        Replaces edges (a, b) and (c, d) by (a, c) and (b, d), reversing the
+        route between them.
+        """
+        distances, tour, positions = self.distances, self.tour, self.positions
+        improved = False
+
+        for position in range(self.size):
+            if time.monotonic() >= self.deadline:
+                break
+
+            a = tour[position]
+            b = tour[(position + 1) % self.size]
+            best_gain, best_move = _EPSILON, None
+            for c in self.neighbours[a]:
+                other = positions[c]
+                d = tour[(other + 1) % self.size]
+                if c == b or d == a:
+                    continue
+
+                gain = distances[a, b] + distances[c, d]
+                gain -= distances[a, c] + distances[b, d]
+                start, end = sorted((position, other))
+                if gain > best_gain and self._can_change(start + 1, end):
+                    best_gain, best_move = gain, (start + 1, end)
+
+            if best_move is not None:
+                start, end = best_move
+                tour[start : end + 1] = tour[start : end + 1][::-1].copy()
+                positions[tour[start : end + 1]] = np.arange(start, end + 1)
+                improved = True
+
+        return improved
+
+    def _or_opt_pass(self) -> bool:
+        """
+        Moves segments of up to `OR_OPT_SEGMENT` markers, possibly reversed,
+        between two close markers elsewhere in the route.
+        """
+        improved = False
+
+        position = 1
+        while position < self.size:
+            if time.monotonic() >= self.deadline:
+                break
+
+            move = self._best_segment_move(position)
+            if move is None:
+                position += 1
+                continue
+
+            length, after, reverse = move
+            tour = self.tour
+            segment = tour[position : position + length]
+            if reverse:
+                segment = segment[::-1]
+            rest = np.concatenate((tour[:position], tour[position + length :]))
+            insert_at = int(np.flatnonzero(rest == after)[0]) + 1
+            self.tour = np.concatenate((rest[:insert_at], segment, rest[insert_at:]))
+            self._update_positions()
+            improved = True
+
+        return improved
+
+    def _best_segment_move(self, position: int) -> Optional[Tuple[int, int, bool]]:
+        distances, tour, positions = self.distances, self.tour, self.positions
+        best_gain, best_move = _EPSILON, None
+
+        for length in range(1, OR_OPT_SEGMENT + 1):
+            end = position + length - 1
+            if end >= self.size or not self._can_change(position, end):
+                break
+
+            previous, first, last = tour[position - 1], tour[position], tour[end]
+            following = tour[(end + 1) % self.size]
+            removal_gain = (
+                distances[previous, first]
+                + distances[last, following]
+                - distances[previous, following]
+            )
+            if removal_gain <= best_gain:
+                continue
+
+            for c in set(self.neighbours[first] + self.neighbours[last]):
+                other = positions[c]
+                if position - 1 <= other <= end:
+                    continue
+                if (other == 0 and self.fix_first) or (
+                    other == self.size - 1 and self.fix_last
+                ):
+                    continue
+
+                after = tour[(other + 1) % self.size]
+                for reverse, head, tail in ((False, first, last), (True, last, first)):
+                    insertion_cost = distances[c, head] + distances[tail, after]
+                    gain = removal_gain - insertion_cost + distances[c, after]
+                    if gain > best_gain:
+                        best_gain, best_move = gain, (length, int(c), reverse)
+
+        return best_move
+
+
+def optimize_route(
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    start: Optional[int],
+    end: Optional[int],
+    time_budget: float,
+) -> Tuple[List[int], float]:
+    """
+    Runs in a worker process.
+
+    @param: start, end - indices of the markers to start and end the route with.
+    Equal ones make a round trip.
+    @returns the markers indices in visiting order, and the route length in meters.
+    """
+    deadline = time.monotonic() + time_budget
+    count = len(latitudes)
+    if count == 0:
+        return [], 0.0
+
+    distances = great_circle_distances(latitudes, longitudes, latitudes, longitudes)
+
+    if start is not None and start == end:
+        # Round trip: the start marker anchors the cycle.
+        nodes = np.concatenate(([start], np.delete(np.arange(count), start)))
+        solver = RouteSolver(
+            distances[np.ix_(nodes, nodes)],
+            fix_first=False,
+            fix_last=False,
+            deadline=deadline,
+        )
+        tour = nodes[solver.solve(first=None, last=None)]
+        order = np.append(tour, start)
+    else:
+        # Open route: a dummy anchor, at zero distance of every marker.
+        anchored = np.zeros((count + 1, count + 1))
+        anchored[1:, 1:] = distances
+        solver = RouteSolver(
+            anchored,
+            fix_first=start is not None,
+            fix_last=end is not None,
+            deadline=deadline,
+        )
+        tour = solver.solve(
+            first=None if start is None else start + 1,
+            last=None if end is None else end + 1,
+        )
+        order = tour[1:] - 1
+
+    length = float(distances[order[:-1], order[1:]].sum())
+    return order.tolist(), length
+
+
+class RouteOptimizer:
+    """
+    Runs route optimizations in a process pool, so their CPU bound search never
+    blocks the event loop, nor other requests of the worker.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+
+        self.optimized = 0
+        self.total_duration = 0.0
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def optimize(
+        self,
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        start: Optional[int],
+        end: Optional[int],
+        time_budget: float,
+    ) -> Tuple[List[int], float]:
+        started_at = time.monotonic()
+        optimize_args = (latitudes, longitudes, start, end, time_budget)
+        try:
+            result = await self._run_optimize(*optimize_args)
+        except BrokenProcessPool:
+            # A dead worker (e.g. killed for memory) fails every pending optimization
+            # of its pool, so they are retried once on a new pool.
+            result = await self._run_optimize(*optimize_args)
+
+        self.optimized += 1
+        self.total_duration += time.monotonic() - started_at
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "optimized": self.optimized,
+            "total_duration": self.total_duration,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run_optimize(self, *optimize_args: Any) -> Tuple[List[int], float]:
+        executor = self._get_executor()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                executor,
+                optimize_route,
+                *optimize_args,
+            )
+        except BrokenProcessPool:
+            # Replaced once, by the first of the optimizations it failed.
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            raise
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Forking a process that runs an event loop and threads is unsafe.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+        return self._executor
+
+
+route_optimizer = RouteOptimizer(max_workers=int(settings.route_workers))
+metrics_registry.register("route_optimizer", route_optimizer.stats)
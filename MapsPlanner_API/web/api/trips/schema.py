@@ -1,22 +1,29 @@
 import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 from urllib.parse import urlparse
 
 from fastapi_filter.contrib.sqlalchemy import Filter
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 
 from MapsPlanner_API.db.models import TripORM
-from MapsPlanner_API.utils import image_url_as_base64
-from MapsPlanner_API.web.api.markers.schema import Marker
+from MapsPlanner_API.web.api.markers.schema import (
+    EMarkerCategory,
+    Marker,
+    VersionedMarker,
+)
 from MapsPlanner_API.web.api.query_filters.date_range import DateRangeFilterMixin
+from MapsPlanner_API.web.api.query_filters.search import FullTextSearchFilterMixin
 from MapsPlanner_API.web.api.schema import DateRangeFilter
+from MapsPlanner_API.web.services.image_store import decode_data_uri
 
 
 class Trip(BaseModel):
     id: int
     name: str
     description: str
-    picture: str
+    picture: Optional[str]  # as URL
+    # Add `size=...` to a picture URL for other sizes (see EImageSize).
+    picture_thumbnail: Optional[str] = None
     creation_date: datetime.datetime
     user_id: int
 
@@ -25,6 +32,23 @@ class TripDetails(Trip):
     markers: List[Marker]
 
 
+class MarkerCluster(BaseModel):
+    latitude: float
+    longitude: float
+    count: int
+    categories: Dict[EMarkerCategory, int]  # Markers count per category.
+    marker_id: Optional[int] = None  # Set for clusters of a single marker.
+
+
+class TripMarkersChanges(BaseModel):
+    version: int  # To request the next changes `since`.
+    markers: List[VersionedMarker]  # Created or updated.
+    deleted_marker_ids: List[int]
+    # All the markers, to replace the synced ones: without `since`, or when the
+    # deleted markers since it were reaped.
+    full_resync: bool
+
+
 class APITripFilter(BaseModel):
     name: Optional[str] = None  # Can be partial name
     creation_date: Optional[DateRangeFilter] = None
@@ -39,24 +63,46 @@ class APITripCreationRequest(BaseModel):
     def validate_picture(cls, picture: Optional[str]) -> Optional[str]:
         """
         We don't want to store URL references.
-        Instead, we will take a copy of the image and store it on the DB.
+        Instead, we will take a copy of the image and store it on the image store;
+        remote images are fetched asynchronously, after the trip is created.
 
         @param: picture - can be either None, base64 image, or url to an image.
-        @returns base64 image blob.
         """
 
-        if picture is None:
-            return None
+        if picture is None or is_image_url(picture):
+            return picture
 
-        is_url = bool(urlparse(picture).netloc)
-
-        if is_url:
-            return image_url_as_base64(picture, raise_on_error=False)
+        try:
+            decode_data_uri(picture)
+        except ValueError as err:
+            raise ValueError("Picture must be an image url or a base64 image.") from err
 
         return picture
 
 
-class TripFilter(DateRangeFilterMixin, Filter):
+class APITripCloneRequest(BaseModel):
+    name: Optional[str] = None  # Defaults to the trip name, marked as a copy
+    categories: Optional[List[EMarkerCategory]] = None  # Markers to copy, all if None
+
+
+class APIRouteOptimizationRequest(BaseModel):
+    start_marker_id: Optional[int] = None
+    end_marker_id: Optional[int] = None  # Same as the start for a round trip
+    time_budget: Optional[float] = Field(default=None, gt=0)  # In seconds
+
+
+class OptimizedRoute(BaseModel):
+    marker_ids: List[int]  # In visiting order
+    distance: float  # Great-circle length, in meters
+
+
+def is_image_url(picture: str) -> bool:
+    url = urlparse(picture)
+    return url.scheme in {"http", "https"} and bool(url.netloc)
+
+
+class TripFilter(FullTextSearchFilterMixin, DateRangeFilterMixin, Filter):
+    # Served by trigram indexes.
     name__ilike: Optional[str] = None
     description__ilike: Optional[str] = None
 
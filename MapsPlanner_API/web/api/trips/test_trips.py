@@ -0,0 +1,617 @@
+import contextlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Awaitable, Callable, List
+
+import httpx
+import numpy as np
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from MapsPlanner_API.db.models.Marker import MarkerORM
+from MapsPlanner_API.db.models.Session import SessionORM
+from MapsPlanner_API.db.models.Trip import TripORM
+from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.markers.schema import EMarkerCategory
+from MapsPlanner_API.web.api.query_filters.pagination import NEXT_CURSOR_HEADER
+from MapsPlanner_API.web.api.trips.reaper import DeletedTripsReaper
+from MapsPlanner_API.web.api.trips.routing import RouteOptimizer
+from MapsPlanner_API.web.api.trips.schema import TripDetails, TripMarkersChanges
+from MapsPlanner_API.web.services.image_ingestion import ImageIngestion
+from MapsPlanner_API.web.services.image_store import LocalImageStore
+
+
+@pytest.mark.anyio
+async def test_get_trip(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    access_token: SessionORM,
+    trip_factory: Callable[..., Awaitable[TripORM]],
+):
+    access_user = await access_token.awaitable_attrs.user
+    trip = await trip_factory(
+        markers=[
+            {"latitude": 32.0 + index, "longitude": 34.0 + index} for index in range(3)
+        ],
+    )
+
+    url = fastapi_app.url_path_for("get_trip", trip_id=trip.id)
+    response = await client.get(url, cookies={"token": access_token.token})
+    expected_status_code = (
+        status.HTTP_200_OK if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+
+    # Trip is returned together with its markers, in creation order.
+    trip_details = TripDetails(**response.json())
+    assert [marker.title for marker in trip_details.markers] == [
+        "Marker 0",
+        "Marker 1",
+        "Marker 2",
+    ]
+    assert trip_details == trip.to_api(detailed=True)
+
+
+@pytest.mark.anyio
+async def test_get_trip_markers(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    access_token: SessionORM,
+    trip_factory: Callable[..., Awaitable[TripORM]],
+):
+    access_user = await access_token.awaitable_attrs.user
+    trip = await trip_factory(markers=[{}, {}])
+
+    url = fastapi_app.url_path_for("get_trip_markers", trip_id=trip.id)
+    cookies = {"token": access_token.token}
+
+    # Test 1: Markers are returned with an ETag.
+    response = await client.get(url, cookies=cookies)
+    expected_status_code = (
+        status.HTTP_200_OK if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+    assert [marker["title"] for marker in response.json()] == ["Marker 0", "Marker 1"]
+    etag = response.headers["ETag"]
+
+    # Test 2: Unchanged markers are not sent again.
+    response = await client.get(url, headers={"If-None-Match": etag}, cookies=cookies)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    # Test 3: Any marker write changes the ETag.
+    await client.patch(
+        fastapi_app.url_path_for("update_marker", marker_id=trip.markers[0].id),
+        json={"title": "Renamed"},
+        cookies=cookies,
+    )
+    response = await client.get(url, headers={"If-None-Match": etag}, cookies=cookies)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] != etag
+    assert response.json()[0]["title"] == "Renamed"
+
+
+@pytest.mark.anyio
+async def test_get_trip_markers_changes(
+    monkeypatch: MonkeyPatch,
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    access_token: SessionORM,
+    trip_factory: Callable[..., Awaitable[TripORM]],
+):
+    access_user = await access_token.awaitable_attrs.user
+    trip = await trip_factory(markers=[{}, {}, {}])
+
+    url = fastapi_app.url_path_for("get_trip_markers_changes", trip_id=trip.id)
+    cookies = {"token": access_token.token}
+    marker_ids = [marker.id for marker in trip.markers]
+
+    # Test 1: Without a version, all the markers are returned.
+    response = await client.get(url, cookies=cookies)
+    expected_status_code = (
+        status.HTTP_200_OK if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+    changes = TripMarkersChanges(**response.json())
+    assert [marker.id for marker in changes.markers] == marker_ids
+    assert changes.deleted_marker_ids == []
+    assert changes.full_resync
+
+    # Test 2: Only the markers written since the version are returned.
+    await client.patch(
+        fastapi_app.url_path_for("update_marker", marker_id=marker_ids[0]),
+        json={"title": "Renamed"},
+        cookies=cookies,
+    )
+    await client.delete(
+        fastapi_app.url_path_for("delete_marker", marker_id=marker_ids[1]),
+        cookies=cookies,
+    )
+    response = await client.get(url, params={"since": changes.version}, cookies=cookies)
+    next_changes = TripMarkersChanges(**response.json())
+    assert [marker.title for marker in next_changes.markers] == ["Renamed"]
+    assert next_changes.deleted_marker_ids == [marker_ids[1]]
+    assert next_changes.version > changes.version
+    assert not next_changes.full_resync
+
+    # Test 3: No changes since the last version.
+    response = await client.get(
+        url,
+        params={"since": next_changes.version},
+        cookies=cookies,
+    )
+    last_changes = TripMarkersChanges(**response.json())
+    assert (last_changes.markers, last_changes.deleted_marker_ids) == ([], [])
+
+    # Test 4: Past the retention, deleted markers are reaped, and clients syncing
+    # from before get all the markers instead.
+    monkeypatch.setattr(settings, "deleted_markers_retention", -1)
+    reaper = DeletedTripsReaper(interval=0, batch_size=10)
+    assert await reaper._reap_batches(dbsession, reaper.reap_tombstones_batch) == 1
+
+    response = await client.get(url, params={"since": changes.version}, cookies=cookies)
+    resync_changes = TripMarkersChanges(**response.json())
+    assert resync_changes.full_resync
+    assert [marker.id for marker in resync_changes.markers] == [
+        marker_ids[2],
+        marker_ids[0],
+    ]
+    assert resync_changes.deleted_marker_ids == []
+
+    response = await client.get(
+        url,
+        params={"since": next_changes.version},
+        cookies=cookies,
+    )
+    assert not TripMarkersChanges(**response.json()).full_resync
+
+
+@pytest.mark.anyio
+async def test_search_trips(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    access_token: SessionORM,
+    trip_factory: Callable[..., Awaitable[TripORM]],
+):
+    access_user = await access_token.awaitable_attrs.user
+    for name, description in [
+        ("Paris", "A week in London"),
+        ("London", "Museums"),
+        ("Rome", "Pasta"),
+    ]:
+        await trip_factory(name=name, description=description)
+
+    url = fastapi_app.url_path_for("get_trips")
+    cookies = {"token": access_token.token}
+
+    # Test 1: Prefix match, ranked by relevance (name matches weigh more).
+    response = await client.get(url, params={"search": "lond"}, cookies=cookies)
+    expected_status_code = (
+        status.HTTP_200_OK if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+    assert [trip["name"] for trip in response.json()] == ["London", "Paris"]
+
+    # Test 2: Ranked results are paginated as well.
+    response = await client.get(
+        url,
+        params={"search": "lond", "page_size": 1},
+        cookies=cookies,
+    )
+    assert [trip["name"] for trip in response.json()] == ["London"]
+    response = await client.get(
+        url,
+        params={"search": "lond", "cursor": response.headers[NEXT_CURSOR_HEADER]},
+        cookies=cookies,
+    )
+    assert [trip["name"] for trip in response.json()] == ["Paris"]
+
+    # Test 3: Substring matches.
+    response = await client.get(url, params={"search": "ast"}, cookies=cookies)
+    assert [trip["name"] for trip in response.json()] == ["Rome"]
+
+    response = await client.get(url, params={"name__ilike": "%ari%"}, cookies=cookies)
+    assert [trip["name"] for trip in response.json()] == ["Paris"]
+
+
+@pytest.mark.anyio
+async def test_export_trip(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    access_token: SessionORM,
+    trip_factory: Callable[..., Awaitable[TripORM]],
+):
+    access_user = await access_token.awaitable_attrs.user
+    trip = await trip_factory(
+        name="Trip & co",
+        markers=[
+            {"category": EMarkerCategory.Beach, "longitude": 34.0 + index}
+            for index in range(3)
+        ],
+    )
+
+    url = fastapi_app.url_path_for("export_trip", trip_id=trip.id)
+    cookies = {"token": access_token.token}
+
+    # Test 1: GeoJSON export.
+    response = await client.get(url, cookies=cookies)
+    expected_status_code = (
+        status.HTTP_200_OK if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+    assert response.headers["Content-Type"] == "application/geo+json"
+    features = response.json()["features"]
+    assert [feature["geometry"]["coordinates"] for feature in features] == [
+        [34.0, 32.0],
+        [35.0, 32.0],
+        [36.0, 32.0],
+    ]
+
+    # Test 2: XML exports are escaped.
+    response = await client.get(url, params={"format": "kml"}, cookies=cookies)
+    assert "<name>Trip &amp; co</name>" in response.text
+    assert response.text.count("<Placemark>") == 3
+
+    # Test 3: Unknown trip.
+    response = await client.get(
+        fastapi_app.url_path_for("export_trip", trip_id=trip.id + 1),
+        cookies=cookies,
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.anyio
+async def test_create_trip_picture_url(
+    monkeypatch: MonkeyPatch,
+    tmp_path: Path,
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    access_token: SessionORM,
+):
+    picture = b"\x89PNG\r\n\x1a\n" + os.urandom(1024)
+    picture_url = "https://images.test/trip.png"
+    requested_urls: List[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested_urls.append(str(request.url))
+        return httpx.Response(
+            200,
+            headers={"Content-Type": "image/png"},
+            content=picture,
+        )
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(
+        "MapsPlanner_API.web.services.image_ingestion.get_http_client",
+        lambda: http_client,
+    )
+    ingestion = ImageIngestion(
+        store=LocalImageStore(tmp_path),
+        max_concurrency=1,
+        max_bytes=len(picture),
+        timeout=1,
+        cache_size=8,
+    )
+    monkeypatch.setattr(
+        "MapsPlanner_API.web.api.trips.views.image_ingestion", ingestion
+    )
+    monkeypatch.setattr(
+        "MapsPlanner_API.web.api.trips.utils.image_ingestion", ingestion
+    )
+
+    @contextlib.asynccontextmanager
+    async def get_session():
+        yield dbsession
+
+    # The background task updates the trip within the test transaction.
+    monkeypatch.setattr("MapsPlanner_API.web.api.trips.utils.get_session", get_session)
+
+    access_user = await access_token.awaitable_attrs.user
+    url = fastapi_app.url_path_for("create_trip")
+    payload = {"name": "Trip", "description": "", "picture": picture_url}
+
+    # Test 1: Trip is created at once, and its picture attached in background.
+    response = await client.post(
+        url,
+        json=payload,
+        cookies={"token": access_token.token},
+    )
+    expected_status_code = (
+        status.HTTP_201_CREATED if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+    assert response.json()["picture"] is None
+    assert requested_urls == [picture_url]
+
+    trip = await dbsession.get(TripORM, response.json()["id"])
+    await dbsession.refresh(trip)
+    assert trip.picture is not None
+    assert LocalImageStore(tmp_path).read(trip.picture) == picture
+
+    # Test 2: Already ingested pictures are attached without fetching them again.
+    response = await client.post(
+        url,
+        json=payload,
+        cookies={"token": access_token.token},
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["picture"] == LocalImageStore.url_for(trip.picture)
+    assert requested_urls == [picture_url]
+
+    await http_client.aclose()
+
+
+@pytest.mark.anyio
+async def test_clone_trip(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    access_token: SessionORM,
+    trip_factory: Callable[..., Awaitable[TripORM]],
+):
+    access_user = await access_token.awaitable_attrs.user
+    trip = await trip_factory(
+        name="Template",
+        description="Base",
+        markers=[
+            {"category": category, "title": category.name}
+            for category in [EMarkerCategory.Beach, EMarkerCategory.Parks]
+        ],
+    )
+
+    url = fastapi_app.url_path_for("clone_trip", trip_id=trip.id)
+    cookies = {"token": access_token.token}
+
+    # Test 1: Trip is cloned with all of its markers.
+    response = await client.post(url, json={}, cookies=cookies)
+    expected_status_code = (
+        status.HTTP_201_CREATED if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+    clone = response.json()
+    assert (clone["name"], clone["description"]) == ("Template (copy)", "Base")
+
+    response = await client.get(
+        fastapi_app.url_path_for("get_trip", trip_id=clone["id"]),
+        cookies=cookies,
+    )
+    assert [marker["title"] for marker in response.json()["markers"]] == [
+        "Beach",
+        "Parks",
+    ]
+
+    # Test 2: Only markers of the given categories are cloned.
+    response = await client.post(
+        url,
+        json={"name": "Beaches", "categories": [EMarkerCategory.Beach]},
+        cookies=cookies,
+    )
+    clone = response.json()
+    assert clone["name"] == "Beaches"
+    response = await client.get(
+        fastapi_app.url_path_for("get_trip", trip_id=clone["id"]),
+        cookies=cookies,
+    )
+    assert [marker["title"] for marker in response.json()["markers"]] == ["Beach"]
+
+    # Test 3: Unknown trip.
+    response = await client.post(
+        fastapi_app.url_path_for("clone_trip", trip_id=clone["id"] + 1),
+        json={},
+        cookies=cookies,
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.anyio
+async def test_delete_trip(
+    monkeypatch: MonkeyPatch,
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    access_token: SessionORM,
+    trip_factory: Callable[..., Awaitable[TripORM]],
+):
+    access_user = await access_token.awaitable_attrs.user
+    trip = await trip_factory(markers=[{}] * 5)
+
+    trip_url = fastapi_app.url_path_for("get_trip", trip_id=trip.id)
+    restore_url = fastapi_app.url_path_for("restore_trip", trip_id=trip.id)
+    cookies = {"token": access_token.token}
+
+    # Test 1: Deleted trip is hidden, until restored.
+    response = await client.delete(trip_url, cookies=cookies)
+    expected_status_code = (
+        status.HTTP_204_NO_CONTENT if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+    response = await client.get(trip_url, cookies=cookies)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    response = await client.post(restore_url, cookies=cookies)
+    assert response.status_code == status.HTTP_200_OK
+    response = await client.get(trip_url, cookies=cookies)
+    assert len(response.json()["markers"]) == 5
+
+    # Test 2: Trips past the undo window are reaped, markers in batches.
+    await client.delete(trip_url, cookies=cookies)
+    monkeypatch.setattr(settings, "trip_undo_window", -1)
+    response = await client.post(restore_url, cookies=cookies)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    reaper = DeletedTripsReaper(interval=0, batch_size=2)
+    assert await reaper._reap_batches(dbsession, reaper.reap_markers_batch) == 5
+    assert await reaper._reap_batches(dbsession, reaper.reap_trips_batch) >= 1
+    dbsession.expunge_all()
+    assert await dbsession.get(TripORM, trip.id) is None
+
+
+@pytest.mark.anyio
+async def test_get_trip_clusters(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    access_token: SessionORM,
+    trip_factory: Callable[..., Awaitable[TripORM]],
+):
+    access_user = await access_token.awaitable_attrs.user
+    trip = await trip_factory(
+        markers=[
+            {"category": category, "latitude": 32.0 + index * 0.0001}
+            for index, category in enumerate(
+                [EMarkerCategory.Beach, EMarkerCategory.Beach, EMarkerCategory.Parks],
+            )
+        ]
+        + [{"title": "Far away", "latitude": -33.9, "longitude": 151.2}],
+    )
+
+    url = fastapi_app.url_path_for("get_trip_clusters", trip_id=trip.id)
+    cookies = {"token": access_token.token}
+
+    # Test 1: Close markers are clustered, with their categories histogram.
+    response = await client.get(url, params={"zoom": 5}, cookies=cookies)
+    expected_status_code = (
+        status.HTTP_200_OK if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+    clusters = sorted(response.json(), key=lambda cluster: cluster["count"])
+    assert [cluster["count"] for cluster in clusters] == [1, 3]
+    assert clusters[0]["marker_id"] == trip.markers[3].id
+    assert clusters[1]["categories"] == {
+        str(EMarkerCategory.Beach.value): 2,
+        str(EMarkerCategory.Parks.value): 1,
+    }
+
+    # Test 2: Markers are apart past the clustered zooms.
+    response = await client.get(url, params={"zoom": 20}, cookies=cookies)
+    assert len(response.json()) == 4
+
+    # Test 3: Only clusters inside the box.
+    response = await client.get(
+        url,
+        params={"zoom": 5, "bbox": "30,30,40,40"},
+        cookies=cookies,
+    )
+    assert [cluster["count"] for cluster in response.json()] == [3]
+
+    # Test 4: Cached clusters are recomputed once the trip markers are written,
+    # be it by another worker.
+    dbsession.add(
+        MarkerORM(
+            trip_id=trip.id,
+            category=EMarkerCategory.Parks,
+            title="Close",
+            description="",
+            latitude=32.0,
+            longitude=34.0,
+        ),
+    )
+    await dbsession.commit()
+    response = await client.get(url, params={"zoom": 5}, cookies=cookies)
+    assert sorted(cluster["count"] for cluster in response.json()) == [1, 4]
+
+
+@pytest.mark.anyio
+async def test_optimize_route(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    access_token: SessionORM,
+    trip_factory: Callable[..., Awaitable[TripORM]],
+):
+    access_user = await access_token.awaitable_attrs.user
+    trip = await trip_factory(
+        markers=[
+            {"latitude": 0.0, "longitude": float(longitude)}
+            for longitude in [3, 0, 2, 1]
+        ],
+    )
+
+    url = fastapi_app.url_path_for("optimize_route", trip_id=trip.id)
+    cookies = {"token": access_token.token}
+    by_longitude = {marker.longitude: marker.id for marker in trip.markers}
+
+    # Test 1: Markers on a line are visited along it, from the fixed start.
+    response = await client.post(
+        url,
+        json={"start_marker_id": by_longitude[0.0]},
+        cookies=cookies,
+    )
+    expected_status_code = (
+        status.HTTP_200_OK if access_user else status.HTTP_401_UNAUTHORIZED
+    )
+    assert response.status_code == expected_status_code
+    if not access_user:
+        return
+    route = response.json()
+    assert route["marker_ids"] == [by_longitude[index] for index in [0, 1, 2, 3]]
+    assert route["distance"] == pytest.approx(333_585, rel=1e-3)
+
+    # Test 2: Round trip.
+    response = await client.post(
+        url,
+        json={
+            "start_marker_id": by_longitude[2.0],
+            "end_marker_id": by_longitude[2.0],
+        },
+        cookies=cookies,
+    )
+    route = response.json()
+    assert route["marker_ids"][0] == route["marker_ids"][-1] == by_longitude[2.0]
+    assert len(route["marker_ids"]) == 5
+
+    # Test 3: Markers of other trips.
+    response = await client.post(url, json={"end_marker_id": -1}, cookies=cookies)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.anyio
+async def test_route_optimizer_broken_pool():
+    optimizer = RouteOptimizer(max_workers=1)
+
+    # A pool whose worker died, as when killed for memory.
+    broken_executor = ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    with pytest.raises(BrokenProcessPool):
+        broken_executor.submit(os._exit, 1).result()
+    optimizer._executor = broken_executor
+
+    # Test 1: The pool is replaced, and the optimization retried on the new one.
+    order, _distance = await optimizer.optimize(
+        np.zeros(3),
+        np.array([2.0, 0.0, 1.0]),
+        start=1,
+        end=None,
+        time_budget=1.0,
+    )
+    assert order == [1, 2, 0]
+    assert optimizer._executor not in {None, broken_executor}
+    assert optimizer.optimized == 1
+
+    optimizer.shutdown()
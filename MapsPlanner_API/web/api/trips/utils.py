@@ -1,36 +1,123 @@
 from datetime import datetime, timezone
-from typing import Optional
+from logging import getLogger
+from typing import List, Optional
 
-from fastapi import HTTPException
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
-from starlette import status
+from sqlalchemy import (
+    Integer,
+    Select,
+    String,
+    func,
+    insert,
+    literal,
+    select,
+    true,
+    update,
+)
 
+from MapsPlanner_API.db.connection import get_session
+from MapsPlanner_API.db.models.Marker import MarkerORM
 from MapsPlanner_API.db.models.Trip import TripORM
-from MapsPlanner_API.db.models.User import UserORM
+from MapsPlanner_API.web.api.markers.schema import EMarkerCategory
+from MapsPlanner_API.web.services.image_ingestion import (
+    ImageFetchError,
+    image_ingestion,
+)
 
+logger = getLogger("api")
 
-async def validate_trip_for_user(
-    db: AsyncSession,
-    user: UserORM,
+TRIP_CLONE_COLUMNS = (
+    TripORM.id,
+    TripORM.user_id,
+    TripORM.name,
+    TripORM.description,
+    TripORM.picture,
+    TripORM.creation_date,
+)
+
+
+async def ingest_trip_picture(trip_id: int, url: str) -> None:
+    """
+    Copies the remote picture of a created trip into the image store.
+    Runs after the response is sent, so trip creation never waits on the image host.
+    """
+    try:
+        picture_hash = await image_ingestion.ingest_url(url)
+    except ImageFetchError as ex:
+        logger.warning(f"Failed to ingest picture of trip #{trip_id}: {ex}")
+        return
+
+    async with get_session() as db:
+        await db.execute(
+            update(TripORM).where(TripORM.id == trip_id).values(picture=picture_hash),
+        )
+        await db.commit()
+
+
+def trip_clone_query(
+    trips_query: Select,
     trip_id: int,
-    raise_on_not_found: bool = False,
-) -> Optional[TripORM]:
-    where_clause = [TripORM.id == trip_id]
+    owner_id: int,
+    name: Optional[str] = None,
+    categories: Optional[List[EMarkerCategory]] = None,
+) -> Select:
+    """
+    Builds a single statement copying a trip and its markers, with data modifying
+    CTEs (`INSERT ... SELECT ... RETURNING`), so the copy never leaves the database.
 
-    if not user.is_administrator:
-        user_trips_ids = [trip.id for trip in await user.awaitable_attrs.trips]
-        where_clause.append(TripORM.id.in_(user_trips_ids))
+    @param: trips_query - access controlled trips query, to copy from.
+    @returns the new trip columns, along with `markers_count`.
+    """
+    new_trip = (
+        insert(TripORM)
+        .from_select(
+            ["user_id", "name", "description", "picture"],
+            trips_query.where(TripORM.id == trip_id).with_only_columns(
+                literal(owner_id, Integer),
+                literal(name, String) if name else TripORM.name + " (copy)",
+                TripORM.description,
+                TripORM.picture,
+            ),
+        )
+        .returning(*TRIP_CLONE_COLUMNS)
+        .cte("new_trip")
+    )
 
-    query = select(TripORM).where(*where_clause)
+    markers_query = (
+        select(
+            new_trip.c.id,
+            MarkerORM.category,
+            MarkerORM.title,
+            MarkerORM.description,
+            MarkerORM.latitude,
+            MarkerORM.longitude,
+        )
+        .select_from(MarkerORM)
+        .join(new_trip, true())
+        .where(MarkerORM.trip_id == trip_id)
+        .order_by(MarkerORM.id)
+    )
+    if categories is not None:
+        markers_query = markers_query.where(
+            MarkerORM.category.in_([category.value for category in categories]),
+        )
 
-    result = await db.execute(query)
-    trip = result.scalar_one_or_none()
+    new_markers = (
+        insert(MarkerORM)
+        .from_select(
+            ["trip_id", "category", "title", "description", "latitude", "longitude"],
+            markers_query,
+        )
+        .returning(MarkerORM.id)
+        .cte("new_markers")
+    )
 
-    if not trip and raise_on_not_found:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found.")
-    else:
-        return trip
+    return select(
+        *new_trip.c,
+        select(func.count())
+        .select_from(new_markers)
+        .scalar_subquery()
+        .label("markers_count"),
+    )
 
 
 def date_range_param_validator(
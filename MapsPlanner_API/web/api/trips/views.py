@@ -1,46 +1,223 @@
-from typing import Annotated
+from datetime import datetime, timezone
+from typing import Annotated, List, Optional
 
+import numpy as np
 import sqlalchemy.exc
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from fastapi_filter import FilterDepends
-from sqlalchemy import Select
+from sqlalchemy import Select, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 from starlette import status
-from starlette.responses import Response
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
 
 from MapsPlanner_API.db.dependencies import get_db_session
 from MapsPlanner_API.db.models.AuditLog import EAuditAction
+from MapsPlanner_API.db.models.DeletedMarker import DeletedMarkerORM
+from MapsPlanner_API.db.models.Marker import MarkerORM
 from MapsPlanner_API.db.models.Trip import TripORM
 from MapsPlanner_API.db.models.User import UserORM
+from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.authorization.ownership import (
+    OwnershipAuthorizer,
+    trip_owners_cache,
+)
 from MapsPlanner_API.web.api.dependencies import (
     TAuditLogger,
     get_audit_logger,
+    get_authorizer,
     get_current_user,
+    get_pagination,
     get_queryset,
 )
+from MapsPlanner_API.web.api.markers.schema import Marker, VersionedMarker
+from MapsPlanner_API.web.api.query_filters import (
+    BoundingBoxFilter,
+    KeysetPagination,
+    paginate_results,
+)
+from MapsPlanner_API.web.api.trips.clusters import MAX_ZOOM, load_trip_clusters
+from MapsPlanner_API.web.api.trips.export import ETripExportFormat, export_response
+from MapsPlanner_API.web.api.trips.routing import route_optimizer
 from MapsPlanner_API.web.api.trips.schema import (
+    APIRouteOptimizationRequest,
+    APITripCloneRequest,
     APITripCreationRequest,
+    MarkerCluster,
+    OptimizedRoute,
     Trip,
     TripDetails,
     TripFilter,
+    TripMarkersChanges,
+    is_image_url,
 )
+from MapsPlanner_API.web.api.trips.utils import ingest_trip_picture, trip_clone_query
+from MapsPlanner_API.web.services.image_ingestion import image_ingestion
+from MapsPlanner_API.web.services.image_store import decode_data_uri, image_store
 
 router = APIRouter(prefix="/trips", tags=["Trips"])
 
 
 @router.get("/")
 async def get_trips(
+    request: Request,
+    response: Response,
     db: Annotated[AsyncSession, Depends(get_db_session)],
-    query: Annotated[Select, Depends(get_queryset(TripORM))],
+    query: Annotated[Select, Depends(get_queryset(TripORM, order_field=None))],
+    pagination: Annotated[KeysetPagination, Depends(get_pagination(TripORM))],
     trip_filter: Annotated[TripFilter, FilterDepends(TripFilter)],
 ):
-    query = trip_filter.filter(query)
+    # Searches are ranked by relevance, other listings by recency.
+    query = pagination.apply(
+        trip_filter.filter(query),
+        order_by=trip_filter.search_ordering,
+    )
     result = await db.execute(query)
-    trips_orm = result.scalars()
+    trips_orm = paginate_results(request, response, result.scalars().all())
 
     return [trip_orm.to_api() for trip_orm in trips_orm]
 
 
+@router.get("/export")
+async def export_trips(
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    query: Annotated[Select, Depends(get_queryset(TripORM, order_field=None))],
+    export_format: Annotated[
+        ETripExportFormat,
+        Query(alias="format"),
+    ] = ETripExportFormat.geojson,
+) -> StreamingResponse:
+    """
+    Exports the markers of all the user trips.
+    """
+    return export_response(db, query, export_format, filename="trips")
+
+
+@router.get("/{trip_id}/export")
+async def export_trip(
+    trip_id: int,
+    authorizer: Annotated[OwnershipAuthorizer, Depends(get_authorizer)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    export_format: Annotated[
+        ETripExportFormat,
+        Query(alias="format"),
+    ] = ETripExportFormat.geojson,
+) -> StreamingResponse:
+    await authorizer.authorize_trip(trip_id)
+
+    query = select(TripORM).where(TripORM.id == trip_id)
+    return export_response(db, query, export_format, filename=f"trip-{trip_id}")
+
+
+@router.get("/{trip_id}/clusters")
+async def get_trip_clusters(
+    trip_id: int,
+    authorizer: Annotated[OwnershipAuthorizer, Depends(get_authorizer)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    zoom: Annotated[int, Query(ge=0, le=MAX_ZOOM)],
+    bbox: Optional[BoundingBoxFilter(description="minLon,minLat,maxLon,maxLat")] = None,
+) -> List[MarkerCluster]:
+    await authorizer.authorize_trip(trip_id)
+
+    trip_clusters = await load_trip_clusters(db, trip_id)
+    return trip_clusters.clusters(zoom, bbox)
+
+
+@router.get("/{trip_id}/markers")
+async def get_trip_markers(
+    trip_id: int,
+    request: Request,
+    response: Response,
+    authorizer: Annotated[OwnershipAuthorizer, Depends(get_authorizer)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+) -> List[Marker]:
+    """
+    Markers of the trip, with a strong ETag of the trip markers version. Clients
+    polling with `If-None-Match` get a 304, without the markers being loaded,
+    while they are unchanged.
+    """
+    await authorizer.authorize_trip(trip_id)
+
+    # Read before the markers: a write in between yields newer markers under an
+    # older ETag, refreshed on the next poll, never the other way around.
+    markers_version = await db.scalar(
+        select(TripORM.markers_version).where(TripORM.id == trip_id),
+    )
+    etag = f'"{trip_id}.{markers_version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in if_none_match or if_none_match.strip() == "*":
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    markers_query = (
+        select(MarkerORM).where(MarkerORM.trip_id == trip_id).order_by(MarkerORM.id)
+    )
+    markers_orm = (await db.scalars(markers_query)).all()
+    return [marker_orm.to_api() for marker_orm in markers_orm]
+
+
+@router.get("/{trip_id}/changes")
+async def get_trip_markers_changes(
+    trip_id: int,
+    authorizer: Annotated[OwnershipAuthorizer, Depends(get_authorizer)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    since: Annotated[
+        Optional[int],
+        Query(ge=0, description="`version` of the previous changes."),
+    ] = None,
+) -> TripMarkersChanges:
+    """
+    Markers created, updated or deleted since a version, for clients syncing the
+    trip. Without `since`, or past the deleted markers retention, all the markers.
+    """
+    await authorizer.authorize_trip(trip_id)
+
+    # Read before the changes: changes committed in between are sent again with
+    # the next changes, never missed.
+    trip_versions = (
+        await db.execute(
+            select(TripORM.markers_version, TripORM.pruned_markers_version).where(
+                TripORM.id == trip_id,
+            ),
+        )
+    ).one()
+    full_resync = since is None or since < trip_versions.pruned_markers_version
+
+    # Versions are written by the database, refresh markers the session holds.
+    markers_query = (
+        select(MarkerORM)
+        .where(MarkerORM.trip_id == trip_id)
+        .order_by(MarkerORM.version, MarkerORM.id)
+        .execution_options(populate_existing=True)
+    )
+    deleted_marker_ids = []
+    if not full_resync:
+        markers_query = markers_query.where(MarkerORM.version > since)
+        deleted_markers_query = select(DeletedMarkerORM.marker_id).where(
+            DeletedMarkerORM.trip_id == trip_id,
+            DeletedMarkerORM.version > since,
+        )
+        deleted_marker_ids = (await db.scalars(deleted_markers_query)).all()
+
+    markers_orm = (await db.scalars(markers_query)).all()
+    return TripMarkersChanges(
+        version=trip_versions.markers_version,
+        markers=[
+            VersionedMarker(
+                **marker_orm.to_api().model_dump(),
+                version=marker_orm.version,
+                updated_at=marker_orm.updated_at,
+            )
+            for marker_orm in markers_orm
+        ],
+        deleted_marker_ids=deleted_marker_ids,
+        full_resync=full_resync,
+    )
+
+
 @router.get("/{trip_id}")
 async def get_trip(
     trip_id: int,
@@ -48,15 +225,10 @@ async def get_trip(
     query: Annotated[Select, Depends(get_queryset(TripORM))],
 ) -> TripDetails:
     try:
-        query = query.where(TripORM.id == trip_id)
-        trip_orm: TripORM = (await db.execute(query)).scalar_one()
-        trip_card: Trip = trip_orm.to_api()
-        markers_orm = await trip_orm.awaitable_attrs.markers
+        query = TripORM.with_markers(query.where(TripORM.id == trip_id))
+        trip_orm: TripORM = (await db.execute(query)).unique().scalar_one()
 
-        return TripDetails(
-            **trip_card.model_dump(),
-            markers=[marker_orm.to_api() for marker_orm in markers_orm],
-        )
+        return trip_orm.to_api(detailed=True)
     except (sqlalchemy.exc.NoResultFound, sqlalchemy.exc.MultipleResultsFound):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -68,24 +240,141 @@ async def get_trip(
 async def create_trip(
     payload: APITripCreationRequest,
     response: Response,
+    background_tasks: BackgroundTasks,
     user: Annotated[UserORM, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(get_db_session)],
 ) -> Trip:
+    picture_hash: Optional[str] = None
+    picture_url: Optional[str] = None
+
+    if payload.picture and is_image_url(payload.picture):
+        # Already fetched images are reused, others are fetched in background.
+        picture_hash = image_ingestion.cached_hash(payload.picture)
+        picture_url = None if picture_hash else payload.picture
+    elif payload.picture:
+        try:
+            picture_hash = await image_store.put(decode_data_uri(payload.picture))
+        except ValueError as ex:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Invalid picture: {ex}",
+            )
+
     trip_orm = TripORM(
         user_id=user.id,
         name=payload.name,
         description=payload.description,
-        picture=payload.picture,
+        picture=picture_hash,
     )
 
     db.add(trip_orm)
     await db.commit()
 
+    if picture_url:
+        background_tasks.add_task(ingest_trip_picture, trip_orm.id, picture_url)
+
     response.status_code = status.HTTP_201_CREATED
 
     return trip_orm.to_api()
 
 
+@router.post("/{trip_id}/clone")
+async def clone_trip(
+    trip_id: int,
+    payload: APITripCloneRequest,
+    response: Response,
+    user: Annotated[UserORM, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    query: Annotated[Select, Depends(get_queryset(TripORM, order_field=None))],
+    audit: Annotated[TAuditLogger, Depends(get_audit_logger)],
+) -> Trip:
+    """
+    Copies a trip and its markers (optionally only some categories of them) into
+    a new trip of the current user.
+    """
+    clone_query = trip_clone_query(
+        query,
+        trip_id,
+        owner_id=user.id,
+        name=payload.name,
+        categories=payload.categories,
+    )
+    row = (await db.execute(clone_query)).one_or_none()
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Trip #{trip_id} not found.",
+        )
+
+    trip_fields = row._asdict()
+    markers_count = trip_fields.pop("markers_count")
+    trip_orm = TripORM(**trip_fields)
+    make_transient_to_detached(trip_orm)
+    db.add(trip_orm)
+
+    await audit(
+        action=EAuditAction.Creation,
+        target=trip_orm,
+        cloned_from=trip_id,
+        markers_count=markers_count,
+    )
+
+    response.status_code = status.HTTP_201_CREATED
+    return trip_orm.to_api()
+
+
+@router.post("/{trip_id}/optimize-route")
+async def optimize_route(
+    trip_id: int,
+    payload: APIRouteOptimizationRequest,
+    authorizer: Annotated[OwnershipAuthorizer, Depends(get_authorizer)],
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+) -> OptimizedRoute:
+    """
+    Suggests the shortest order to visit the trip markers in.
+    """
+    await authorizer.authorize_trip(trip_id)
+
+    markers_query = (
+        select(MarkerORM.id, MarkerORM.latitude, MarkerORM.longitude)
+        .where(MarkerORM.trip_id == trip_id)
+        .order_by(MarkerORM.id)
+        .limit(int(settings.route_max_markers) + 1)
+    )
+    rows = (await db.execute(markers_query)).all()
+    if len(rows) > int(settings.route_max_markers):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Routes are limited to {settings.route_max_markers} markers.",
+        )
+
+    marker_ids = [row.id for row in rows]
+    indices = {marker_id: index for index, marker_id in enumerate(marker_ids)}
+    for marker_id in (payload.start_marker_id, payload.end_marker_id):
+        if marker_id is not None and marker_id not in indices:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Marker #{marker_id} is not in trip #{trip_id}.",
+            )
+
+    time_budget = min(
+        payload.time_budget or float(settings.route_time_budget),
+        float(settings.route_time_budget),
+    )
+    order, distance = await route_optimizer.optimize(
+        np.array([row.latitude for row in rows], dtype=np.float64),
+        np.array([row.longitude for row in rows], dtype=np.float64),
+        start=indices.get(payload.start_marker_id),
+        end=indices.get(payload.end_marker_id),
+        time_budget=time_budget,
+    )
+
+    return OptimizedRoute(
+        marker_ids=[marker_ids[index] for index in order],
+        distance=distance,
+    )
+
+
 @router.delete("/{trip_id}")
 async def delete_trip(
     trip_id: int,
@@ -94,12 +383,18 @@ async def delete_trip(
     query: Annotated[Select, Depends(get_queryset(TripORM))],
     audit: Annotated[TAuditLogger, Depends(get_audit_logger)],
 ) -> dict:
+    """
+    Soft deletes the trip: it is hidden right away, and can be restored until the
+    undo window passes. Its markers are removed later, in the background.
+    """
     try:
         query = query.where(TripORM.id == trip_id)
         trip_orm: TripORM = (await db.execute(query)).scalar_one()
 
-        await db.delete(trip_orm)
+        trip_orm.deleted_date = datetime.now(tz=timezone.utc)
+        db.add(trip_orm)
         await audit(action=EAuditAction.Deletion, target=trip_orm)
+        await trip_owners_cache.publish_trip_deletion(db, trip_id)
 
         response.status_code = status.HTTP_204_NO_CONTENT
         return {}
@@ -109,3 +404,31 @@ async def delete_trip(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Trip #{trip_id} not found.",
         )
+
+
+@router.post("/{trip_id}/restore")
+async def restore_trip(
+    trip_id: int,
+    db: Annotated[AsyncSession, Depends(get_db_session)],
+    query: Annotated[Select, Depends(get_queryset(TripORM, deleted=True))],
+    audit: Annotated[TAuditLogger, Depends(get_audit_logger)],
+) -> Trip:
+    """
+    Undoes the deletion of a trip, within the undo window.
+    """
+    query = query.where(
+        TripORM.id == trip_id,
+        TripORM.deleted_date > TripORM.undo_cutoff(),
+    )
+    trip_orm: Optional[TripORM] = (await db.execute(query)).scalar_one_or_none()
+    if trip_orm is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Deleted trip #{trip_id} not found.",
+        )
+
+    trip_orm.deleted_date = None
+    db.add(trip_orm)
+    await audit(action=EAuditAction.Modification, target=trip_orm, restored=True)
+
+    return trip_orm.to_api()
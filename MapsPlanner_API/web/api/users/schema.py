@@ -17,6 +17,8 @@ class User(BaseModel):
     full_name: str
     email: str
     profile_picture: Optional[str]
+    # Only available for pictures kept in the image store.
+    profile_picture_thumbnail: Optional[str] = None
     is_active: bool
     is_administrator: bool
 
@@ -36,7 +38,9 @@ class UserDetails(User):
         from MapsPlanner_API.db.models.Trip import TripORM
 
         total_trips_query = (
-            select(func.count()).select_from(TripORM).where(TripORM.user_id == user.id)
+            select(func.count())
+            .select_from(TripORM)
+            .where(TripORM.user_id == user.id, TripORM.deleted_date.is_(None))
         )
 
         total_trips_result = await db.execute(total_trips_query)
@@ -44,7 +48,7 @@ class UserDetails(User):
         total_markers_query = (
             select(func.count())
             .select_from(MarkerORM)
-            .where(TripORM.user_id == user.id)
+            .where(TripORM.user_id == user.id, TripORM.deleted_date.is_(None))
             .join(TripORM, MarkerORM.trip_id == TripORM.id)
         )
 
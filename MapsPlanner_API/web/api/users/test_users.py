@@ -9,6 +9,7 @@ from starlette import status
 
 from MapsPlanner_API.db.models.Session import SessionORM
 from MapsPlanner_API.db.models.User import UserORM
+from MapsPlanner_API.web.api.query_filters.pagination import NEXT_CURSOR_HEADER
 from MapsPlanner_API.web.api.users.schema import User, UserDetails, UserUpdateRequest
 
 
@@ -74,6 +75,53 @@ async def test_users_list(
         assert response.json() == expected_users, "Unexpected users response."
 
 
+@pytest.mark.anyio
+async def test_users_list_pagination(
+    fastapi_app: FastAPI,
+    client: AsyncClient,
+    dbsession: AsyncSession,
+    users: List[UserORM],
+):
+    admin = users[0]
+    admin.is_administrator = True
+    dbsession.add(admin)
+    await dbsession.commit()
+    session, *other_sessions = await admin.awaitable_attrs.sessions
+
+    url = fastapi_app.url_path_for("users_list")
+    params = {"impersonate_user_id": "all", "page_size": 2}
+    pages = []
+
+    while True:
+        response = await client.get(
+            url,
+            params=params,
+            cookies={"token": session.token},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        pages.append(response.json())
+
+        if NEXT_CURSOR_HEADER not in response.headers:
+            break
+        params["cursor"] = response.headers[NEXT_CURSOR_HEADER]
+
+    # 1. Test pages are bounded, and together hold every user once, in order.
+    assert all(len(page) <= 2 for page in pages)
+    expected_users = [
+        user.to_api().model_dump()
+        for user in sorted(users, key=lambda user: user.id, reverse=True)
+    ]
+    assert [user for page in pages for user in page] == expected_users
+
+    # 2. Test invalid cursor is rejected.
+    response = await client.get(
+        url,
+        params={"cursor": "invalid"},
+        cookies={"token": session.token},
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
 @pytest.mark.anyio
 async def test_user_details(
     fastapi_app: FastAPI,
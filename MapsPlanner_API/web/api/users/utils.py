@@ -1,6 +1,19 @@
+from logging import getLogger
+
 from fastapi import HTTPException
+from sqlalchemy import update
 from starlette import status
 
+from MapsPlanner_API.db.connection import get_session
+from MapsPlanner_API.db.models.User import UserORM
+from MapsPlanner_API.web.services.image_ingestion import (
+    ImageFetchError,
+    image_ingestion,
+)
+from MapsPlanner_API.web.services.image_store import image_store
+
+logger = getLogger("api")
+
 
 def validate_request(current_user, requested_user_id):
     if not (requested_user_id == current_user.id or current_user.is_administrator):
@@ -8,3 +21,23 @@ def validate_request(current_user, requested_user_id):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No Such user.",
         )
+
+
+async def ingest_profile_picture(user_id: int, url: str) -> None:
+    """
+    Copies a remote profile picture (e.g. the Google one) into the image store, so
+    it is served along with its thumbnail. Runs after the login response is sent.
+    """
+    try:
+        picture_hash = await image_ingestion.ingest_url(url)
+    except ImageFetchError as ex:
+        logger.warning(f"Failed to ingest profile picture of user #{user_id}: {ex}")
+        return
+
+    async with get_session() as db:
+        await db.execute(
+            update(UserORM)
+            .where(UserORM.id == user_id, UserORM.profile_picture == url)
+            .values(profile_picture=image_store.url_for(picture_hash)),
+        )
+        await db.commit()
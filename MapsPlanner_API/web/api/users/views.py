@@ -6,6 +6,8 @@ from fastapi_filter import FilterDepends
 from sqlalchemy import Select
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
+from starlette.requests import Request
+from starlette.responses import Response
 
 from MapsPlanner_API.db.dependencies import get_db_session
 from MapsPlanner_API.db.models.AuditLog import EAuditAction
@@ -14,8 +16,10 @@ from MapsPlanner_API.web.api.dependencies import (
     TAuditLogger,
     get_audit_logger,
     get_current_user,
+    get_paginated_queryset,
     get_queryset,
 )
+from MapsPlanner_API.web.api.query_filters import paginate_results
 from MapsPlanner_API.web.api.users.schema import (
     User,
     UserDetails,
@@ -36,13 +40,19 @@ async def current_user(user: Annotated[UserORM, Depends(get_current_user)]) -> U
 
 @router.get("/")
 async def users_list(
+    request: Request,
+    response: Response,
     db: Annotated[AsyncSession, Depends(get_db_session)],
-    query: Annotated[Select, Depends(get_queryset(UserORM))],
+    query: Annotated[Select, Depends(get_paginated_queryset(UserORM))],
     user_filter: Annotated[UserFilter, FilterDepends(UserFilter)],
 ) -> List[User]:
     query = user_filter.filter(query)
     users_result = await db.execute(query)
-    users: List[UserORM] = users_result.scalars()
+    users: List[UserORM] = paginate_results(
+        request,
+        response,
+        users_result.scalars().all(),
+    )
 
     return [user.to_api() for user in users]
 
@@ -6,7 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from MapsPlanner_API.db.dependencies import get_db_session
 from MapsPlanner_API.db.models.User import UserORM
-from MapsPlanner_API.web.api.query_filters import PAGE_SIZE
+from MapsPlanner_API.settings import settings
 from MapsPlanner_API.web.api.users.views import get_current_user
 
 
@@ -27,7 +27,10 @@ def api_response(ORMEntity):
                 query = query.filter(ORMEntity.user_id == user.id)
 
             # Add pagination
-            query = query.slice(PAGE_SIZE * page, PAGE_SIZE)
+            query = query.slice(
+                settings.page_size * page,
+                settings.page_size * (page + 1),
+            )
 
             result = await db.execute(query)
             return [orm.to_api() for orm in result.scalars()]
@@ -4,6 +4,16 @@ from fastapi import FastAPI
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.authentication.session_cache import session_cache
+from MapsPlanner_API.web.api.authentication.session_purger import (
+    expired_sessions_purger,
+)
+from MapsPlanner_API.web.api.authentication.signed_tokens import token_signer
+from MapsPlanner_API.web.api.authorization.ownership import trip_owners_cache
+from MapsPlanner_API.web.api.trips.reaper import deleted_trips_reaper
+from MapsPlanner_API.web.api.trips.routing import route_optimizer
+from MapsPlanner_API.web.services.http_client import close_http_client
+from MapsPlanner_API.web.services.image_derivatives import image_derivatives
 
 
 def _setup_db(app: FastAPI) -> None:  # pragma: no cover
@@ -45,7 +55,14 @@ def register_startup_event(
     @app.on_event("startup")
     async def _startup() -> None:  # noqa: WPS430
         app.middleware_stack = None
+        token_signer.validate()
         _setup_db(app)
+        await session_cache.start_listener(app.state.db_engine)
+        await trip_owners_cache.start_listener(app.state.db_engine)
+        if token_signer.enabled:
+            token_signer.revoked.start(app.state.db_session_factory)
+        expired_sessions_purger.start(app.state.db_session_factory)
+        deleted_trips_reaper.start(app.state.db_session_factory)
         app.middleware_stack = app.build_middleware_stack()
         pass  # noqa: WPS420
 
@@ -64,6 +81,14 @@ def register_shutdown_event(
 
     @app.on_event("shutdown")
     async def _shutdown() -> None:  # noqa: WPS430
+        await session_cache.stop_listener()
+        await trip_owners_cache.stop_listener()
+        await token_signer.revoked.stop()
+        await expired_sessions_purger.stop()
+        await deleted_trips_reaper.stop()
+        await close_http_client()
+        image_derivatives.shutdown()
+        route_optimizer.shutdown()
         await app.state.db_engine.dispose()
 
         pass  # noqa: WPS420
@@ -0,0 +1,28 @@
+from typing import Optional
+
+import httpx
+
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+DEFAULT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the shared, keep-alive pooled, HTTP client of the worker.
+    """
+    global _client  # noqa: WPS420
+
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, limits=DEFAULT_LIMITS)
+
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client  # noqa: WPS420
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
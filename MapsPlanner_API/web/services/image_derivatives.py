@@ -0,0 +1,246 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import anyio
+from PIL import Image, ImageOps, features
+
+from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.metrics.registry import metrics_registry
+from MapsPlanner_API.web.services.image_store import LocalImageStore, image_store
+
+
+class EImageSize(str, Enum):
+    thumbnail = "thumbnail"
+    small = "small"
+    medium = "medium"
+    large = "large"
+
+    @property
+    def max_side(self) -> int:
+        return IMAGE_SIZES[self]
+
+
+class EImageFormat(str, Enum):
+    avif = "avif"
+    webp = "webp"
+    jpeg = "jpeg"
+
+    @property
+    def content_type(self) -> str:
+        return f"image/{self.value}"
+
+
+# Longest side, in pixels, of each derivative size.
+IMAGE_SIZES = {
+    EImageSize.thumbnail: 160,
+    EImageSize.small: 320,
+    EImageSize.medium: 720,
+    EImageSize.large: 1280,
+}
+
+
+class ImageRenderError(Exception):
+    pass
+
+
+def render_derivative(
+    source: Path,
+    target: Path,
+    max_side: int,
+    image_format: str,
+    quality: int,
+) -> int:
+    """
+    Writes a downscaled copy of `source` into `target`. Runs in a worker process.
+
+    @returns the derivative size, in bytes.
+    """
+    with Image.open(source) as image:
+        # Lets JPEG decode straight into a reduced scale, which is much cheaper.
+        image.draft("RGB", (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        if image_format == EImageFormat.jpeg.value:
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=target.parent)
+        with os.fdopen(file_descriptor, "wb") as temp_file:
+            image.save(temp_file, format=image_format.upper(), quality=quality)
+        os.replace(temp_path, target)
+
+    return target.stat().st_size
+
+
+class ImageDerivatives:
+    """
+    Resized and re-encoded (WebP / AVIF / JPEG) variants of stored images.
+
+    Derivatives are rendered on demand in a process pool, so image decoding never
+    runs on the event loop, and are cached on disk by source hash, size and
+    format. Concurrent requests for the same derivative share a single render.
+    """
+
+    def __init__(
+        self,
+        store: LocalImageStore,
+        root: Path,
+        max_workers: int,
+        quality: int,
+    ):
+        self.store = store
+        self.root = Path(root)
+        self.max_workers = max_workers
+        self.quality = quality
+
+        self.rendered = 0
+        self.cache_hits = 0
+        self.failures = 0
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+
+    @classmethod
+    def is_supported(cls, image_format: EImageFormat) -> bool:
+        return image_format == EImageFormat.jpeg or features.check(image_format.value)
+
+    def negotiate_format(self, accept: str) -> EImageFormat:
+        """
+        @returns the most compact format the client accepts, by its `Accept` header.
+        """
+        for image_format in (EImageFormat.avif, EImageFormat.webp):
+            if image_format.content_type in accept and self.is_supported(image_format):
+                return image_format
+
+        return EImageFormat.jpeg
+
+    def path_for(
+        self,
+        image_hash: str,
+        size: EImageSize,
+        image_format: EImageFormat,
+    ) -> Path:
+        source = self.store.path_for(image_hash)
+        relative = source.relative_to(self.store.root)
+        return self.root / relative / f"{size.value}.{image_format.value}"
+
+    async def get(
+        self,
+        image_hash: str,
+        size: EImageSize,
+        image_format: EImageFormat,
+    ) -> Optional[Path]:
+        """
+        @returns the derivative path, rendering it if needed, or None when the
+        source image does not exist.
+        @raises ImageRenderError when the source image cannot be decoded.
+        """
+        path = self.path_for(image_hash, size, image_format)
+        if await anyio.to_thread.run_sync(path.exists):
+            self.cache_hits += 1
+            return path
+
+        key = (image_hash, size.value, image_format.value)
+        if (inflight := self._inflight.get(key)) is None:
+            inflight = asyncio.ensure_future(self._render(image_hash, size, path))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda future: self._forget(key, future))
+
+        return await asyncio.shield(inflight)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rendered": self.rendered,
+            "cache_hits": self.cache_hits,
+            "failures": self.failures,
+            "inflight": len(self._inflight),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _render(
+        self,
+        image_hash: str,
+        size: EImageSize,
+        path: Path,
+    ) -> Optional[Path]:
+        render_args = (
+            self.store.path_for(image_hash),
+            path,
+            size.max_side,
+            path.suffix[1:],
+            self.quality,
+        )
+        try:
+            try:
+                await self._run_render(*render_args)
+            except BrokenProcessPool:
+                # A dead worker (e.g. killed for memory) fails every pending render
+                # of its pool, so they are retried once on a new pool.
+                await self._run_render(*render_args)
+        except FileNotFoundError:
+            return None
+        except (
+            OSError,
+            ValueError,
+            Image.DecompressionBombError,
+            BrokenProcessPool,
+        ) as ex:
+            self.failures += 1
+            raise ImageRenderError(f"Failed to render image {image_hash}: {ex!r}")
+
+        self.rendered += 1
+        return path
+
+    async def _run_render(self, *render_args: Any) -> None:
+        executor = self._get_executor()
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                executor,
+                render_derivative,
+                *render_args,
+            )
+        except BrokenProcessPool:
+            # Replaced once, by the first of the renders it failed.
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            raise
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Forking a process that runs an event loop and threads is unsafe.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+        return self._executor
+
+    def _forget(self, key: Tuple[str, str, str], future: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        # Retrieve the error, in case every waiter was cancelled meanwhile.
+        if not future.cancelled():
+            future.exception()
+
+
+image_derivatives = ImageDerivatives(
+    store=image_store,
+    root=settings.image_derivatives_path,
+    max_workers=int(settings.image_derivatives_workers),
+    quality=int(settings.image_derivatives_quality),
+)
+metrics_registry.register("image_derivatives", image_derivatives.stats)
@@ -0,0 +1,133 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import httpx
+
+from MapsPlanner_API.settings import settings
+from MapsPlanner_API.web.api.metrics.registry import metrics_registry
+from MapsPlanner_API.web.services.http_client import get_http_client
+from MapsPlanner_API.web.services.image_store import LocalImageStore, image_store
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+class ImageIngestion:
+    """
+    Copies remote images into the image store.
+
+    Downloads are capped in concurrency, size (enforced while streaming) and time.
+    Each URL is downloaded once: concurrent requests for the same URL share the
+    same download, and a bounded URL -> content hash cache serves repeated ones.
+    """
+
+    def __init__(
+        self,
+        store: LocalImageStore,
+        max_concurrency: int,
+        max_bytes: int,
+        timeout: float,
+        cache_size: int,
+    ):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.cache_size = cache_size
+
+        self.downloads = 0
+        self.cache_hits = 0
+        self.failures = 0
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._url_hashes: OrderedDict[str, str] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def cached_hash(self, url: str) -> Optional[str]:
+        image_hash = self._url_hashes.get(url)
+        if image_hash is not None:
+            self._url_hashes.move_to_end(url)
+            self.cache_hits += 1
+
+        return image_hash
+
+    async def ingest_url(self, url: str) -> str:
+        """
+        @returns the image store hash of the image at `url`.
+        @raises ImageFetchError if the image could not be fetched or is invalid.
+        """
+        if (image_hash := self.cached_hash(url)) is not None:
+            return image_hash
+
+        if (inflight := self._inflight.get(url)) is None:
+            inflight = asyncio.ensure_future(self._download(url))
+            self._inflight[url] = inflight
+            inflight.add_done_callback(lambda future: self._forget(url, future))
+
+        image_hash = await asyncio.shield(inflight)
+        self._remember(url, image_hash)
+        return image_hash
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "downloads": self.downloads,
+            "cache_hits": self.cache_hits,
+            "failures": self.failures,
+            "inflight": len(self._inflight),
+            "cached_urls": len(self._url_hashes),
+        }
+
+    async def _download(self, url: str) -> str:
+        async with self._semaphore:
+            try:
+                data = await asyncio.wait_for(self._fetch(url), self.timeout)
+                image_hash = await self.store.put(data)
+            except (httpx.HTTPError, asyncio.TimeoutError, ValueError) as ex:
+                self.failures += 1
+                raise ImageFetchError(f"Failed to fetch image {url}: {ex!r}") from ex
+
+        self.downloads += 1
+        return image_hash
+
+    async def _fetch(self, url: str) -> bytes:
+        async with get_http_client().stream("GET", url, follow_redirects=True) as resp:
+            resp.raise_for_status()
+
+            content_type = resp.headers.get("Content-Type", "")
+            if not content_type.startswith("image/"):
+                raise ValueError(f"Invalid image content-type {content_type!r}.")
+
+            content_length = resp.headers.get("Content-Length")
+            if content_length and int(content_length) > self.max_bytes:
+                raise ValueError(f"Image exceeds {self.max_bytes} bytes.")
+
+            data = bytearray()
+            async for chunk in resp.aiter_bytes():
+                data.extend(chunk)
+                if len(data) > self.max_bytes:
+                    raise ValueError(f"Image exceeds {self.max_bytes} bytes.")
+
+        return bytes(data)
+
+    def _forget(self, url: str, future: asyncio.Future) -> None:
+        self._inflight.pop(url, None)
+        # Retrieve the error, in case every waiter was cancelled meanwhile.
+        if not future.cancelled():
+            future.exception()
+
+    def _remember(self, url: str, image_hash: str) -> None:
+        self._url_hashes[url] = image_hash
+        self._url_hashes.move_to_end(url)
+        while len(self._url_hashes) > self.cache_size:
+            self._url_hashes.popitem(last=False)
+
+
+image_ingestion = ImageIngestion(
+    store=image_store,
+    max_concurrency=int(settings.image_fetch_concurrency),
+    max_bytes=int(settings.image_fetch_max_bytes),
+    timeout=float(settings.image_fetch_timeout),
+    cache_size=int(settings.image_url_cache_size),
+)
+metrics_registry.register("image_ingestion", image_ingestion.stats)
@@ -0,0 +1,182 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import AsyncIterator, NamedTuple, Optional
+
+import anyio
+
+from MapsPlanner_API.settings import settings
+
+IMAGE_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# Leading magic bytes of the image formats we accept.
+_IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """
+    @returns the image content type, based on the leading bytes of its content.
+    """
+    for signature, content_type in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in {b"avif", b"avis"}:
+        return "image/avif"
+
+    return None
+
+
+def decode_data_uri(picture: str) -> bytes:
+    """
+    @param: picture - either a `data:image/...;base64,` URI or a bare base64 blob.
+    @returns the decoded bytes.
+    """
+    if picture.startswith("data:"):
+        _header, _, picture = picture.partition(",")
+
+    try:
+        return base64.b64decode(picture, validate=True)
+    except binascii.Error as err:
+        raise ValueError("Invalid base64 image.") from err
+
+
+class ImageInfo(NamedTuple):
+    image_hash: str
+    size: int
+    content_type: str
+
+
+class LocalImageStore:
+    """
+    Content addressed image store on the local filesystem.
+
+    Images are stored once per content, under their sha256 hex digest, sharded by
+    the digest prefix (`ab/cd/abcd...`). Writes are atomic, so a partially written
+    image is never visible.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    @classmethod
+    def is_valid_hash(cls, image_hash: str) -> bool:
+        return bool(IMAGE_HASH_PATTERN.match(image_hash))
+
+    @classmethod
+    def url_for(cls, image_hash: str, size: Optional[str] = None) -> str:
+        url = f"{settings.backend_url}/api/images/{image_hash}"
+        return f"{url}?size={size}" if size else url
+
+    @classmethod
+    def hash_from_url(cls, url: str) -> Optional[str]:
+        """
+        @returns the image hash of a `url_for` URL, or None for any other URL.
+        """
+        prefix = cls.url_for("")
+        if not url.startswith(prefix):
+            return None
+
+        image_hash = url[len(prefix) :].partition("?")[0]
+        return image_hash if cls.is_valid_hash(image_hash) else None
+
+    def path_for(self, image_hash: str) -> Path:
+        if not self.is_valid_hash(image_hash):
+            raise ValueError(f"Invalid image hash {image_hash!r}.")
+
+        return self.root / image_hash[:2] / image_hash[2:4] / image_hash
+
+    def write(self, data: bytes) -> str:
+        """
+        Stores the image, unless already stored, and returns its hash.
+        """
+        if sniff_image_type(data[:16]) is None:
+            raise ValueError("Unsupported image format.")
+
+        image_hash = hashlib.sha256(data).hexdigest()
+        path = self.path_for(image_hash)
+
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            file_descriptor, temp_path = tempfile.mkstemp(dir=path.parent)
+            with os.fdopen(file_descriptor, "wb") as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+
+        return image_hash
+
+    def read(self, image_hash: str) -> bytes:
+        return self.path_for(image_hash).read_bytes()
+
+    def stat(self, image_hash: str) -> Optional[ImageInfo]:
+        try:
+            path = self.path_for(image_hash)
+            with open(path, "rb") as image_file:
+                head = image_file.read(16)
+            size = path.stat().st_size
+        except (ValueError, FileNotFoundError):
+            return None
+
+        return ImageInfo(
+            image_hash=image_hash,
+            size=size,
+            content_type=sniff_image_type(head) or "application/octet-stream",
+        )
+
+    async def put(self, data: bytes) -> str:
+        return await anyio.to_thread.run_sync(self.write, data)
+
+    async def get_info(self, image_hash: str) -> Optional[ImageInfo]:
+        return await anyio.to_thread.run_sync(self.stat, image_hash)
+
+    async def iter_bytes(
+        self,
+        image_hash: str,
+        start: int = 0,
+        end: Optional[int] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Streams the image bytes in [start, end] (inclusive) in chunks.
+        """
+        async for chunk in self.iter_file(self.path_for(image_hash), start, end):
+            yield chunk
+
+    @classmethod
+    async def iter_file(
+        cls,
+        path: Path,
+        start: int = 0,
+        end: Optional[int] = None,
+    ) -> AsyncIterator[bytes]:
+        remaining = None if end is None else end - start + 1
+
+        async with await anyio.open_file(path, "rb") as image:
+            await image.seek(start)
+            while remaining is None or remaining > 0:
+                read_size = cls.chunk_size
+                if remaining is not None:
+                    read_size = min(read_size, remaining)
+
+                chunk = await image.read(read_size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+
+image_store = LocalImageStore(settings.image_store_path)
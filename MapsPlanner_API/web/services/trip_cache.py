@@ -0,0 +1,129 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generic, NamedTuple, Optional, Set, TypeVar
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from MapsPlanner_API.db.models.Trip import TripORM
+from MapsPlanner_API.web.api.metrics.registry import metrics_registry
+
+TValue = TypeVar("TValue")
+
+
+class CachedTripValue(NamedTuple):
+    markers_version: int
+    expires_at: float
+    value: Any
+
+
+class TripCache(Generic[TValue]):
+    """
+    Bounded LRU cache of values derived from the markers of a trip.
+
+    Values are stored along with the trip `markers_version` they were computed
+    from, and served only for that version: the database bumps it on every write
+    of the trip markers, by any worker, so reading it (see `load_markers_version`)
+    is enough to never serve a stale value. Entries of older versions are dropped
+    once a newer version is seen, and idle entries after `ttl` seconds.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl: float):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        self._entries: "OrderedDict[Any, CachedTripValue]" = OrderedDict()
+        # Entries keys by trip, so invalidating a trip does not scan the cache.
+        self._trip_keys: Dict[int, Set[Any]] = {}
+        # Latest markers version seen of each cached trip.
+        self._versions: Dict[int, int] = {}
+
+        metrics_registry.register(name, self.stats)
+
+    def get(
+        self,
+        trip_id: int,
+        markers_version: int,
+        key: Any = None,
+    ) -> Optional[TValue]:
+        if markers_version > self._versions.get(trip_id, markers_version):
+            self.invalidate(trip_id)
+
+        entry = self._entries.get((trip_id, key))
+        if (
+            entry is None
+            or entry.markers_version != markers_version
+            or entry.expires_at < time.monotonic()
+        ):
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end((trip_id, key))
+        self.hits += 1
+        return entry.value
+
+    def put(
+        self,
+        trip_id: int,
+        markers_version: int,
+        value: TValue,
+        key: Any = None,
+    ) -> None:
+        """
+        Stores a value computed from the markers read after `markers_version`.
+        Values of versions older than the latest seen are dropped.
+        """
+        if markers_version < self._versions.get(trip_id, markers_version):
+            return
+        if markers_version > self._versions.get(trip_id, markers_version):
+            self.invalidate(trip_id)
+
+        self._versions[trip_id] = markers_version
+        self._entries[(trip_id, key)] = CachedTripValue(
+            markers_version=markers_version,
+            expires_at=time.monotonic() + self.ttl,
+            value=value,
+        )
+        self._entries.move_to_end((trip_id, key))
+        self._trip_keys.setdefault(trip_id, set()).add(key)
+        while len(self._entries) > self.max_size:
+            (evicted_trip_id, evicted_key), _entry = self._entries.popitem(last=False)
+            self._forget(evicted_trip_id, evicted_key)
+
+    def invalidate(self, trip_id: int) -> None:
+        for key in self._trip_keys.pop(trip_id, ()):
+            del self._entries[(trip_id, key)]
+        self._versions.pop(trip_id, None)
+        self.invalidations += 1
+
+    def _forget(self, trip_id: int, key: Any) -> None:
+        trip_keys = self._trip_keys[trip_id]
+        trip_keys.discard(key)
+        if not trip_keys:
+            del self._trip_keys[trip_id]
+            del self._versions[trip_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+async def load_markers_version(db: AsyncSession, trip_id: int) -> int:
+    """
+    To be read before the markers a cached value is computed from: a write in
+    between yields newer markers under an older version, recomputed on the next
+    read, never the other way around.
+    """
+    markers_version = await db.scalar(
+        select(TripORM.markers_version).where(TripORM.id == trip_id),
+    )
+    return markers_version or 0